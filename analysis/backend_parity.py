@@ -0,0 +1,80 @@
+import time
+import numpy as np
+import pandas as pd
+from sklearn.metrics import accuracy_score
+
+from analysis.utils import convert_predictions_to_binary, get_classification_report_as_df
+from dataset import open_ecg_sequence
+from inference_backend import load_backend
+
+
+def check_backend_parity(backend_name, path_to_model, path_to_hdf5, reference_predictions_path,
+                         annotations_path, dataset_name="tracings", batch_size=32, threshold=0.5):
+    """
+    Compare an inference backend against the reference Keras predictions.
+
+    Reports the absolute score differences, binary agreement with the reference
+    and the same classification metrics as analysis/model_performance.py.
+
+    Parameters:
+    backend_name (str): Backend to check ('keras', 'tflite', 'onnx').
+    path_to_model (str): Model file for the backend.
+    path_to_hdf5 (str): Path to the HDF5 file containing ECG tracings, or a .npy file from convert_dataset.py.
+    reference_predictions_path (str): Reference Keras predictions (.npy), e.g. from predict.py.
+    annotations_path (str): Ground truth annotations (CSV file).
+    dataset_name (str): Name of the dataset within the HDF5 file.
+    batch_size (int): Batch size used for prediction.
+    threshold (float): Threshold for converting probabilities to binary.
+
+    Returns:
+    dict: Parity summary.
+    """
+    backend = load_backend(backend_name, path_to_model)
+    seq = open_ecg_sequence(path_to_hdf5, dataset_name, batch_size=batch_size)
+
+    started = time.perf_counter()
+    predictions = np.concatenate([backend.predict(seq[i]) for i in range(len(seq))])
+    elapsed = time.perf_counter() - started
+
+    reference = np.load(reference_predictions_path)
+    annotations = pd.read_csv(annotations_path)
+    if predictions.shape != reference.shape:
+        raise ValueError(f"Shape mismatch: backend {predictions.shape}, reference {reference.shape}")
+
+    abs_diff = np.abs(predictions - reference)
+    binary_predictions = convert_predictions_to_binary(predictions, threshold=threshold)
+    binary_reference = convert_predictions_to_binary(reference, threshold=threshold)
+
+    summary = {
+        "backend": backend_name,
+        "samples": len(predictions),
+        "seconds_per_sample": elapsed / len(predictions),
+        "max_abs_diff": float(abs_diff.max()),
+        "mean_abs_diff": float(abs_diff.mean()),
+        "binary_agreement": float((binary_predictions == binary_reference).mean()),
+        "accuracy": accuracy_score(annotations.values, binary_predictions),
+        "reference_accuracy": accuracy_score(annotations.values, binary_reference),
+    }
+
+    print("Classification Report:")
+    print(get_classification_report_as_df(annotations.values, binary_predictions, annotations.columns.tolist()))
+    for key, value in summary.items():
+        print(f"{key}: {value}")
+    return summary
+
+
+BACKEND_NAME = "tflite"
+PATH_TO_MODEL = "./data/model.tflite"
+PATH_TO_HDF5 = "./data/ecg_tracings.hdf5"
+REFERENCE_PREDICTIONS = "./data/model_predictions.npy"
+ANNOTATIONS = "./data/gold_standard.csv"
+
+if __name__ == "__main__":
+    # Run from the repository root: python -m analysis.backend_parity
+    check_backend_parity(
+        backend_name=BACKEND_NAME,
+        path_to_model=PATH_TO_MODEL,
+        path_to_hdf5=PATH_TO_HDF5,
+        reference_predictions_path=REFERENCE_PREDICTIONS,
+        annotations_path=ANNOTATIONS,
+    )
@@ -0,0 +1,172 @@
+import os
+import time
+import random
+import importlib
+import numpy as np
+import pandas as pd
+import boto3
+
+from decimal import Decimal
+
+
+def create_raw_table(dynamodb, table_name):
+    """
+    Create the raw ECG parts table (same schema as terraform-aws/dynamodb.tf) if it does not exist.
+
+    Parameters:
+    dynamodb: boto3 DynamoDB resource pointing at the local endpoint.
+    table_name (str): Name of the table to create.
+
+    Returns:
+    Table: The DynamoDB table resource.
+    """
+    if table_name in [t.name for t in dynamodb.tables.all()]:
+        return dynamodb.Table(table_name)
+
+    table = dynamodb.create_table(
+        TableName=table_name,
+        KeySchema=[
+            {"AttributeName": "device_id", "KeyType": "HASH"},
+            {"AttributeName": "timestamp_capture_begin", "KeyType": "RANGE"},
+        ],
+        AttributeDefinitions=[
+            {"AttributeName": "device_id", "AttributeType": "S"},
+            {"AttributeName": "timestamp_capture_begin", "AttributeType": "S"},
+            {"AttributeName": "chunk_idx", "AttributeType": "N"},
+        ],
+        GlobalSecondaryIndexes=[
+            {
+                "IndexName": "DeviceIdChunkIdxIndex",
+                "KeySchema": [
+                    {"AttributeName": "device_id", "KeyType": "HASH"},
+                    {"AttributeName": "chunk_idx", "KeyType": "RANGE"},
+                ],
+                "Projection": {"ProjectionType": "INCLUDE", "NonKeyAttributes": ["part"]},
+            }
+        ],
+        BillingMode="PAY_PER_REQUEST",
+    )
+    table.wait_until_exists()
+    return table
+
+
+def put_chunk(table, device_id, chunk_idx, n_parts=16, part_size=256, n_leads=12):
+    """
+    Insert one chunk of random ECG parts shaped like the IoT rule output.
+
+    Parameters:
+    table: Raw parts table.
+    device_id (str): Device to insert the chunk for.
+    chunk_idx (int): Index of the chunk.
+    n_parts (int): Number of parts per chunk.
+    part_size (int): Samples per part.
+    n_leads (int): Leads per sample.
+    """
+    for part in range(n_parts):
+        table.put_item(Item={
+            "device_id": device_id,
+            "timestamp_capture_begin": f"2024-12-03T14:{chunk_idx // 60:02d}:{chunk_idx % 60:02d}.{part:03d}Z",
+            "chunk_idx": chunk_idx,
+            "part": part,
+            "sampling_rate_hz": 400,
+            "timestamp_chunk_sent": f"2024-12-03T14:{chunk_idx // 60:02d}:{chunk_idx % 60:02d}.{part:03d}Z",
+            "timestamp_iot_core_rule_triggered": int(time.time() * 1000),
+            "ecg_data": [[Decimal(str(round(random.uniform(-2, 2), 4))) for _ in range(n_leads)]
+                         for _ in range(part_size)],
+        })
+
+
+def mark_parts_done_per_item(device_id, chunk_idx, items):
+    """
+    Previous completion path: one update_item per part, in sequence.
+    """
+    import lambda_aggregation
+
+    for item in items:
+        lambda_aggregation.dynamodb_client.update_item(
+            TableName=lambda_aggregation.DYNAMODB_TABLE_NAME,
+            Key={"device_id": {"S": device_id}, "timestamp_capture_begin": {"S": item["timestamp_capture_begin"]}},
+            UpdateExpression="SET processing = :complete",
+            ExpressionAttributeValues={":complete": {"S": "done"}},
+        )
+
+
+def benchmark_aggregation(dynamodb_endpoint, kinesis_endpoint, table_name, stream_name, n_chunks=20,
+                          output_csv="./benchmark_lambda_aggregation.csv"):
+    """
+    Benchmark aggregate_ecg_data duration per completion strategy against local AWS stand-ins.
+
+    Parameters:
+    dynamodb_endpoint (str): DynamoDB Local endpoint, e.g. 'http://localhost:8000'.
+    kinesis_endpoint (str): Kinesis stand-in endpoint (kinesalite), e.g. 'http://localhost:4567'.
+    table_name (str): Raw parts table name.
+    stream_name (str): Kinesis stream name.
+    n_chunks (int): Chunks aggregated per strategy.
+    output_csv (str): Path to save per-chunk durations.
+
+    Returns:
+    pd.DataFrame: Summary statistics per strategy.
+    """
+    os.environ.update({
+        "DYNAMODB_TABLE_NAME": table_name,
+        "KINESIS_STREAM_NAME": stream_name,
+        "DYNAMODB_ENDPOINT_URL": dynamodb_endpoint,
+        "KINESIS_ENDPOINT_URL": kinesis_endpoint,
+    })
+    import lambda_aggregation
+    importlib.reload(lambda_aggregation)
+
+    dynamodb = boto3.resource("dynamodb", endpoint_url=dynamodb_endpoint)
+    table = create_raw_table(dynamodb, table_name)
+    kinesis = boto3.client("kinesis", endpoint_url=kinesis_endpoint)
+    if stream_name not in kinesis.list_streams()["StreamNames"]:
+        kinesis.create_stream(StreamName=stream_name, ShardCount=1)
+        kinesis.get_waiter("stream_exists").wait(StreamName=stream_name)
+
+    strategies = {
+        "per_part_update": mark_parts_done_per_item,
+        "chunk_marker": lambda_aggregation.mark_chunk_done,
+    }
+
+    results = []
+    for strategy_name, mark_done in strategies.items():
+        lambda_aggregation.mark_chunk_done = mark_done
+        device_id = f"benchmark_device_{strategy_name}"
+        for chunk_idx in range(n_chunks):
+            put_chunk(table, device_id, chunk_idx)
+            started = time.perf_counter()
+            lambda_aggregation.aggregate_ecg_data(device_id, chunk_idx, "benchmark")
+            elapsed = time.perf_counter() - started
+            results.append({"Strategy": strategy_name, "Chunk": chunk_idx, "Time (seconds)": elapsed})
+    lambda_aggregation.mark_chunk_done = strategies["chunk_marker"]
+
+    results_df = pd.DataFrame(results)
+    results_df.to_csv(output_csv, index=False)
+    print(f"Benchmark results saved to {output_csv}")
+
+    summary = results_df.groupby("Strategy")["Time (seconds)"].agg(
+        mean="mean",
+        p50="median",
+        p95=lambda x: np.percentile(x, 95),
+    )
+    print(summary)
+    return summary
+
+
+DYNAMODB_ENDPOINT = "http://localhost:8000"
+KINESIS_ENDPOINT = "http://localhost:4567"
+TABLE_NAME = "ecg-data-chunks-raw"
+STREAM_NAME = "ecg-aggregated-chunks-data-stream"
+OUTPUT_CSV = "./data/benchmark_lambda_aggregation.csv"
+N_CHUNKS = 20
+
+if __name__ == "__main__":
+    # Run from the repository root: python -m analysis.benchmark_lambda_aggregation
+    benchmark_aggregation(
+        dynamodb_endpoint=DYNAMODB_ENDPOINT,
+        kinesis_endpoint=KINESIS_ENDPOINT,
+        table_name=TABLE_NAME,
+        stream_name=STREAM_NAME,
+        n_chunks=N_CHUNKS,
+        output_csv=OUTPUT_CSV,
+    )
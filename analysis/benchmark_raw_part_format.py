@@ -0,0 +1,145 @@
+import math
+import time
+import base64
+import numpy as np
+import pandas as pd
+
+# Raw table provisioning (terraform-aws/dynamodb.tf)
+PROVISIONED_WCU = 25
+PARTS_PER_CHUNK = 16
+
+
+def attribute_size(value):
+    """
+    Approximate stored size in bytes of a DynamoDB attribute value, following the
+    documented item size rules (numbers take about one byte per two significant digits plus one).
+    """
+    (kind, data), = value.items()
+    if kind == "S":
+        return len(data.encode("utf-8"))
+    if kind == "B":
+        return len(data)
+    if kind == "N":
+        digits = data.lstrip("-").replace(".", "").split("e")[0].split("E")[0].strip("0")
+        return math.ceil(max(len(digits), 1) / 2) + 1
+    if kind in ("BOOL", "NULL"):
+        return 1
+    if kind == "L":
+        return 3 + sum(1 + attribute_size(item) for item in data)
+    if kind == "M":
+        return 3 + sum(1 + len(key) + attribute_size(item) for key, item in data.items())
+    raise ValueError(f"Unsupported attribute type: {kind}")
+
+
+def item_size(item):
+    return sum(len(name) + attribute_size(value) for name, value in item.items())
+
+
+def list_part_item(message):
+    """
+    Raw part item as written by the IoT rule: ecg_data as nested lists of Number attributes.
+    """
+    return {
+        "device_id": {"S": message["device_id"]},
+        "timestamp_capture_begin": {"S": message["timestamp_capture_begin"]},
+        "chunk_idx": {"N": str(message["chunk_idx"])},
+        "part": {"N": str(message["part"])},
+        "sampling_rate_hz": {"N": str(message["sampling_rate_hz"])},
+        "timestamp_chunk_sent": {"S": message["timestamp_chunk_sent"]},
+        "timestamp_iot_core_rule_triggered": {"N": str(message["timestamp_iot_core_rule_triggered"])},
+        "ecg_data": {"L": [{"L": [{"N": repr(value)} for value in row]} for row in message["ecg_data"]]},
+    }
+
+
+def make_part_message(samples, part=15):
+    """
+    Part message as published by iot-emulation/send_ecg_data.py, for one (256, 12) block of samples.
+    """
+    return {
+        "device_id": "benchmark_device_1",
+        "timestamp_capture_begin": "2024-12-03T14:00:00.000Z",
+        "chunk_idx": 0,
+        "part": part,
+        "sampling_rate_hz": 400,
+        "timestamp_chunk_sent": "2024-12-03T14:00:10.240Z",
+        "timestamp_iot_core_rule_triggered": 1733234410290,
+        "ecg_data": samples.tolist(),
+    }
+
+
+def time_per_call(function, n_repeats):
+    started = time.perf_counter()
+    for _ in range(n_repeats):
+        function()
+    return (time.perf_counter() - started) / n_repeats
+
+
+def benchmark_raw_part_format(samples, n_repeats=200, output_csv="./benchmark_raw_part_format.csv"):
+    """
+    Compare raw part storage as Number lists with the packed int16 Binary attribute.
+
+    Reports item size, the write and read capacity a part and a chunk cost (the
+    GSI with projection ALL doubles every write), the parts per second the
+    provisioned table sustains, decode time per part and the quantization error.
+
+    Parameters:
+    samples (np.array): One part of samples, shape (256, 12).
+    n_repeats (int): Decode calls timed per format.
+    output_csv (str): Path to save the comparison.
+
+    Returns:
+    pd.DataFrame: One row per storage format.
+    """
+    import lambda_ingest
+    from lambda_aggregation import part_samples
+
+    message = make_part_message(samples)
+    items = {
+        "list": list_part_item(message),
+        "packed": lambda_ingest.build_packed_item(message),
+    }
+    # Stream events carry binary attributes base64-encoded
+    stream_images = {
+        "list": items["list"],
+        "packed": dict(items["packed"], ecg_data_packed={"B": base64.b64encode(
+            items["packed"]["ecg_data_packed"]["B"]).decode("ascii")}),
+    }
+
+    results = []
+    for format_name, item in items.items():
+        size = item_size(item)
+        # Table and GSI write each item; reads of the chunk query are eventually consistent
+        wcu_per_part = 2 * math.ceil(size / 1024)
+        rcu_per_chunk_query = math.ceil(PARTS_PER_CHUNK * size / 4096) * 0.5
+        decoded = part_samples(stream_images[format_name])
+        results.append({
+            "Format": format_name,
+            "Item size (bytes)": size,
+            "WCU per part": wcu_per_part,
+            "Parts/s at provisioned WCU": PROVISIONED_WCU / wcu_per_part,
+            "RCU per chunk query": rcu_per_chunk_query,
+            "Decode time per part (ms)": time_per_call(lambda: part_samples(stream_images[format_name]),
+                                                       n_repeats) * 1000,
+            "Max abs error": float(np.abs(decoded - samples.astype(np.float32)).max()),
+        })
+
+    results_df = pd.DataFrame(results)
+    results_df.to_csv(output_csv, index=False)
+    print(f"Benchmark results saved to {output_csv}")
+    with pd.option_context("display.max_columns", None, "display.width", 200):
+        print(results_df)
+    return results_df
+
+
+PATH_TO_DATA = "./data/ecg_tracings.hdf5"
+DATASET_NAME = "tracings"
+SAMPLE_INDEX = 0
+N_REPEATS = 200
+OUTPUT_CSV = "./data/benchmark_raw_part_format.csv"
+
+if __name__ == "__main__":
+    # Run from the repository root: python -m analysis.benchmark_raw_part_format
+    from analysis.utils import load_ecg_data
+
+    tracing = load_ecg_data(PATH_TO_DATA, DATASET_NAME, n_samples=SAMPLE_INDEX + 1)[SAMPLE_INDEX]
+    benchmark_raw_part_format(tracing[:256], n_repeats=N_REPEATS, output_csv=OUTPUT_CSV)
@@ -0,0 +1,104 @@
+import json
+import time
+import numpy as np
+import pandas as pd
+
+from decimal import Decimal
+from boto3.dynamodb.types import TypeSerializer
+
+from result_format import ABNORMALITIES, format_results
+
+type_serializer = TypeSerializer()
+
+
+def decimal_serializer(obj):
+    if isinstance(obj, Decimal):
+        return float(obj)
+    raise TypeError(f"Type {type(obj)} not serializable")
+
+
+def make_records(batch_size):
+    """
+    Result records shaped like the inference service output, without predictions.
+    """
+    return [{
+        "device_id": f"benchmark_device_{i}",
+        "timestamp_capture_begin": "2024-12-03T14:00:00.000Z",
+        "timestamp_chunk_sent": "2024-12-03T14:00:10.240Z",
+        "chunk_idx": i,
+        "sampling_rate_hz": 400,
+        "timestamp_iot_core_rule_triggered": "2024-12-03T14:00:10.290000+00:00",
+        "timestamp_lambda_processing_started": "2024-12-03T14:00:10.700000+00:00",
+        "timestamp_lambda_processing_finished": "2024-12-03T14:00:10.800000+00:00",
+        "timestamp_ecs_inference_started": "2024-12-03T14:00:11.500000+00:00",
+        "timestamp_ecs_inference_finished": "2024-12-03T14:00:11.600000+00:00",
+    } for i in range(batch_size)]
+
+
+def format_per_record(records, predictions):
+    """
+    Previous formatting path: Decimal scores and a Python threshold per record, then
+    the boto3 resource serialization for DynamoDB and json.dumps for MQTT.
+    """
+    items, payloads = [], []
+    for record, prediction in zip(records, predictions):
+        record = dict(record)
+        record['prediction'] = [Decimal(str(value)) for value in prediction.tolist()]
+        record['sampling_rate_hz'] = Decimal(str(record['sampling_rate_hz']))
+        binary_prediction = (prediction > 0.5).astype(int)
+        record['detected_abnormalities'] = [ABNORMALITIES[i] for i, value in enumerate(binary_prediction)
+                                            if value == 1]
+        items.append({key: type_serializer.serialize(value) for key, value in record.items()})
+        payloads.append(json.dumps(record, default=decimal_serializer))
+    return items, payloads
+
+
+def benchmark_result_format(batch_sizes, n_repeats=200, output_csv="./benchmark_result_format.csv"):
+    """
+    Benchmark result formatting time per batch for the per-record and the batch path.
+
+    Parameters:
+    batch_sizes (list[int]): Batch sizes to benchmark.
+    n_repeats (int): Formatting calls timed per batch size and path.
+    output_csv (str): Path to save the per-batch-size timings.
+
+    Returns:
+    pd.DataFrame: Timings per batch size and path.
+    """
+    strategies = {
+        "per_record": format_per_record,
+        "batch": format_results,
+    }
+    rng = np.random.default_rng(0)
+
+    results = []
+    for batch_size in batch_sizes:
+        records = make_records(batch_size)
+        predictions = rng.random((batch_size, len(ABNORMALITIES)), dtype=np.float32)
+        for strategy_name, format_batch in strategies.items():
+            format_batch(records, predictions)  # Warm-up
+            started = time.perf_counter()
+            for _ in range(n_repeats):
+                format_batch(records, predictions)
+            elapsed = (time.perf_counter() - started) / n_repeats
+            results.append({
+                "Strategy": strategy_name,
+                "Batch Size": batch_size,
+                "Time per batch (ms)": elapsed * 1000,
+                "Time per record (us)": elapsed / batch_size * 1e6,
+            })
+
+    results_df = pd.DataFrame(results)
+    results_df.to_csv(output_csv, index=False)
+    print(f"Benchmark results saved to {output_csv}")
+    print(results_df.pivot(index="Batch Size", columns="Strategy", values="Time per record (us)"))
+    return results_df
+
+
+BATCH_SIZES = [1, 2, 5, 10, 20, 50, 100]
+N_REPEATS = 200
+OUTPUT_CSV = "./data/benchmark_result_format.csv"
+
+if __name__ == "__main__":
+    # Run from the repository root: python -m analysis.benchmark_result_format
+    benchmark_result_format(BATCH_SIZES, n_repeats=N_REPEATS, output_csv=OUTPUT_CSV)
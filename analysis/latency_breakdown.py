@@ -0,0 +1,214 @@
+import json
+import numpy as np
+import pandas as pd
+
+# (stage name, start timestamp field, end timestamp field), in pipeline order
+STAGES = [
+    ("window_capture", "timestamp_capture_begin", "timestamp_chunk_sent"),
+    ("iot_core", "timestamp_chunk_sent", "timestamp_iot_core_rule_triggered"),
+    ("lambda_trigger", "timestamp_iot_core_rule_triggered", "timestamp_lambda_processing_started"),
+    ("lambda_processing", "timestamp_lambda_processing_started", "timestamp_lambda_processing_finished"),
+    ("kinesis_and_batching", "timestamp_lambda_processing_finished", "timestamp_ecs_inference_started"),
+    ("inference", "timestamp_ecs_inference_started", "timestamp_ecs_inference_finished"),
+    # From the last part leaving the device to the prediction being available
+    ("end_to_end", "timestamp_chunk_sent", "timestamp_ecs_inference_finished"),
+]
+# Timestamps set by the device; emulated devices may send local time with a 'Z' suffix
+DEVICE_TIMESTAMPS = ["timestamp_capture_begin", "timestamp_chunk_sent"]
+
+
+def load_results_from_dynamodb(table_name, endpoint_url=None):
+    """
+    Scan the processed-results table.
+
+    Parameters:
+    table_name (str): Name of the processed-results table.
+    endpoint_url (str): Optional endpoint override, e.g. DynamoDB Local.
+
+    Returns:
+    list[dict]: Result records.
+    """
+    import boto3
+
+    table = boto3.resource("dynamodb", endpoint_url=endpoint_url).Table(table_name)
+    # Only the fields needed here, to keep the scan small
+    fields = ["device_id", "chunk_idx"] + sorted({field for _, start, end in STAGES for field in (start, end)})
+    request = {
+        "ProjectionExpression": ", ".join(f"#f{i}" for i in range(len(fields))),
+        "ExpressionAttributeNames": {f"#f{i}": field for i, field in enumerate(fields)},
+    }
+    records = []
+    while True:
+        response = table.scan(**request)
+        records.extend(response["Items"])
+        if "LastEvaluatedKey" not in response:
+            return records
+        request["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
+def load_results_from_file(path):
+    """
+    Load a local export of the processed-results table.
+
+    Supports a JSON array, JSON lines (plain records or DynamoDB export lines of the
+    form {"Item": {...}} in attribute-value format) and CSV.
+
+    Parameters:
+    path (str): Path to the export.
+
+    Returns:
+    list[dict]: Result records.
+    """
+    if path.endswith(".csv"):
+        return pd.read_csv(path).to_dict("records")
+
+    with open(path) as f:
+        content = f.read().strip()
+    if content.startswith("["):
+        records = json.loads(content)
+    else:
+        records = [json.loads(line) for line in content.splitlines() if line.strip()]
+
+    if records and "Item" in records[0]:
+        from boto3.dynamodb.types import TypeDeserializer
+
+        deserializer = TypeDeserializer()
+        records = [{key: deserializer.deserialize(value) for key, value in record["Item"].items()}
+                   for record in records]
+    return records
+
+
+def parse_timestamp(value):
+    """
+    Parse an ISO 8601 string or epoch milliseconds (as stored by the IoT rule) to a UTC timestamp.
+    """
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return pd.NaT
+    if isinstance(value, str) and not value.lstrip("-").isdigit():
+        timestamp = pd.Timestamp(value)
+        return timestamp.tz_convert("UTC") if timestamp.tzinfo else timestamp.tz_localize("UTC")
+    return pd.Timestamp(int(value), unit="ms", tz="UTC")
+
+
+def compute_stage_latencies(records, device_utc_offset_hours=0.0):
+    """
+    Compute per-record stage latencies and inference batch sizes.
+
+    Records of one inference batch share their ECS inference timestamps, which is
+    used to recover the batch size.
+
+    Parameters:
+    records (list[dict]): Result records.
+    device_utc_offset_hours (float): UTC offset of device clocks that report local time with a 'Z' suffix.
+
+    Returns:
+    pd.DataFrame: One row per record with a latency column (seconds) per stage and 'batch_size'.
+    """
+    df = pd.DataFrame(records)
+    for field in {field for _, start, end in STAGES for field in (start, end)}:
+        df[field] = df[field].map(parse_timestamp) if field in df else pd.NaT
+    for field in DEVICE_TIMESTAMPS:
+        df[field] = df[field] - pd.Timedelta(hours=device_utc_offset_hours)
+
+    latencies = pd.DataFrame(index=df.index)
+    for stage, start, end in STAGES:
+        latencies[stage] = (df[end] - df[start]).dt.total_seconds()
+    latencies["finished"] = df["timestamp_ecs_inference_finished"]
+    latencies["batch_size"] = df.groupby(["timestamp_ecs_inference_started", "timestamp_ecs_inference_finished"])[
+        "timestamp_ecs_inference_started"].transform("size")
+    return latencies
+
+
+def summarize_latencies(latencies, group_by=None):
+    """
+    Latency percentiles per stage, optionally per group.
+
+    Parameters:
+    latencies (pd.DataFrame): Output of compute_stage_latencies.
+    group_by (str): Optional column to group by, e.g. 'batch_size' or 'throughput_bin'.
+
+    Returns:
+    pd.DataFrame: p50/p95/p99 in seconds per stage (and group), with the number of records.
+    """
+    stages = [stage for stage, _, _ in STAGES]
+
+    def percentiles(frame):
+        rows = {}
+        for stage in stages:
+            values = frame[stage].dropna()
+            rows[stage] = {
+                "count": len(values),
+                "p50": values.quantile(0.50) if len(values) else np.nan,
+                "p95": values.quantile(0.95) if len(values) else np.nan,
+                "p99": values.quantile(0.99) if len(values) else np.nan,
+            }
+        return pd.DataFrame(rows).transpose()
+
+    if group_by is None:
+        return percentiles(latencies)
+    return pd.concat({group: percentiles(frame) for group, frame in latencies.groupby(group_by)},
+                     names=[group_by, "stage"])
+
+
+def add_throughput(latencies, window="60s"):
+    """
+    Add the inference throughput (records/s finished in the same time window) to every record.
+
+    Parameters:
+    latencies (pd.DataFrame): Output of compute_stage_latencies.
+    window (str): Pandas frequency of the throughput windows.
+
+    Returns:
+    pd.DataFrame: The same frame with 'throughput' and 'throughput_bin' columns.
+    """
+    latencies = latencies.dropna(subset=["finished"]).copy()
+    windows = latencies["finished"].dt.floor(window)
+    latencies["throughput"] = windows.map(windows.value_counts()) / pd.Timedelta(window).total_seconds()
+    latencies["throughput_bin"] = pd.qcut(latencies["throughput"], q=min(5, latencies["throughput"].nunique()),
+                                          duplicates="drop")
+    return latencies
+
+
+def latency_breakdown(records, output_csv=None, device_utc_offset_hours=0.0, throughput_window="60s"):
+    """
+    Print the latency breakdown overall, by inference batch size and by throughput.
+
+    Parameters:
+    records (list[dict]): Result records.
+    output_csv (str): Optional path to save the per-record latencies.
+    device_utc_offset_hours (float): UTC offset of device clocks that report local time with a 'Z' suffix.
+    throughput_window (str): Pandas frequency of the throughput windows.
+
+    Returns:
+    pd.DataFrame: Per-record latencies.
+    """
+    latencies = add_throughput(compute_stage_latencies(records, device_utc_offset_hours), throughput_window)
+    if output_csv:
+        latencies.to_csv(output_csv, index=False)
+        print(f"Per-record latencies saved to {output_csv}")
+
+    with pd.option_context("display.max_rows", None, "display.float_format", "{:.3f}".format):
+        print(f"Latency per stage in seconds ({len(latencies)} records):")
+        print(summarize_latencies(latencies))
+        print("\nEnd-to-end and inference latency by inference batch size:")
+        print(summarize_latencies(latencies, "batch_size").unstack("stage")[
+            [("p50", "end_to_end"), ("p95", "end_to_end"), ("p50", "inference"), ("p95", "inference")]])
+        print(f"\nEnd-to-end latency by throughput (records/s per {throughput_window} window):")
+        print(summarize_latencies(latencies, "throughput_bin").unstack("stage")[
+            [("count", "end_to_end"), ("p50", "end_to_end"), ("p95", "end_to_end"), ("p99", "end_to_end")]])
+    return latencies
+
+
+TABLE_NAME = "ecg-data-chunks-processed"
+# Set to a local export (JSON, JSON lines or CSV) to skip the table scan
+RESULTS_FILE = None
+OUTPUT_CSV = "./data/latency_breakdown.csv"
+DEVICE_UTC_OFFSET_HOURS = 0.0
+
+if __name__ == "__main__":
+    # Run from the repository root: python -m analysis.latency_breakdown
+    if RESULTS_FILE:
+        results = load_results_from_file(RESULTS_FILE)
+    else:
+        results = load_results_from_dynamodb(TABLE_NAME)
+    latency_breakdown(results, output_csv=OUTPUT_CSV, device_utc_offset_hours=DEVICE_UTC_OFFSET_HOURS)
@@ -19,8 +19,10 @@ def benchmark_ecg_model_numpy(
     """
     Benchmark ECG model prediction times using NumPy slicing for different batch sizes.
 
+    Only the tracings needed for the largest batch are loaded.
+
     Parameters:
-    path_to_hdf5 (str): Path to the HDF5 file containing ECG tracings.
+    path_to_hdf5 (str): Path to the HDF5 file containing ECG tracings, or a .npy file from convert_dataset.py.
     path_to_model (str): Path to the pre-trained Keras model file.
     dataset_name (str): Key for the dataset within the HDF5 file. Default is 'tracings'.
     batch_sizes (iterable): Range or list of batch sizes to test. Default is range(1, 101).
@@ -29,10 +31,14 @@ def benchmark_ecg_model_numpy(
     Returns:
     None: Saves benchmark results to a CSV file.
     """
-    # Load the ECG tracings data
-    with h5py.File(path_to_hdf5, "r") as f:
-        tracings = f[dataset_name][:]
-        print(f"Loaded data shape: {tracings.shape}")
+    # Load the ECG tracings needed for the largest batch
+    n_samples = max(batch_sizes)
+    if path_to_hdf5.endswith(".npy"):
+        tracings = np.load(path_to_hdf5, mmap_mode="r")[:n_samples]
+    else:
+        with h5py.File(path_to_hdf5, "r") as f:
+            tracings = f[dataset_name][:n_samples]
+    print(f"Loaded data shape: {tracings.shape}")
 
     # Load the pre-trained model
     model = load_model(path_to_model, compile=False)
@@ -7,19 +7,25 @@ import matplotlib.pyplot as plt
 from sklearn.metrics import classification_report, confusion_matrix
 
 
-def load_ecg_data(path_to_hdf5, dataset_name):
+def load_ecg_data(path_to_hdf5, dataset_name, n_samples=None):
     """
-    Load ECG data from the HDF5 file.
+    Load ECG data from the HDF5 file, or memory-map it from a .npy file created by convert_dataset.py.
+
+    A memory-mapped tensor only reads the samples that are actually accessed, so
+    prefer the .npy file for datasets that don't fit into RAM.
 
     Parameters:
-    path_to_hdf5 (str): Path to the HDF5 file.
+    path_to_hdf5 (str): Path to the HDF5 file or the converted .npy file.
     dataset_name (str): Name of the dataset within the HDF5 file.
+    n_samples (int): Only load the first n_samples tracings. Default loads all of them.
 
     Returns:
     np.array: ECG data tensor of shape (N, 4096, 12).
     """
+    if path_to_hdf5.endswith(".npy"):
+        return np.load(path_to_hdf5, mmap_mode="r")[:n_samples]
     with h5py.File(path_to_hdf5, "r") as f:
-        data = f[dataset_name][:]
+        data = f[dataset_name][:n_samples]
     return data
 
 
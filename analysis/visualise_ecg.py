@@ -1,3 +1,4 @@
+import os
 import numpy as np
 
 from analysis.utils import (
@@ -9,10 +10,12 @@ from analysis.utils import (
 from analysis.constants import LEAD_NAMES, ABNORMALITIES, SAMPLING_RATE
 
 path_to_hdf5 = "../data/ecg_tracings.hdf5"
+# Memory-mapped copy created with convert_dataset.py; only the plotted sample is read from it
+path_to_npy = "../data/ecg_tracings.npy"
 path_to_predictions = "../data/dnn_output.npy"
 dataset_name = "tracings"
 
-ecg_data = load_ecg_data(path_to_hdf5, dataset_name)
+ecg_data = load_ecg_data(path_to_npy if os.path.exists(path_to_npy) else path_to_hdf5, dataset_name)
 plot_ecg_timeseries(
     ecg_data,
     sample_index=0,
@@ -20,7 +23,6 @@ plot_ecg_timeseries(
     sampling_rate=SAMPLING_RATE,
 )
 
-ecg_data = load_ecg_data(path_to_hdf5, dataset_name)
 predictions_prob = np.load(path_to_predictions)
 
 predictions_binary = convert_predictions_to_binary(predictions_prob, threshold=0.5)
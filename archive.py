@@ -0,0 +1,351 @@
+"""
+Columnar archive of inferred ECG windows and their predictions.
+
+The inference service buffers windows and writes them in large blocks as Parquet
+files partitioned by device and hour of capture:
+
+    {root}/device_id={device_id}/hour={YYYY-MM-DDTHH}/{first capture}_{unique id}.parquet
+
+Reading a device/time range only lists and opens the matching hour partitions.
+read_archive returns windows shaped like the HDF5 tracings, ready for the plots in
+analysis/utils.py; the command line exports them to .npy for re-scoring with predict.py.
+The root is a local directory or an s3:// URI, optionally on an S3-compatible
+endpoint (MinIO, moto, LocalStack).
+"""
+import os
+import time
+import uuid
+import logging
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # only needed when the archive is enabled
+    pa = None
+    pq = None
+
+# Record fields stored next to each window, as strings except for the numeric ones
+ARCHIVE_FIELDS = [
+    "device_id",
+    "chunk_idx",
+    "sampling_rate_hz",
+    "timestamp_capture_begin",
+    "timestamp_chunk_sent",
+    "timestamp_iot_core_rule_triggered",
+    "timestamp_lambda_processing_started",
+    "timestamp_lambda_processing_finished",
+    "timestamp_ecs_inference_started",
+    "timestamp_ecs_inference_finished",
+]
+NUMERIC_FIELDS = {"chunk_idx": "int64", "sampling_rate_hz": "float64"}
+CAPTURE_TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S.%f"
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ValueError("The waveform archive requires the 'pyarrow' package")
+
+
+class LocalArchiveStore:
+    """
+    Archive files in a local directory.
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def write(self, key, data):
+        path = os.path.join(self.root, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Readers never see partially written files
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def list(self, prefix):
+        directory = os.path.join(self.root, prefix)
+        if not os.path.isdir(directory):
+            return []
+        return sorted(prefix + name for name in os.listdir(directory) if name.endswith(".parquet"))
+
+    def read(self, key):
+        with open(os.path.join(self.root, key), "rb") as f:
+            return f.read()
+
+
+class S3ArchiveStore:
+    """
+    Archive files in an S3 bucket (or an S3-compatible stand-in).
+    """
+
+    def __init__(self, s3_client, bucket, prefix=""):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.prefix = prefix.strip("/") + "/" if prefix.strip("/") else ""
+
+    def write(self, key, data):
+        self.s3_client.put_object(Bucket=self.bucket, Key=self.prefix + key, Body=data)
+
+    def list(self, prefix):
+        keys = []
+        paginator = self.s3_client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix + prefix):
+            keys.extend(item["Key"][len(self.prefix):] for item in page.get("Contents", []))
+        return sorted(key for key in keys if key.endswith(".parquet"))
+
+    def read(self, key):
+        return self.s3_client.get_object(Bucket=self.bucket, Key=self.prefix + key)["Body"].read()
+
+
+def open_archive_store(uri, endpoint_url=None):
+    """
+    Open an archive store from a local path or an s3://bucket/prefix URI.
+
+    Parameters:
+    uri (str): Archive root.
+    endpoint_url (str): Optional S3 endpoint override, e.g. MinIO for local testing.
+
+    Returns:
+    LocalArchiveStore or S3ArchiveStore: The store.
+    """
+    if uri.startswith("s3://"):
+        import boto3
+
+        bucket, _, prefix = uri[len("s3://"):].partition("/")
+        return S3ArchiveStore(boto3.client("s3", endpoint_url=endpoint_url), bucket, prefix)
+    return LocalArchiveStore(uri)
+
+
+def partition_prefix(device_id, hour):
+    return f"device_id={device_id}/hour={hour}/"
+
+
+def capture_hour(timestamp_capture_begin):
+    """
+    Partition hour ('YYYY-MM-DDTHH') of a device capture timestamp.
+    """
+    return timestamp_capture_begin[:13]
+
+
+def windows_to_table(rows):
+    """
+    Build an Arrow table from buffered (metadata, window, prediction) rows.
+
+    Windows are stored flattened in a fixed-size list column, their shape is kept
+    in the schema metadata.
+    """
+    metadata = [row[0] for row in rows]
+    windows = np.stack([row[1] for row in rows])
+    predictions = np.stack([row[2] for row in rows]).astype(np.float32)
+
+    columns = {}
+    for field in ARCHIVE_FIELDS:
+        values = [record.get(field) for record in metadata]
+        if field in NUMERIC_FIELDS:
+            columns[field] = pa.array(values, type=NUMERIC_FIELDS[field])
+        else:
+            values = [None if value is None else str(value) for value in values]
+            columns[field] = pa.array(values, type=pa.string())
+    columns["prediction"] = pa.FixedSizeListArray.from_arrays(pa.array(predictions.reshape(-1)),
+                                                              predictions.shape[1])
+    columns["aggregated_data"] = pa.FixedSizeListArray.from_arrays(pa.array(windows.reshape(-1)),
+                                                                   int(np.prod(windows.shape[1:])))
+
+    table = pa.Table.from_arrays(list(columns.values()), names=list(columns))
+    window_shape = ",".join(str(dim) for dim in windows.shape[1:])
+    return table.replace_schema_metadata({"window_shape": window_shape})
+
+
+class WaveformArchive:
+    """
+    Buffers inferred windows per device and hour and writes them as Parquet files.
+
+    The buffer is written once it holds `max_buffered_windows` windows or its
+    oldest window is older than `flush_interval_seconds` (checked whenever windows
+    are added), and on close. Files are encoded and uploaded on a background
+    thread, so the sink stage only pays for copying windows into the buffer.
+    At most `max_pending_writes` buffers wait for that thread; beyond that `add`
+    blocks until one is written, so a slow store cannot grow memory without bound.
+
+    The archive is best-effort: shard checkpoints advance once results are in
+    DynamoDB, not once their windows are archived, so windows still buffered or
+    queued when the process dies are not archived and are not read again.
+    """
+
+    def __init__(self, store, max_buffered_windows=256, flush_interval_seconds=300, compression="zstd",
+                 max_pending_writes=2):
+        """
+        Parameters:
+        store: LocalArchiveStore or S3ArchiveStore.
+        max_buffered_windows (int): Windows buffered before they are written.
+        flush_interval_seconds (float): Maximum age of a buffered window before the buffer is written.
+        compression (str): Parquet compression codec.
+        max_pending_writes (int): Buffers handed to the background writer but not yet written.
+        """
+        _require_pyarrow()
+        self.store = store
+        self.max_buffered_windows = max_buffered_windows
+        self.flush_interval_seconds = flush_interval_seconds
+        self.compression = compression
+        self._partitions = {}  # (device_id, hour) -> [(metadata, window, prediction)]
+        self._n_buffered = 0
+        self._oldest = None
+        self._lock = threading.Lock()
+        self._write_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="archive-write")
+        self._write_slots = threading.BoundedSemaphore(max_pending_writes)
+
+    def add(self, records, predictions):
+        """
+        Buffer records that still hold their 'aggregated_data' window, with their predictions.
+
+        Parameters:
+        records (list[dict]): Inferred records.
+        predictions (np.array): Predictions of shape (batch_size, n_abnormalities).
+        """
+        with self._lock:
+            for record, prediction in zip(records, predictions):
+                metadata = {field: record.get(field) for field in ARCHIVE_FIELDS}
+                window = np.asarray(record["aggregated_data"], dtype=np.float32)
+                key = (metadata["device_id"], capture_hour(metadata["timestamp_capture_begin"]))
+                self._partitions.setdefault(key, []).append((metadata, window, prediction))
+            self._n_buffered += len(records)
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            due = (self._n_buffered >= self.max_buffered_windows
+                   or time.monotonic() - self._oldest >= self.flush_interval_seconds)
+        if due:
+            self.flush()
+
+    def flush(self):
+        """
+        Hand the buffered windows to the background writer, waiting while
+        `max_pending_writes` buffers are already queued.
+        """
+        with self._lock:
+            partitions, self._partitions = self._partitions, {}
+            self._n_buffered = 0
+            self._oldest = None
+        if partitions:
+            self._write_slots.acquire()
+            self._write_executor.submit(self._write_partitions, partitions)
+
+    def _write_partitions(self, partitions):
+        try:
+            self._write_files(partitions)
+        finally:
+            self._write_slots.release()
+
+    def _write_files(self, partitions):
+        started = time.monotonic()
+        n_windows = 0
+        for (device_id, hour), rows in partitions.items():
+            try:
+                table = windows_to_table(rows)
+                sink = pa.BufferOutputStream()
+                pq.write_table(table, sink, compression=self.compression)
+                first_capture = min(row[0]["timestamp_capture_begin"] for row in rows).replace(":", "-")
+                key = f"{partition_prefix(device_id, hour)}{first_capture}_{uuid.uuid4().hex[:8]}.parquet"
+                self.store.write(key, sink.getvalue().to_pybytes())
+                n_windows += len(rows)
+            except Exception as e:
+                logging.error(f"Failed to archive {len(rows)} windows of device {device_id}, hour {hour}: {e}")
+        logging.info(f"Archived {n_windows} windows in {len(partitions)} files "
+                     f"in {time.monotonic() - started:.2f}s.")
+
+    def close(self):
+        """
+        Write the remaining windows and wait for all writes to finish.
+        """
+        self.flush()
+        self._write_executor.shutdown(wait=True)
+
+
+def _parse_capture_time(value):
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def _format_capture_time(value):
+    return value.strftime(CAPTURE_TIMESTAMP_FORMAT)[:-3] + "Z"
+
+
+def read_archive(store, device_id, start, end, columns=None):
+    """
+    Read archived windows of one device captured in [start, end).
+
+    Parameters:
+    store: LocalArchiveStore or S3ArchiveStore.
+    device_id (str): Device to read.
+    start (str or datetime): First capture time (ISO 8601, UTC if no offset is given).
+    end (str or datetime): End of the capture time range, exclusive.
+    columns (list[str]): Optional subset of columns; leave out 'aggregated_data' to read metadata only.
+
+    Returns:
+    tuple: (pd.DataFrame of metadata and predictions, np.array of windows (n, 4096, 12) or None), sorted by capture.
+    """
+    _require_pyarrow()
+    start, end = _parse_capture_time(start), _parse_capture_time(end)
+    start_key, end_key = _format_capture_time(start), _format_capture_time(end)
+    if columns is not None and "timestamp_capture_begin" not in columns:
+        columns = list(columns) + ["timestamp_capture_begin"]
+
+    tables = []
+    hour = start.replace(minute=0, second=0, microsecond=0)
+    while hour < end:
+        for key in store.list(partition_prefix(device_id, hour.strftime("%Y-%m-%dT%H"))):
+            table = pq.read_table(pa.BufferReader(store.read(key)), columns=columns)
+            captures = table.column("timestamp_capture_begin").to_pylist()
+            mask = [capture is not None and start_key <= capture < end_key for capture in captures]
+            tables.append(table.filter(pa.array(mask)))
+        hour += timedelta(hours=1)
+
+    if not tables:
+        return None, None
+    table = pa.concat_tables(tables)
+
+    windows = None
+    if "aggregated_data" in table.column_names:
+        window_shape = tuple(int(dim) for dim in table.schema.metadata[b"window_shape"].decode().split(","))
+        values = [chunk.flatten().to_numpy() for chunk in table.column("aggregated_data").chunks]
+        windows = np.concatenate(values).reshape((-1,) + window_shape) if values else None
+        table = table.remove_column(table.schema.get_field_index("aggregated_data"))
+
+    metadata = table.to_pandas()
+    order = np.argsort(metadata["timestamp_capture_begin"].to_numpy(), kind="stable")
+    metadata = metadata.iloc[order].reset_index(drop=True)
+    if windows is not None:
+        windows = windows[order]
+    return metadata, windows
+
+
+def parse_arguments():
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(description="Export archived ECG windows of a device and time range.")
+    parser.add_argument("--uri", required=True, help="Archive root: a local directory or s3://bucket/prefix.")
+    parser.add_argument("--endpoint_url", help="S3 endpoint override, e.g. http://localhost:9000.")
+    parser.add_argument("--device_id", required=True, help="Device to export.")
+    parser.add_argument("--start", required=True, help="First capture time, ISO 8601 (UTC).")
+    parser.add_argument("--end", required=True, help="End of the capture time range (exclusive), ISO 8601 (UTC).")
+    parser.add_argument("--output", default="./data/archived_windows.npy",
+                        help="Windows as .npy, usable by predict.py; metadata is saved next to it as .csv.")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    archived_metadata, archived_windows = read_archive(open_archive_store(args.uri, args.endpoint_url),
+                                                       args.device_id, args.start, args.end)
+    if archived_windows is None:
+        raise SystemExit(f"No archived windows of device {args.device_id} between {args.start} and {args.end}")
+    np.save(args.output, archived_windows)
+    archived_metadata.to_csv(os.path.splitext(args.output)[0] + ".csv", index=False)
+    print(f"Exported {len(archived_windows)} windows to {args.output}")
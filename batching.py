@@ -0,0 +1,234 @@
+import csv
+import math
+import time
+import logging
+
+
+class AdaptiveBatcher:
+    """
+    Micro-batching scheduler for the inference consumer.
+
+    Records are collected across several Kinesis fetches until either the current
+    target batch size is reached or the oldest pending record has waited
+    `max_wait_seconds`, whichever comes first.
+
+    The target batch size is derived from the per-batch predict latency curve
+    (as measured by `analysis/test_batch_size.py`) and the observed arrival rate:
+    the scheduler picks the batch size with the best throughput whose expected
+    fill time plus predict time still fits into `latency_budget_seconds`. Under
+    heavy load batches fill quickly and grow large; under light load the target
+    shrinks so tail latency stays low.
+    """
+
+    def __init__(self, max_batch_size=64, min_batch_size=1, max_wait_seconds=1.0,
+                 latency_budget_seconds=2.0, latency_profile=None, smoothing=0.2):
+        """
+        Parameters:
+        max_batch_size (int): Upper bound for the batch size handed to the model.
+        min_batch_size (int): Lower bound for the target batch size.
+        max_wait_seconds (float): Maximum time the oldest record may wait for a batch to fill.
+        latency_budget_seconds (float): Target end-to-end budget for fill time + predict time.
+        latency_profile (dict): Optional mapping of batch size -> predict seconds.
+        smoothing (float): EWMA factor used for arrival rate and latency updates.
+        """
+        self.max_batch_size = max_batch_size
+        self.min_batch_size = min_batch_size
+        self.max_wait_seconds = max_wait_seconds
+        self.latency_budget_seconds = latency_budget_seconds
+        self.latency_profile = dict(latency_profile or {})
+        self.smoothing = smoothing
+
+        self.arrival_rate = 0.0  # records per second, EWMA
+        self._last_arrival_time = None
+        self._pending = []
+        # Arrival time of each pending record, so leftovers keep their original wait clock
+        self._pending_times = []
+        # Target size used by the last ready_batches() call, reported in the batch logs
+        self.last_target_batch_size = None
+
+    @staticmethod
+    def load_latency_profile(path_to_csv):
+        """
+        Load a batch size -> predict latency curve from a benchmark CSV.
+
+        Parameters:
+        path_to_csv (str): CSV with 'Batch Size' and 'Time (seconds)' columns.
+
+        Returns:
+        dict: Mapping of batch size (int) to predict time in seconds (float).
+        """
+        profile = {}
+        with open(path_to_csv, newline="") as f:
+            for row in csv.DictReader(f):
+                profile[int(row["Batch Size"])] = float(row["Time (seconds)"])
+        return profile
+
+    def estimate_predict_time(self, batch_size):
+        """
+        Estimate predict time for a batch size by linear interpolation over the profile.
+
+        Above the largest measured size, the predict time follows the fixed-plus-per-sample
+        cost line through the two largest measured sizes.
+
+        Parameters:
+        batch_size (int): Batch size to estimate for.
+
+        Returns:
+        float or None: Estimated seconds, or None if no profile is available.
+        """
+        if not self.latency_profile:
+            return None
+        if batch_size in self.latency_profile:
+            return self.latency_profile[batch_size]
+
+        sizes = sorted(self.latency_profile)
+        if batch_size <= sizes[0]:
+            return self.latency_profile[sizes[0]]
+        if batch_size >= sizes[-1]:
+            if len(sizes) == 1:
+                # A single point can't separate fixed and per-sample cost
+                return self.latency_profile[sizes[0]] * batch_size / sizes[0]
+            # Extrapolate the fixed-plus-per-sample cost line through the two largest measured batches
+            lower, upper = sizes[-2], sizes[-1]
+            per_sample = max((self.latency_profile[upper] - self.latency_profile[lower]) / (upper - lower), 0.0)
+            return self.latency_profile[upper] + per_sample * (batch_size - upper)
+
+        for lower, upper in zip(sizes, sizes[1:]):
+            if lower <= batch_size <= upper:
+                t_lower = self.latency_profile[lower]
+                t_upper = self.latency_profile[upper]
+                return t_lower + (t_upper - t_lower) * (batch_size - lower) / (upper - lower)
+
+    def observe_latency(self, batch_size, seconds):
+        """
+        Fold a measured predict latency back into the profile so it tracks the running task.
+
+        Parameters:
+        batch_size (int): Size of the batch that was predicted.
+        seconds (float): Measured predict time.
+        """
+        previous = self.latency_profile.get(batch_size)
+        if previous is None:
+            self.latency_profile[batch_size] = seconds
+        else:
+            self.latency_profile[batch_size] = (1 - self.smoothing) * previous + self.smoothing * seconds
+
+    def target_batch_size(self):
+        """
+        Compute the batch size the scheduler currently aims for.
+
+        Returns:
+        int: Target batch size within [min_batch_size, max_batch_size].
+        """
+        if len(self.latency_profile) < 2:
+            # Without two measured sizes every larger batch looks equally fast, which would lock
+            # the target at the first observed size; probe the largest size until a second point exists
+            best_size = self.max_batch_size
+            batch_sizes = []
+        else:
+            best_size = self.min_batch_size
+            batch_sizes = range(self.min_batch_size, self.max_batch_size + 1)
+
+        best_throughput = 0.0
+        for batch_size in batch_sizes:
+            predict_time = self.estimate_predict_time(batch_size)
+            if self.arrival_rate > 0:
+                fill_time = min(batch_size / self.arrival_rate, self.max_wait_seconds)
+            else:
+                fill_time = self.max_wait_seconds
+            if predict_time + fill_time > self.latency_budget_seconds and batch_size > self.min_batch_size:
+                continue
+            throughput = batch_size / predict_time if predict_time > 0 else float("inf")
+            if throughput > best_throughput:
+                best_size, best_throughput = batch_size, throughput
+
+        if self.arrival_rate > 0:
+            # Don't wait for more records than are expected to arrive within max_wait
+            expected_arrivals = math.ceil(self.arrival_rate * self.max_wait_seconds)
+            best_size = min(best_size, max(expected_arrivals, self.min_batch_size))
+        return best_size
+
+    def _update_arrival_rate(self, n_records, now):
+        if self._last_arrival_time is not None:
+            elapsed = now - self._last_arrival_time
+            if elapsed > 0:
+                rate = n_records / elapsed
+                self.arrival_rate = (1 - self.smoothing) * self.arrival_rate + self.smoothing * rate
+        self._last_arrival_time = now
+
+    def add(self, records, now=None):
+        """
+        Add freshly fetched records to the pending buffer.
+
+        Parameters:
+        records (list[dict]): Records returned by one fetch (may be empty).
+        now (float): Monotonic timestamp, defaults to time.monotonic().
+        """
+        now = time.monotonic() if now is None else now
+        self._update_arrival_rate(len(records), now)
+        if records:
+            self._pending.extend(records)
+            self._pending_times.extend([now] * len(records))
+
+    def ready_batches(self, now=None):
+        """
+        Pop every batch that is due, either because it is full or because it waited long enough.
+
+        Parameters:
+        now (float): Monotonic timestamp, defaults to time.monotonic().
+
+        Returns:
+        list[list[dict]]: Batches ready for inference, in arrival order.
+        """
+        now = time.monotonic() if now is None else now
+        batches = []
+        target = self.target_batch_size()
+        self.last_target_batch_size = target
+
+        while len(self._pending) >= target:
+            batches.append(self._pending[:target])
+            self._pending = self._pending[target:]
+            self._pending_times = self._pending_times[target:]
+
+        if self._pending and now - self._pending_times[0] >= self.max_wait_seconds:
+            batches.append(self._pending)
+            self._pending = []
+            self._pending_times = []
+
+        return batches
+
+    def flush(self):
+        """
+        Return whatever is pending regardless of size, e.g. on shutdown.
+
+        Returns:
+        list[dict]: Remaining pending records.
+        """
+        batch, self._pending, self._pending_times = self._pending, [], []
+        return batch
+
+    def batches(self, record_batches):
+        """
+        Re-batch an iterator of fetched record lists into scheduled inference batches.
+
+        The source iterator must also yield empty lists while the stream is idle,
+        otherwise the max-wait deadline can only be checked on the next arrival.
+        Records still pending when the source is exhausted are yielded as a last batch.
+
+        Parameters:
+        record_batches (iterable[list[dict]]): Fetched records, e.g. from get_records_from_kinesis.
+
+        Yields:
+        list[dict]: Inference batches.
+        """
+        for records in record_batches:
+            self.add(records)
+            for batch in self.ready_batches():
+                logging.debug(f"Scheduled batch of size {len(batch)} "
+                              f"(target {self.last_target_batch_size}, arrival rate {self.arrival_rate:.2f} rec/s).")
+                yield batch
+
+        remaining = self.flush()
+        if remaining:
+            logging.debug(f"Scheduled last batch of size {len(remaining)}.")
+            yield remaining
@@ -0,0 +1,244 @@
+import os
+import json
+import time
+import logging
+import threading
+from collections import deque
+
+
+class FileCheckpointStore:
+    """
+    Keeps the last processed sequence number of every shard in a local JSON file.
+
+    The file is replaced atomically, so a crash while saving leaves the previous
+    checkpoint intact.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._checkpoints = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self._checkpoints = json.load(f)
+
+    def load(self, shard_id):
+        return self._checkpoints.get(shard_id)
+
+    def save(self, shard_id, sequence_number):
+        with self._lock:
+            self._checkpoints[shard_id] = sequence_number
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self._checkpoints, f)
+            os.replace(tmp_path, self.path)
+        return True
+
+
+class LeaseTableCheckpointStore:
+    """
+    Keeps checkpoints in the shard lease table (see shard_consumer.ShardLeaseTable).
+
+    With `require_lease`, a checkpoint is only written while this worker still
+    owns the shard's lease, so a worker that lost a shard cannot move the
+    checkpoint of its new owner backwards.
+    """
+
+    def __init__(self, lease_table, require_lease=True):
+        self.lease_table = lease_table
+        self.require_lease = require_lease
+
+    def load(self, shard_id):
+        return self.lease_table.get_checkpoint(shard_id)
+
+    def save(self, shard_id, sequence_number):
+        return self.lease_table.checkpoint(shard_id, sequence_number, require_lease=self.require_lease)
+
+
+class ShardCheckpointer:
+    """
+    Tracks how far each shard has been processed and saves it periodically.
+
+    The fetch stage reports every GetRecords result with fetched(), and whoever
+    finishes records reports their count with processed(). The pipeline stages
+    keep records in fetch order, so a shard position is safe to checkpoint once
+    all records fetched up to it have been processed. Checkpoints are written
+    every `checkpoint_every_records` processed records or `checkpoint_interval_seconds`,
+    whichever comes first, and immediately for shards read to the end.
+
+    Records that could not be sunk are reported with failed(). Positions fetched
+    before them are still saved, but no checkpoint advances past them, so they are
+    read again after a restart.
+    """
+
+    def __init__(self, store, checkpoint_every_records=100, checkpoint_interval_seconds=10, shard_end="SHARD_END"):
+        self.store = store
+        self.checkpoint_every_records = checkpoint_every_records
+        self.checkpoint_interval_seconds = checkpoint_interval_seconds
+        self.shard_end = shard_end
+        self._lock = threading.Lock()
+        # (fetched record count including this fetch, shard_id, last sequence number of the fetch)
+        self._fetches = deque()
+        self._fetched_count = 0
+        self._processed_count = 0
+        self._records_since_checkpoint = 0
+        self._last_checkpoint_time = time.monotonic()
+        # shard_id -> processed position not saved yet
+        self._pending = {}
+        self._failed = False
+
+    def load(self, shard_id):
+        """
+        Return the saved sequence number of a shard, or None to start from the configured iterator type.
+        """
+        return self.store.load(shard_id)
+
+    def fetched(self, shard_id, sequence_number, n_records):
+        """
+        Report a GetRecords result.
+
+        Parameters:
+        shard_id (str): Shard the records were read from.
+        sequence_number (str): Sequence number of the last record, or SHARD_END once a closed shard is exhausted.
+        n_records (int): Number of records that will be passed downstream.
+        """
+        if sequence_number is None:
+            return
+        with self._lock:
+            self._fetched_count += n_records
+            self._fetches.append((self._fetched_count, shard_id, sequence_number))
+        # A SHARD_END after fully processed records can be saved right away
+        self.processed(0)
+
+    def processed(self, n_records):
+        """
+        Report that the next `n_records` fetched records were fully processed.
+        """
+        with self._lock:
+            self._processed_count += n_records
+            self._records_since_checkpoint += n_records
+            if self._failed:
+                return
+            while self._fetches and self._fetches[0][0] <= self._processed_count:
+                _, shard_id, sequence_number = self._fetches.popleft()
+                self._pending[shard_id] = sequence_number
+
+            reached_shard_end = self.shard_end in self._pending.values()
+            due = (self._records_since_checkpoint >= self.checkpoint_every_records
+                   or time.monotonic() - self._last_checkpoint_time >= self.checkpoint_interval_seconds)
+            if not self._pending or not (due or reached_shard_end):
+                return
+            positions = self._take_pending()
+        self._save(positions)
+
+    def failed(self, n_records):
+        """
+        Report that the next `n_records` fetched records could not be sunk.
+
+        Processed positions before them are saved; later positions are never checkpointed by this
+        process, so the consumer should exit and resume from the saved positions.
+        """
+        with self._lock:
+            if not self._failed:
+                logging.error(f"{n_records} records could not be sunk, checkpoints stop advancing.")
+            self._failed = True
+            self._fetches.clear()
+            positions = self._take_pending()
+        self._save(positions)
+
+    def flush(self):
+        """
+        Save all processed positions, e.g. before releasing leases on shutdown.
+        """
+        with self._lock:
+            positions = self._take_pending()
+        self._save(positions)
+
+    def _take_pending(self):
+        positions = self._pending
+        self._pending = {}
+        self._records_since_checkpoint = 0
+        self._last_checkpoint_time = time.monotonic()
+        return positions
+
+    def _save(self, positions):
+        for shard_id, sequence_number in positions.items():
+            try:
+                if self.store.save(shard_id, sequence_number):
+                    logging.info(f"Checkpointed shard {shard_id} at {sequence_number}")
+                else:
+                    logging.warning(f"Skipped checkpoint of shard {shard_id}: lease is held by another worker.")
+            except Exception as e:
+                logging.error(f"Error checkpointing shard {shard_id}: {e}")
+
+
+class DerivedRecordCheckpointer:
+    """
+    Checkpoints fetched records that are sunk as other records, e.g. parts combined into windows.
+
+    A batch of fetched records counts as processed once every record derived from
+    it and from earlier batches was sunk. Fetched records that only sit in a
+    partially filled window count as processed along with the windows completed
+    before them, so a restart loses at most those partially filled windows.
+    """
+
+    def __init__(self, checkpointer):
+        """
+        Parameters:
+        checkpointer (ShardCheckpointer): Checkpointer the fetched records were reported to.
+        """
+        self.checkpointer = checkpointer
+        self._lock = threading.Lock()
+        # (derived record count including this batch, fetched records in the batch)
+        self._batches = deque()
+        self._derived_count = 0
+        self._sunk_count = 0
+
+    def derive(self, record_batches, derive_batches):
+        """
+        Map fetched batches to derived batches and track which fetched records each one covers.
+
+        Parameters:
+        record_batches (iterable[list[dict]]): Fetched record batches.
+        derive_batches (callable): Generator function yielding exactly one derived batch per input batch,
+                                   e.g. StreamingWindowAssembler.windows.
+
+        Yields:
+        list[dict]: Derived batches.
+        """
+        batch_sizes = deque()
+
+        def counted(batches):
+            for record_batch in batches:
+                batch_sizes.append(len(record_batch))
+                yield record_batch
+
+        for derived_batch in derive_batches(counted(record_batches)):
+            with self._lock:
+                self._derived_count += len(derived_batch)
+                self._batches.append((self._derived_count, batch_sizes.popleft()))
+            self.processed(0)
+            yield derived_batch
+
+    def processed(self, n_records):
+        """
+        Report that the next `n_records` derived records were sunk.
+        """
+        n_fetched = 0
+        with self._lock:
+            self._sunk_count += n_records
+            while self._batches and self._batches[0][0] <= self._sunk_count:
+                n_fetched += self._batches.popleft()[1]
+        if n_fetched:
+            self.checkpointer.processed(n_fetched)
+
+    def failed(self, n_records):
+        """
+        Report that the next `n_records` derived records could not be sunk.
+        """
+        with self._lock:
+            self._batches.clear()
+        self.checkpointer.failed(n_records)
+
+    def flush(self):
+        self.checkpointer.flush()
@@ -0,0 +1,52 @@
+import h5py
+import numpy as np
+from argparse import ArgumentParser
+
+
+def convert_hdf5_to_npy(path_to_hdf5, output_file, dataset_name="tracings", block_size=256):
+    """
+    Convert HDF5 tracings to a contiguous .npy file that can be memory-mapped
+    (see dataset.MemmapECGSequence and analysis.utils.load_ecg_data).
+
+    Blocks are read with read_direct straight into the memory-mapped output, so
+    the conversion never holds more than the HDF5 chunk cache in RAM.
+
+    Parameters:
+    path_to_hdf5 (str): Path to the HDF5 file containing ECG tracings.
+    output_file (str): Path of the .npy file to write.
+    dataset_name (str): Name of the dataset within the HDF5 file.
+    block_size (int): Tracings copied per read, rounded to whole HDF5 chunks.
+    """
+    with h5py.File(path_to_hdf5, "r") as f:
+        dataset = f[dataset_name]
+        if dataset.chunks is not None:
+            chunk_rows = dataset.chunks[0]
+            block_size = max(chunk_rows, block_size // chunk_rows * chunk_rows)
+
+        output = np.lib.format.open_memmap(output_file, mode="w+", dtype=dataset.dtype, shape=dataset.shape)
+        for start in range(0, len(dataset), block_size):
+            end = min(start + block_size, len(dataset))
+            dataset.read_direct(output, source_sel=np.s_[start:end], dest_sel=np.s_[start:end])
+            print(f"Converted tracings {end}/{len(dataset)}", end="\r")
+        output.flush()
+        del output
+    print(f"\nTracings {dataset_name} saved to {output_file}")
+
+
+def parse_arguments():
+    parser = ArgumentParser(description="Convert HDF5 ECG tracings to a memory-mappable .npy file.")
+    parser.add_argument("--hdf5_file", default="./data/ecg_tracings.hdf5", help="Path to the HDF5 file.")
+    parser.add_argument("--dataset_name", default="tracings", help="Name of the dataset in the HDF5 file.")
+    parser.add_argument("--output", default="./data/ecg_tracings.npy", help="Path of the .npy file.")
+    parser.add_argument("--block_size", default=256, type=int, help="Tracings copied per read.")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    convert_hdf5_to_npy(
+        path_to_hdf5=args.hdf5_file,
+        output_file=args.output,
+        dataset_name=args.dataset_name,
+        block_size=args.block_size,
+    )
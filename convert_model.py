@@ -0,0 +1,104 @@
+import h5py
+import numpy as np
+from argparse import ArgumentParser
+import tensorflow as tf
+from tensorflow.keras.models import load_model
+
+
+def representative_dataset(path_to_hdf5, dataset_name="tracings", n_samples=100):
+    """
+    Build a representative dataset generator for INT8 calibration.
+
+    Parameters:
+    path_to_hdf5 (str): Path to the HDF5 file containing ECG tracings.
+    dataset_name (str): Name of the dataset within the HDF5 file.
+    n_samples (int): Number of tracings used for calibration.
+
+    Returns:
+    callable: Generator function yielding single-sample input lists.
+    """
+    def generator():
+        with h5py.File(path_to_hdf5, "r") as f:
+            tracings = f[dataset_name]
+            for i in range(min(n_samples, len(tracings))):
+                yield [np.asarray(tracings[i:i + 1], dtype=np.float32)]
+    return generator
+
+
+def convert_to_tflite(path_to_model, output_file, quantization="none", path_to_hdf5=None,
+                      dataset_name="tracings", n_calibration_samples=100):
+    """
+    Export the Keras model to TFLite, optionally with post-training quantization.
+
+    Parameters:
+    path_to_model (str): Path to the Keras model file.
+    output_file (str): Path of the .tflite file to write.
+    quantization (str): 'none', 'fp16' (float16 weights) or 'int8' (int8 weights and activations).
+    path_to_hdf5 (str): HDF5 tracings used for INT8 calibration.
+    dataset_name (str): Name of the dataset within the HDF5 file.
+    n_calibration_samples (int): Number of tracings used for INT8 calibration.
+    """
+    model = load_model(path_to_model, compile=False)
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+
+    if quantization == "fp16":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif quantization == "int8":
+        if path_to_hdf5 is None:
+            raise ValueError("INT8 quantization needs --hdf5_file for calibration data")
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = representative_dataset(path_to_hdf5, dataset_name, n_calibration_samples)
+    elif quantization != "none":
+        raise ValueError(f"Unsupported quantization: {quantization}")
+
+    with open(output_file, "wb") as f:
+        f.write(converter.convert())
+    print(f"TFLite model ({quantization}) saved to {output_file}")
+
+
+def convert_to_onnx(path_to_model, output_file, opset=11):
+    """
+    Export the Keras model to ONNX with tf2onnx.
+
+    Parameters:
+    path_to_model (str): Path to the Keras model file.
+    output_file (str): Path of the .onnx file to write.
+    opset (int): ONNX opset version.
+    """
+    import tf2onnx
+
+    model = load_model(path_to_model, compile=False)
+    input_signature = [tf.TensorSpec((None,) + tuple(model.input_shape[1:]), tf.float32, name="signal")]
+    tf2onnx.convert.from_keras(model, input_signature=input_signature, opset=opset, output_path=output_file)
+    print(f"ONNX model saved to {output_file}")
+
+
+def parse_arguments():
+    parser = ArgumentParser(description="Convert the Keras ECG model to an optimized inference format.")
+    parser.add_argument("--model", default="./data/model.hdf5", help="Path to the Keras model.")
+    parser.add_argument("--format", choices=["tflite", "onnx"], required=True, help="Target format.")
+    parser.add_argument("--output", required=True, help="Path of the converted model.")
+    parser.add_argument("--quantization", choices=["none", "fp16", "int8"], default="none",
+                        help="Post-training quantization (TFLite only).")
+    parser.add_argument("--hdf5_file", default=None, help="HDF5 tracings for INT8 calibration.")
+    parser.add_argument("--dataset_name", default="tracings", help="Name of the dataset in the HDF5 file.")
+    parser.add_argument("--calibration_samples", default=100, type=int, help="Tracings used for INT8 calibration.")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    if args.format == "tflite":
+        convert_to_tflite(
+            path_to_model=args.model,
+            output_file=args.output,
+            quantization=args.quantization,
+            path_to_hdf5=args.hdf5_file,
+            dataset_name=args.dataset_name,
+            n_calibration_samples=args.calibration_samples,
+        )
+    else:
+        if args.quantization != "none":
+            raise ValueError("Quantization is only supported for the TFLite export")
+        convert_to_onnx(path_to_model=args.model, output_file=args.output)
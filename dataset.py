@@ -1,5 +1,7 @@
 import h5py
 import math
+import queue
+import threading
 import pandas as pd
 from tensorflow.keras.utils import Sequence
 import numpy as np
@@ -33,16 +35,178 @@ class ECGSequence(Sequence):
     def n_classes(self):
         return self.y.shape[1]
 
-    def __getitem__(self, idx):
+    def batch_bounds(self, idx):
         start = self.start_idx + idx * self.batch_size
         end = min(start + self.batch_size, self.end_idx)
+        return start, end
+
+    def read_batch(self, idx, out=None):
+        """
+        Read the tracings of batch `idx` straight from HDF5 into `out` with read_direct.
+
+        Parameters:
+        idx (int): Batch index.
+        out (np.array): Optional buffer of shape (>= batch_size, 4096, 12) to read into.
+
+        Returns:
+        np.array: The tracings, a view of `out` when it is given.
+        """
+        start, end = self.batch_bounds(idx)
+        if out is None:
+            out = np.empty((end - start,) + self.x.shape[1:], dtype=self.x.dtype)
+        else:
+            out = out[:end - start]
+        self.x.read_direct(out, source_sel=np.s_[start:end])
+        return out
+
+    def __getitem__(self, idx):
+        start, end = self.batch_bounds(idx)
         if self.y is None:
-            return np.array(self.x[start:end, :, :])
+            return self.read_batch(idx)
         else:
-            return np.array(self.x[start:end, :, :]), np.array(self.y[start:end])
+            return self.read_batch(idx), np.array(self.y[start:end])
 
     def __len__(self):
         return math.ceil((self.end_idx - self.start_idx) / self.batch_size)
 
     def __del__(self):
         self.f.close()
+
+
+class MemmapECGSequence(ECGSequence):
+    """
+    ECGSequence over tracings converted to a .npy file (see convert_dataset.py).
+
+    The file is memory-mapped, so a batch only reads the pages it covers and
+    batches are returned as views without copying.
+    """
+
+    @classmethod
+    def get_train_and_val(cls, path_to_npy, path_to_csv, batch_size=8, val_split=0.02):
+        n_samples = len(pd.read_csv(path_to_csv))
+        n_train = math.ceil(n_samples*(1-val_split))
+        train_seq = cls(path_to_npy, path_to_csv, batch_size, end_idx=n_train)
+        valid_seq = cls(path_to_npy, path_to_csv, batch_size, start_idx=n_train)
+        return train_seq, valid_seq
+
+    def __init__(self, path_to_npy, path_to_csv=None, batch_size=8, start_idx=0, end_idx=None):
+        if path_to_csv is None:
+            self.y = None
+        else:
+            self.y = pd.read_csv(path_to_csv).values
+        self.x = np.load(path_to_npy, mmap_mode="r")
+        self.batch_size = batch_size
+        if end_idx is None:
+            end_idx = len(self.x)
+        self.start_idx = start_idx
+        self.end_idx = end_idx
+
+    def read_batch(self, idx, out=None):
+        """
+        Return the tracings of batch `idx` as a view of the memory map, or copied into `out`.
+        """
+        start, end = self.batch_bounds(idx)
+        if out is None:
+            return self.x[start:end]
+        out = out[:end - start]
+        out[...] = self.x[start:end]
+        return out
+
+    def __del__(self):
+        # The memory map is closed once the last view of it is released
+        pass
+
+
+def open_ecg_sequence(path_to_tracings, hdf5_dset="tracings", path_to_csv=None, batch_size=8,
+                      start_idx=0, end_idx=None):
+    """
+    Open tracings as a MemmapECGSequence for .npy files and as an ECGSequence for HDF5 files.
+    """
+    if path_to_tracings.endswith(".npy"):
+        return MemmapECGSequence(path_to_tracings, path_to_csv, batch_size, start_idx, end_idx)
+    return ECGSequence(path_to_tracings, hdf5_dset, path_to_csv, batch_size, start_idx, end_idx)
+
+
+def chunk_aligned_batch_size(path_to_hdf5, hdf5_dset, batch_size):
+    """
+    Round a batch size down to a whole number of HDF5 chunks, so every chunk is
+    read (and decompressed) once instead of once per batch that overlaps it.
+    The result never exceeds the requested size, which bounds memory use.
+
+    Parameters:
+    path_to_hdf5 (str): Path to the HDF5 file containing ECG tracings.
+    hdf5_dset (str): Name of the dataset within the HDF5 file.
+    batch_size (int): Requested batch size.
+
+    Returns:
+    int: The largest multiple of the chunk rows not above batch_size, or batch_size when it is smaller
+    than one chunk or the dataset is contiguous.
+    """
+    if path_to_hdf5.endswith(".npy"):
+        return batch_size
+    with h5py.File(path_to_hdf5, "r") as f:
+        chunks = f[hdf5_dset].chunks
+    if chunks is None:
+        return batch_size
+    chunk_rows = chunks[0]
+    if batch_size < chunk_rows:
+        return batch_size
+    return batch_size // chunk_rows * chunk_rows
+
+
+class PrefetchingECGLoader:
+    """
+    Iterates over the tracings of an ECGSequence while a background thread reads
+    the next batches, so disk reads overlap with prediction.
+
+    Batches are read with read_direct into a fixed set of preallocated buffers.
+    A yielded batch is only valid until the next one is requested.
+    """
+
+    def __init__(self, sequence, n_prefetch=2):
+        self.sequence = sequence
+        self.n_prefetch = n_prefetch
+
+    def __len__(self):
+        return len(self.sequence)
+
+    def __iter__(self):
+        sample_shape = self.sequence.x.shape[1:]
+        # Buffers being filled, waiting in the queue and held by the consumer
+        buffers = [np.empty((self.sequence.batch_size,) + sample_shape, dtype=self.sequence.x.dtype)
+                   for _ in range(self.n_prefetch + 2)]
+        filled = queue.Queue(maxsize=self.n_prefetch)
+        stop = threading.Event()
+
+        def put(item):
+            # Give up once the consumer stopped iterating, instead of blocking on a full queue
+            while not stop.is_set():
+                try:
+                    filled.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def read_batches():
+            try:
+                for idx in range(len(self.sequence)):
+                    if not put(self.sequence.read_batch(idx, out=buffers[idx % len(buffers)])):
+                        return
+                put(None)
+            except Exception as e:
+                put(e)
+
+        reader = threading.Thread(target=read_batches, daemon=True)
+        reader.start()
+        try:
+            while True:
+                batch = filled.get()
+                if batch is None:
+                    return
+                if isinstance(batch, Exception):
+                    raise batch
+                yield batch
+        finally:
+            stop.set()
+            reader.join()
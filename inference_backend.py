@@ -0,0 +1,165 @@
+import os
+import time
+import importlib.util
+import logging
+import numpy as np
+
+
+class KerasBackend:
+    """
+    Runs the original Keras model. The model is loaded without compiling,
+    since no optimizer is needed for inference.
+
+    With `batch_buckets`, inference goes through a tf.function traced once per
+    bucket size at startup instead of model.predict, which builds a tf.data
+    pipeline and may retrace on every new batch size. Batches are padded up to
+    the next bucket (and split above the largest one) and the padded rows are
+    dropped from the output.
+    """
+
+    name = "keras"
+
+    def __init__(self, path_to_model, batch_buckets=None):
+        from tensorflow.keras.models import load_model
+
+        self.model = load_model(path_to_model, compile=False)
+        self.batch_buckets = sorted(batch_buckets) if batch_buckets else None
+        self._bucket_functions = {}
+        if self.batch_buckets:
+            self._compile_buckets()
+
+    def _compile_buckets(self):
+        import tensorflow as tf
+
+        input_shape = tuple(self.model.input_shape[1:])
+        model = self.model
+
+        @tf.function
+        def serve(batch):
+            return model(batch, training=False)
+
+        for bucket in self.batch_buckets:
+            started = time.monotonic()
+            concrete_function = serve.get_concrete_function(tf.TensorSpec((bucket,) + input_shape, tf.float32))
+            # Warm up so the first real request doesn't pay for graph initialisation
+            concrete_function(tf.zeros((bucket,) + input_shape, tf.float32))
+            self._bucket_functions[bucket] = concrete_function
+            logging.info(f"Compiled inference function for batch bucket {bucket} "
+                         f"in {time.monotonic() - started:.2f}s.")
+
+    def _predict_bucketed(self, batch):
+        import tensorflow as tf
+
+        max_bucket = self.batch_buckets[-1]
+        outputs = []
+        for start in range(0, len(batch), max_bucket):
+            part = batch[start:start + max_bucket]
+            n_rows = len(part)
+            bucket = next(b for b in self.batch_buckets if b >= n_rows)
+            if bucket > n_rows:
+                padding = np.zeros((bucket - n_rows,) + part.shape[1:], dtype=np.float32)
+                part = np.concatenate((part, padding))
+            # Padded rows are discarded from the output
+            # Concrete functions only accept tensors
+            part = tf.convert_to_tensor(part, dtype=tf.float32)
+            outputs.append(self._bucket_functions[bucket](part).numpy()[:n_rows])
+        return np.concatenate(outputs)
+
+    def predict(self, batch):
+        if self.batch_buckets:
+            return self._predict_bucketed(np.asarray(batch, dtype=np.float32))
+        return self.model.predict(batch, verbose=0)
+
+
+class TFLiteBackend:
+    """
+    Runs a TFLite export of the model (optionally FP16/INT8 quantized, see convert_model.py).
+
+    The interpreter's input tensor is resized whenever the batch size changes.
+    """
+
+    name = "tflite"
+
+    def __init__(self, path_to_model, num_threads=None):
+        import tensorflow as tf
+
+        interpreter_kwargs = {"num_threads": num_threads} if num_threads else {}
+        self.interpreter = tf.lite.Interpreter(model_path=path_to_model, **interpreter_kwargs)
+        self.input_index = self.interpreter.get_input_details()[0]["index"]
+        self.output_index = self.interpreter.get_output_details()[0]["index"]
+        self._batch_size = None
+
+    def predict(self, batch):
+        batch = np.asarray(batch, dtype=np.float32)
+        if batch.shape[0] != self._batch_size:
+            self.interpreter.resize_tensor_input(self.input_index, list(batch.shape))
+            self.interpreter.allocate_tensors()
+            self._batch_size = batch.shape[0]
+        self.interpreter.set_tensor(self.input_index, batch)
+        self.interpreter.invoke()
+        return self.interpreter.get_tensor(self.output_index).copy()
+
+
+class OnnxBackend:
+    """
+    Runs an ONNX export of the model with ONNX Runtime (see convert_model.py).
+    """
+
+    name = "onnx"
+
+    def __init__(self, path_to_model, num_threads=None):
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = onnxruntime.InferenceSession(path_to_model, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def predict(self, batch):
+        batch = np.asarray(batch, dtype=np.float32)
+        return self.session.run(None, {self.input_name: batch})[0]
+
+
+BACKENDS = {
+    KerasBackend.name: KerasBackend,
+    TFLiteBackend.name: TFLiteBackend,
+    OnnxBackend.name: OnnxBackend,
+}
+
+
+def load_backend(backend_name, path_to_model, num_threads=None, batch_buckets=None):
+    """
+    Load an inference backend by name.
+
+    Parameters:
+    backend_name (str): One of 'keras', 'tflite', 'onnx'.
+    path_to_model (str): Path to the model file in the backend's format.
+    num_threads (int): Optional intra-op thread count (TFLite / ONNX Runtime only).
+    batch_buckets (list[int]): Batch sizes to pre-compile (Keras only); None keeps model.predict.
+
+    Returns:
+    object: Backend exposing predict(batch) -> np.array of shape (batch_size, 6).
+    """
+    if backend_name not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{backend_name}', expected one of {sorted(BACKENDS)}")
+
+    if not os.path.exists(path_to_model):
+        raise ValueError(f"Model file {path_to_model} for the '{backend_name}' backend does not exist. The inference "
+                         f"image only contains the models found in data/ at build time; create converted models "
+                         f"with convert_model.py as data/model.tflite or data/model.onnx before building it")
+    if backend_name == OnnxBackend.name and importlib.util.find_spec("onnxruntime") is None:
+        raise ValueError("The 'onnx' backend needs the 'onnxruntime' package (see requirements-prod.txt)")
+
+    logging.info(f"Loading {backend_name} inference backend from {path_to_model}")
+    if backend_name == KerasBackend.name:
+        return KerasBackend(path_to_model, batch_buckets=batch_buckets)
+    return BACKENDS[backend_name](path_to_model, num_threads=num_threads)
+
+
+def default_model_path(backend_name, model_dir="."):
+    """
+    Model file name each backend expects when MODEL_PATH is not set.
+    """
+    file_names = {"keras": "model.hdf5", "tflite": "model.tflite", "onnx": "model.onnx"}
+    return os.path.join(model_dir, file_names[backend_name])
@@ -1,41 +1,116 @@
 import os
-import json
 import numpy as np
 import boto3
 import logging
-from tensorflow.keras.models import load_model
-from tensorflow.keras.optimizers import Adam
 import time
-from decimal import Decimal
+import signal
 from datetime import datetime, timezone
 
-# Configure logging
+from batching import AdaptiveBatcher
+from pipeline import PipelinedConsumer
+from result_sink import BatchResultSink
+from result_format import format_results
+from archive import WaveformArchive, open_archive_store
+from wire_format import decode_record
+from streaming_inference import StreamingWindowAssembler
+from inference_backend import load_backend, default_model_path
+from shard_consumer import ShardLeaseTable, ShardWorker, default_worker_id, get_shard_iterator, run_worker_processes
+from checkpointing import (FileCheckpointStore, LeaseTableCheckpointStore, ShardCheckpointer,
+                           DerivedRecordCheckpointer)
+from kinesis_reader import AdaptivePoller, register_stream_consumer, subscribe_to_shard_records
+from metrics import MetricsRegistry
+from profiling import OnDemandProfiler, forward_signal_to_children
+
+# Configure logging; per-batch messages are logged at DEBUG, the metrics below cover the hot path
 logging.basicConfig(
     format='%(asctime)s: %(levelname)s  %(message)s',
-    level=logging.INFO
+    level=os.getenv('LOG_LEVEL', 'INFO').upper()
 )
 
 STREAM_NAME = os.getenv('STREAM_NAME')
+# With SHARD_ID set, only that shard is read; otherwise shards are leased through LEASE_TABLE_NAME
 SHARD_ID = os.getenv('SHARD_ID')
-PATH_TO_MODEL = "./model.hdf5"
+LEASE_TABLE_NAME = os.getenv('LEASE_TABLE_NAME', 'ecg-inference-shard-leases')
+LEASE_DURATION_SECONDS = float(os.getenv('LEASE_DURATION_SECONDS', 30))
+LEASE_REFRESH_SECONDS = float(os.getenv('LEASE_REFRESH_SECONDS', 10))
+# Worker processes per task, each holding its own model and its own shard leases
+CONSUMER_PROCESSES = int(os.getenv('CONSUMER_PROCESSES', 1))
+# Optional endpoint override, e.g. kinesalite or moto server for local testing
+KINESIS_ENDPOINT_URL = os.getenv('KINESIS_ENDPOINT_URL')
+# Where the single-shard consumer keeps its position: 'dynamodb' (lease table), 'file' or 'none'.
+# Leased shards are always checkpointed in the lease table.
+CHECKPOINT_STORE = os.getenv('CHECKPOINT_STORE', 'dynamodb')
+CHECKPOINT_FILE = os.getenv('CHECKPOINT_FILE', './kinesis_checkpoints.json')
+CHECKPOINT_EVERY_RECORDS = int(os.getenv('CHECKPOINT_EVERY_RECORDS', 100))
+CHECKPOINT_INTERVAL_SECONDS = float(os.getenv('CHECKPOINT_INTERVAL_SECONDS', 10))
+# 'keras' (default), 'tflite' or 'onnx'; converted models are produced by convert_model.py
+INFERENCE_BACKEND = os.getenv('INFERENCE_BACKEND', 'keras')
+PATH_TO_MODEL = os.getenv('MODEL_PATH', default_model_path(INFERENCE_BACKEND))
+INFERENCE_THREADS = int(os.getenv('INFERENCE_THREADS', 0)) or None
+# Batch sizes the Keras backend compiles and warms up at startup; empty to fall back to model.predict
+INFERENCE_BATCH_BUCKETS = [int(size) for size in os.getenv('INFERENCE_BATCH_BUCKETS', '1,2,4,8,16,32,64').split(',')
+                           if size]
 BATCH_SIZE = 15
+MAX_BATCH_SIZE = int(os.getenv('MAX_BATCH_SIZE', 64))
+MAX_BATCH_WAIT_SECONDS = float(os.getenv('MAX_BATCH_WAIT_SECONDS', 1.0))
+BATCH_LATENCY_BUDGET_SECONDS = float(os.getenv('BATCH_LATENCY_BUDGET_SECONDS', 2.0))
+# Optional CSV produced by analysis/test_batch_size.py, used to seed the batch size tuning
+BATCH_LATENCY_PROFILE = os.getenv('BATCH_LATENCY_PROFILE')
+# "aggregated": windows reassembled by the Lambda; "parts": raw 256-sample parts assembled in this service
+INGESTION_MODE = os.getenv('INGESTION_MODE', 'aggregated')
+# Samples between consecutive windows in "parts" mode; smaller than 4096 gives sliding windows
+STREAM_WINDOW_STRIDE = int(os.getenv('STREAM_WINDOW_STRIDE', 4096))
+KINESIS_GET_RECORDS_LIMIT = int(os.getenv('KINESIS_GET_RECORDS_LIMIT', 100))
+# Shards are polled again after the minimum interval while behind, idle shards back off up to the maximum
+KINESIS_POLL_MIN_INTERVAL_SECONDS = float(os.getenv('KINESIS_POLL_MIN_INTERVAL_SECONDS', 0.2))
+KINESIS_POLL_MAX_INTERVAL_SECONDS = float(os.getenv('KINESIS_POLL_MAX_INTERVAL_SECONDS', 1.0))
+# 'polling' (GetRecords) or 'efo' (SubscribeToShard through an enhanced fan-out consumer, SHARD_ID mode only)
+KINESIS_CONSUMER_MODE = os.getenv('KINESIS_CONSUMER_MODE', 'polling')
+EFO_CONSUMER_NAME = os.getenv('EFO_CONSUMER_NAME', 'ecg-inference')
+# 'emf' (CloudWatch Embedded Metric Format lines on stdout), 'prometheus' (HTTP /metrics) or 'none'
+METRICS_EXPORTER = os.getenv('METRICS_EXPORTER', 'emf')
+METRICS_INTERVAL_SECONDS = float(os.getenv('METRICS_INTERVAL_SECONDS', os.getenv('LAG_METRIC_INTERVAL_SECONDS', 60)))
+# Worker process i serves Prometheus metrics on METRICS_PORT + i
+METRICS_PORT = int(os.getenv('METRICS_PORT', 9100))
+# Number of batches that may wait between the fetch, infer and sink stages
+PIPELINE_QUEUE_SIZE = int(os.getenv('PIPELINE_QUEUE_SIZE', 2))
 DYNAMODB_TABLE_NAME = "ecg-data-chunks-processed"
-ABNORMALITIES = ["1dAVb", "RBBB", "LBBB", "SB", "AF", "ST"]
+# Optional endpoint override, e.g. DynamoDB Local for testing the result sink
+DYNAMODB_ENDPOINT_URL = os.getenv('DYNAMODB_ENDPOINT_URL')
+IOT_PUBLISH_WORKERS = int(os.getenv('IOT_PUBLISH_WORKERS', 8))
+# Optional archive of inferred windows: a local directory or s3://bucket/prefix (see archive.py).
+# It is best-effort: checkpoints do not wait for it, so windows still buffered when the
+# consumer dies (up to ARCHIVE_MAX_BUFFERED_WINDOWS or ARCHIVE_FLUSH_INTERVAL_SECONDS) are lost.
+ARCHIVE_URI = os.getenv('ARCHIVE_URI')
+ARCHIVE_ENDPOINT_URL = os.getenv('ARCHIVE_ENDPOINT_URL')
+ARCHIVE_MAX_BUFFERED_WINDOWS = int(os.getenv('ARCHIVE_MAX_BUFFERED_WINDOWS', 256))
+ARCHIVE_FLUSH_INTERVAL_SECONDS = float(os.getenv('ARCHIVE_FLUSH_INTERVAL_SECONDS', 300))
+# Full buffers waiting for upload before the sink blocks
+ARCHIVE_MAX_PENDING_WRITES = int(os.getenv('ARCHIVE_MAX_PENDING_WRITES', 2))
+# On-demand profiling (see profiling.py): `kill -USR1 <pid>` captures a profile, PROFILE_ON_START one at startup
+PROFILE_URI = os.getenv('PROFILE_URI', '/tmp/profiles')
+PROFILE_ENDPOINT_URL = os.getenv('PROFILE_ENDPOINT_URL')
+PROFILE_ON_START = os.getenv('PROFILE_ON_START', 'false').lower() in ('1', 'true', 'yes')
+PROFILE_DURATION_SECONDS = float(os.getenv('PROFILE_DURATION_SECONDS', 30))
+PROFILE_SAMPLE_INTERVAL_SECONDS = float(os.getenv('PROFILE_SAMPLE_INTERVAL_SECONDS', 0.01))
+# Batches covered by the TensorFlow op-level trace (Keras backend only)
+PROFILE_TF_BATCHES = int(os.getenv('PROFILE_TF_BATCHES', 20))
 
 # AWS Clients
-dynamodb = boto3.resource("dynamodb")
+dynamodb_client = boto3.client("dynamodb", endpoint_url=DYNAMODB_ENDPOINT_URL)
 iot_client = boto3.client("iot-data")
-table = dynamodb.Table(DYNAMODB_TABLE_NAME)
-
-
-def decimal_serializer(obj):
-    """
-    Custom serializer for Decimal objects.
-    Converts Decimal to float; raises TypeError for unsupported types.
-    """
-    if isinstance(obj, Decimal):
-        return float(obj)
-    raise TypeError(f"Type {type(obj)} not serializable")
+result_sink = BatchResultSink(dynamodb_client, DYNAMODB_TABLE_NAME, iot_client, max_publish_workers=IOT_PUBLISH_WORKERS)
+metrics = MetricsRegistry("ECGInference", exporter=METRICS_EXPORTER, flush_interval_seconds=METRICS_INTERVAL_SECONDS)
+waveform_archive = None
+if ARCHIVE_URI:
+    waveform_archive = WaveformArchive(open_archive_store(ARCHIVE_URI, ARCHIVE_ENDPOINT_URL),
+                                       max_buffered_windows=ARCHIVE_MAX_BUFFERED_WINDOWS,
+                                       flush_interval_seconds=ARCHIVE_FLUSH_INTERVAL_SECONDS,
+                                       max_pending_writes=ARCHIVE_MAX_PENDING_WRITES)
+profiler = OnDemandProfiler(PROFILE_URI, duration_seconds=PROFILE_DURATION_SECONDS,
+                            sample_interval_seconds=PROFILE_SAMPLE_INTERVAL_SECONDS,
+                            tf_batches=PROFILE_TF_BATCHES if INFERENCE_BACKEND == 'keras' else 0,
+                            endpoint_url=PROFILE_ENDPOINT_URL)
 
 
 def save_full_record_with_prediction(record, prediction):
@@ -43,37 +118,17 @@ def save_full_record_with_prediction(record, prediction):
     Save the full record along with the prediction to DynamoDB and publish to AWS IoT Core.
 
     Parameters:
-    record (dict): The full record from Kinesis.
+    record (dict): The full record from Kinesis, without 'aggregated_data'.
     prediction (np.array): The prediction result to add to the record.
 
     Returns:
     None
     """
     try:
-        # Convert prediction to Decimal
-        record['prediction'] = [Decimal(str(value)) for value in prediction.tolist()]
-        record['sampling_rate_hz'] = Decimal(str(record['sampling_rate_hz']))
-
-        # Convert prediction to binary and map abnormalities
-        binary_prediction = (prediction > 0.5).astype(int)
-        detected_abnormalities = [ABNORMALITIES[i] for i, value in enumerate(binary_prediction) if value == 1]
-        record['detected_abnormalities'] = detected_abnormalities
-
-        # Save the full record to DynamoDB
-        table.put_item(
-            Item=record
-        )
-        logging.info(f"Saved full record with prediction for Device ID: {record['device_id']}, "
+        items, payloads = format_results([record], np.expand_dims(prediction, axis=0))
+        result_sink.flush(items, payloads)
+        logging.info(f"Saved and published record with prediction for Device ID: {record['device_id']}, "
                      f"Timestamp: {record['timestamp_capture_begin']}")
-
-        # Publish record to AWS IoT Core MQTT topic
-        topic = f"iot/ecg/{record['device_id']}/chunk-results/"
-        iot_client.publish(
-            topic=topic,
-            qos=1,
-            payload=json.dumps(record, default=decimal_serializer)
-        )
-        logging.info(f"Published record to IoT Core topic: {topic}")
     except Exception as e:
         logging.error(f"Unexpected error while saving record to DynamoDB or publishing to IoT Core: {e}")
 
@@ -83,14 +138,14 @@ def predict_on_data(model, aggregated_data):
     Predict on a single ECG sample using the pre-trained model.
 
     Parameters:
-    model: Loaded Keras model for prediction.
+    model: Inference backend (see inference_backend.py).
     aggregated_data: ECG data as a NumPy array of shape (4096, 12).
 
     Returns:
     np.array: Prediction for the input ECG data.
     """
     data = np.expand_dims(aggregated_data, axis=0)  # Shape (1, 4096, 12)
-    y_score = model.predict(data, verbose=0)
+    y_score = model.predict(data)
     return y_score
 
 
@@ -99,105 +154,352 @@ def predict_on_batch(model, aggregated_data_batch):
     Predict on a batch of ECG samples using the pre-trained model.
 
     Parameters:
-    model: Loaded Keras model for prediction.
+    model: Inference backend (see inference_backend.py).
     aggregated_data_batch: Batch of ECG data as a NumPy array of shape (batch_size, 4096, 12).
 
     Returns:
     np.array: Predictions for the input batch.
     """
-    y_scores = model.predict(aggregated_data_batch, verbose=0)
+    y_scores = model.predict(aggregated_data_batch)
     return y_scores
 
 
-def get_records_from_kinesis(stream_name, shard_id, shard_iterator_type='TRIM_HORIZON'):
+def get_records_from_kinesis(stream_name, shard_id, shard_iterator_type='TRIM_HORIZON', limit=BATCH_SIZE,
+                             yield_empty=False, checkpointer=None):
     """
-    Retrieve up to 15 records at a time from an Amazon Kinesis stream and process them immediately.
+    Retrieve up to `limit` records at a time from an Amazon Kinesis stream and process them immediately.
+
+    The shard is read again right away (within the per-shard call limit) while MillisBehindLatest
+    shows a backlog, and polling backs off exponentially while it is idle.
+
+    With a checkpointer, reading resumes right after the shard's last checkpoint and every
+    fetch is reported to it. Expired shard iterators are renewed from the last fetched record.
 
     Parameters:
     stream_name (str): Name of the Kinesis stream.
     shard_id (str): Shard ID to consume data from.
-    shard_iterator_type (str): Type of shard iterator to use (e.g., 'TRIM_HORIZON', 'LATEST').
+    shard_iterator_type (str): Type of shard iterator to use when there is no checkpoint (e.g., 'TRIM_HORIZON').
+    limit (int): Maximum number of records per get_records call.
+    yield_empty (bool): Also yield empty lists on idle polls, so callers can act on timeouts.
+    checkpointer (ShardCheckpointer): Optional checkpointer to resume from and report fetched records to.
 
     Yields:
-    list[dict]: A batch of parsed record data (up to 15 records).
+    list[dict]: A batch of parsed record data (up to `limit` records).
     """
-    kinesis_client = boto3.client('kinesis')
+    kinesis_client = boto3.client('kinesis', endpoint_url=KINESIS_ENDPOINT_URL)
 
-    logging.info(f"Getting shard iterator for stream '{stream_name}', shard ID '{shard_id}', "
-                 f"using iterator type '{shard_iterator_type}'.")
+    last_sequence_number = checkpointer.load(shard_id) if checkpointer is not None else None
+    if last_sequence_number is not None:
+        logging.info(f"Resuming stream '{stream_name}', shard ID '{shard_id}' "
+                     f"after sequence number {last_sequence_number}.")
+    else:
+        logging.info(f"Getting shard iterator for stream '{stream_name}', shard ID '{shard_id}', "
+                     f"using iterator type '{shard_iterator_type}'.")
 
     try:
-        shard_iterator = kinesis_client.get_shard_iterator(
-            StreamName=stream_name,
-            ShardId=shard_id,
-            ShardIteratorType=shard_iterator_type,
-        )['ShardIterator']
+        shard_iterator = get_shard_iterator(kinesis_client, stream_name, shard_id, last_sequence_number,
+                                            shard_iterator_type)
         logging.info("Successfully obtained shard iterator.")
     except Exception as e:
         logging.error(f"Error obtaining shard iterator: {e}")
         raise
 
+    poller = AdaptivePoller(KINESIS_POLL_MIN_INTERVAL_SECONDS, KINESIS_POLL_MAX_INTERVAL_SECONDS)
     while True:
+        call_started = time.monotonic()
         try:
-            response = kinesis_client.get_records(ShardIterator=shard_iterator, Limit=15)
+            response = kinesis_client.get_records(ShardIterator=shard_iterator, Limit=limit)
+            fetch_finished = time.monotonic()
             shard_iterator = response['NextShardIterator']
 
             records = response['Records']
+            interval = poller.next_interval(len(records), response.get('MillisBehindLatest'))
+            parsed_records = [decode_record(record['Data']) for record in records]
+            metrics.observe("FetchTime", (fetch_finished - call_started) * 1000)
+            metrics.observe("DecodeTime", (time.monotonic() - fetch_finished) * 1000)
+            metrics.observe("MillisBehindLatest", response.get('MillisBehindLatest'), dimensions={"ShardId": shard_id})
+            metrics.increment("RecordsFetched", len(records))
             if records:
-                parsed_records = [json.loads(record['Data']) for record in records]
-                logging.info(f"Retrieved {len(parsed_records)} records from the stream.")
+                last_sequence_number = records[-1]['SequenceNumber']
+                if checkpointer is not None:
+                    checkpointer.fetched(shard_id, last_sequence_number, len(parsed_records))
+                logging.debug(f"Retrieved {len(parsed_records)} records from the stream "
+                              f"({response.get('MillisBehindLatest')} ms behind latest).")
                 yield parsed_records
-
-            # Avoid hitting Kinesis read limits
-            time.sleep(0.5)
-
+            elif yield_empty:
+                yield []
+
+            # Avoid hitting Kinesis read limits; time spent downstream already counts towards the interval
+            remaining_seconds = call_started + interval - time.monotonic()
+            if remaining_seconds > 0:
+                time.sleep(remaining_seconds)
+
+        except kinesis_client.exceptions.ProvisionedThroughputExceededException:
+            logging.warning("Reads from the shard were throttled, backing off.")
+            metrics.increment("ReadThrottles")
+            time.sleep(poller.backoff())
+        except kinesis_client.exceptions.ExpiredIteratorException:
+            logging.warning("Shard iterator expired, renewing it from the last fetched record.")
+            shard_iterator = get_shard_iterator(kinesis_client, stream_name, shard_id, last_sequence_number,
+                                                shard_iterator_type)
         except Exception as e:
             logging.error(f"Error fetching or processing records: {e}")
             time.sleep(1)  # Adding delay to avoid potential throttling
 
 
-if __name__ == "__main__":
-    logging.info(f"Loading model from {PATH_TO_MODEL}")
-    model = load_model(PATH_TO_MODEL, compile=False)
-    logging.info("Compiling model.")
-    model.compile(loss="binary_crossentropy", optimizer=Adam())
+def get_records_from_subscription(stream_name, shard_id, shard_iterator_type='TRIM_HORIZON', checkpointer=None):
+    """
+    Receive records of one shard pushed through an enhanced fan-out consumer.
 
-    logging.info(f"Starting to consume records from Kinesis stream: {STREAM_NAME}, Shard ID: {SHARD_ID}")
-    try:
-        for record_batch in get_records_from_kinesis(stream_name=STREAM_NAME, shard_id=SHARD_ID):
-            try:
-                # Capture the start of ECS inference
-                timestamp_ecs_inference_started = datetime.now(timezone.utc).isoformat()
+    Parameters:
+    stream_name (str): Name of the Kinesis stream.
+    shard_id (str): Shard ID to consume data from.
+    shard_iterator_type (str): Starting position to use when there is no checkpoint.
+    checkpointer (ShardCheckpointer): Optional checkpointer to resume from and report received records to.
 
-                # Collect aggregated data and metadata from the batch
-                aggregated_data_batch = []
+    Yields:
+    list[dict]: Parsed records of each subscription event, including empty ones.
+    """
+    kinesis_client = boto3.client('kinesis', endpoint_url=KINESIS_ENDPOINT_URL)
+    consumer_arn = register_stream_consumer(kinesis_client, stream_name, EFO_CONSUMER_NAME)
+    sequence_number = checkpointer.load(shard_id) if checkpointer is not None else None
+    yield from subscribe_to_shard_records(kinesis_client, consumer_arn, shard_id, sequence_number,
+                                          shard_iterator_type, yield_empty=True, checkpointer=checkpointer,
+                                          metrics=metrics)
+
+
+def prepare_batch(record_batch):
+    """
+    Convert a batch of Kinesis records into model input (fetch stage).
 
-                for record in record_batch:
-                    aggregated_data = np.array(record['aggregated_data'])
-                    aggregated_data_batch.append(aggregated_data)
+    Parameters:
+    record_batch (list[dict]): Parsed records, each holding 'aggregated_data' as a nested list (JSON records)
+                               or a NumPy array (binary records).
 
-                aggregated_data_batch = np.stack(aggregated_data_batch)  # Convert to NumPy array
+    Returns:
+    tuple: (record_batch, np.array of shape (batch_size, 4096, 12)).
+    """
+    aggregated_data_batch = np.stack([np.asarray(record['aggregated_data']) for record in record_batch])
+    return record_batch, aggregated_data_batch
 
-                logging.info(f"Processing batch of size {len(aggregated_data_batch)}.")
-                predictions = predict_on_batch(model, aggregated_data_batch)
 
-                # Capture the end of ECS inference
-                timestamp_ecs_inference_finished = datetime.now(timezone.utc).isoformat()
+def infer_batch(model, prepared_batch, batcher=None):
+    """
+    Run the model on a prepared batch (infer stage).
+
+    Parameters:
+    model: Inference backend (see inference_backend.py).
+    prepared_batch (tuple): Output of prepare_batch.
+    batcher (AdaptiveBatcher): Optional scheduler to report the measured predict latency to.
+
+    Returns:
+    tuple: (record_batch, predictions, timestamp_ecs_inference_started, timestamp_ecs_inference_finished).
+    """
+    record_batch, aggregated_data_batch = prepared_batch
+
+    # Capture the start of ECS inference
+    timestamp_ecs_inference_started = datetime.now(timezone.utc).isoformat()
 
-                # Save full records with predictions to DynamoDB and publish to MQTT
-                for i, prediction in enumerate(predictions):
-                    record = record_batch[i]  # Get the full record
-                    del record["aggregated_data"]
+    logging.debug(f"Processing batch of size {len(aggregated_data_batch)}.")
+    profiler.before_batch()
+    predict_started = time.monotonic()
+    predictions = predict_on_batch(model, aggregated_data_batch)
+    predict_seconds = time.monotonic() - predict_started
+    profiler.after_batch()
+    if batcher is not None:
+        batcher.observe_latency(len(aggregated_data_batch), predict_seconds)
+    metrics.observe("BatchSize", len(aggregated_data_batch), "Count")
+    metrics.observe("PredictTime", predict_seconds * 1000)
 
-                    # Add ECS inference timestamps
-                    record['timestamp_ecs_inference_started'] = timestamp_ecs_inference_started
-                    record['timestamp_ecs_inference_finished'] = timestamp_ecs_inference_finished
+    # Capture the end of ECS inference
+    timestamp_ecs_inference_finished = datetime.now(timezone.utc).isoformat()
 
-                    save_full_record_with_prediction(record, prediction)
+    return record_batch, predictions, timestamp_ecs_inference_started, timestamp_ecs_inference_finished
 
-            except Exception as e:
-                logging.error(f"Error processing batch: {e}")
 
+def save_batch_with_predictions(inferred_batch):
+    """
+    Save full records with predictions to DynamoDB and publish to MQTT (sink stage).
+
+    Results of the whole batch are formatted at once (see result_format.py), then written with
+    BatchWriteItem and published concurrently by the result sink. With ARCHIVE_URI set, the
+    windows are also buffered for the waveform archive (see archive.py).
+
+    Parameters:
+    inferred_batch (tuple): Output of infer_batch.
+
+    Returns:
+    dict: Flush statistics reported by the result sink.
+    """
+    record_batch, predictions, timestamp_ecs_inference_started, timestamp_ecs_inference_finished = inferred_batch
+
+    for record in record_batch:
+        # Add ECS inference timestamps
+        record['timestamp_ecs_inference_started'] = timestamp_ecs_inference_started
+        record['timestamp_ecs_inference_finished'] = timestamp_ecs_inference_finished
+
+    if waveform_archive is not None:
+        # Archive the full windows before they are dropped from the stored results
+        waveform_archive.add(record_batch, predictions)
+    for record in record_batch:
+        del record["aggregated_data"]
+
+    with metrics.timer("FormatTime"):
+        items, payloads = format_results(record_batch, predictions)
+    stats = result_sink.flush(items, payloads)
+    metrics.observe("SinkTime", stats["flush_seconds"] * 1000)
+    metrics.increment("RecordsProcessed", stats["records"])
+    metrics.increment("FailedWrites", stats["failed_writes"])
+    metrics.increment("FailedPublishes", stats["failed_publishes"])
+    return stats
+
+
+def consume(fetched_batches, checkpointer=None, worker_index=0):
+    """
+    Run batched inference on fetched record batches until interrupted.
+
+    Parameters:
+    fetched_batches (iterable[list[dict]]): Batches of parsed Kinesis records, including empty idle polls.
+    checkpointer (ShardCheckpointer): Optional checkpointer the fetched records are reported to.
+    worker_index (int): Index of the worker process, used to pick its Prometheus port.
+
+    Raises:
+    RuntimeError: With a checkpointer, once a batch fails in any stage; the consumer exits so that it
+                  resumes from the last checkpoint.
+    """
+    if METRICS_EXPORTER == 'prometheus':
+        metrics.serve_prometheus(METRICS_PORT + worker_index)
+    profiler.start()
+    if PROFILE_ON_START:
+        profiler.request()
+    logging.info(f"Loading model from {PATH_TO_MODEL}")
+    model = load_backend(INFERENCE_BACKEND, PATH_TO_MODEL, num_threads=INFERENCE_THREADS,
+                         batch_buckets=INFERENCE_BATCH_BUCKETS)
+
+    latency_profile = None
+    if BATCH_LATENCY_PROFILE:
+        logging.info(f"Loading batch latency profile from {BATCH_LATENCY_PROFILE}")
+        latency_profile = AdaptiveBatcher.load_latency_profile(BATCH_LATENCY_PROFILE)
+    batcher = AdaptiveBatcher(
+        max_batch_size=MAX_BATCH_SIZE,
+        max_wait_seconds=MAX_BATCH_WAIT_SECONDS,
+        latency_budget_seconds=BATCH_LATENCY_BUDGET_SECONDS,
+        latency_profile=latency_profile,
+    )
+
+    if INGESTION_MODE == "parts":
+        assembler = StreamingWindowAssembler(stride=STREAM_WINDOW_STRIDE)
+        if checkpointer is None:
+            fetched_batches = assembler.windows(fetched_batches)
+        else:
+            # Parts count as processed once the windows completed up to them were sunk
+            checkpointer = DerivedRecordCheckpointer(checkpointer)
+            fetched_batches = checkpointer.derive(fetched_batches, assembler.windows)
+
+    def sink(inferred_batch):
+        stats = save_batch_with_predictions(inferred_batch)
+        if stats["failed_writes"]:
+            raise RuntimeError(f"{stats['failed_writes']} results could not be written to DynamoDB")
+        if checkpointer is not None:
+            checkpointer.processed(len(inferred_batch[0]))
+        return stats
+
+    def batch_failed(stage, batch, error):
+        # Records that were never written must be read again: stop checkpointing and exit, so the
+        # worker restarts from the last checkpoint instead of checkpointing past them
+        record_batch = batch if stage == "prepare" else batch[0]
+        checkpointer.failed(len(record_batch))
+        raise RuntimeError(f"Stopping after {len(record_batch)} records failed in the {stage} stage") from error
+
+    consumer = PipelinedConsumer(
+        source=batcher.batches(fetched_batches),
+        prepare=prepare_batch,
+        infer=lambda prepared_batch: infer_batch(model, prepared_batch, batcher),
+        sink=sink,
+        max_pending_batches=PIPELINE_QUEUE_SIZE,
+        on_error=batch_failed if checkpointer is not None else None,
+    )
+    try:
+        consumer.run()
+    finally:
+        result_sink.close()
+        if waveform_archive is not None:
+            waveform_archive.close()
+        metrics.flush()
+        if checkpointer is not None:
+            checkpointer.flush()
+
+
+def create_single_shard_checkpointer():
+    """
+    Build the checkpointer for the SHARD_ID consumer from CHECKPOINT_STORE.
+
+    Returns:
+    ShardCheckpointer or None: None when checkpointing is disabled.
+    """
+    if CHECKPOINT_STORE == 'none':
+        return None
+    if CHECKPOINT_STORE == 'file':
+        store = FileCheckpointStore(CHECKPOINT_FILE)
+    elif CHECKPOINT_STORE == 'dynamodb':
+        lease_table = ShardLeaseTable(boto3.client('dynamodb', endpoint_url=DYNAMODB_ENDPOINT_URL),
+                                      LEASE_TABLE_NAME, default_worker_id())
+        store = LeaseTableCheckpointStore(lease_table, require_lease=False)
+    else:
+        raise ValueError(f"Unknown CHECKPOINT_STORE '{CHECKPOINT_STORE}', expected 'dynamodb', 'file' or 'none'")
+    return ShardCheckpointer(store, checkpoint_every_records=CHECKPOINT_EVERY_RECORDS,
+                             checkpoint_interval_seconds=CHECKPOINT_INTERVAL_SECONDS)
+
+
+def consume_leased_shards(worker_index):
+    """
+    Worker process entry point: consume every shard this process holds a lease for.
+
+    Parameters:
+    worker_index (int): Index of the worker process within the task.
+    """
+    worker_id = default_worker_id()
+    logging.info(f"Worker process {worker_index} ({worker_id}) consuming stream {STREAM_NAME} "
+                 f"with leases from {LEASE_TABLE_NAME} (ingestion mode: {INGESTION_MODE})")
+    lease_table = ShardLeaseTable(boto3.client('dynamodb', endpoint_url=DYNAMODB_ENDPOINT_URL), LEASE_TABLE_NAME,
+                                  worker_id, lease_duration_seconds=LEASE_DURATION_SECONDS)
+    checkpointer = ShardCheckpointer(LeaseTableCheckpointStore(lease_table),
+                                     checkpoint_every_records=CHECKPOINT_EVERY_RECORDS,
+                                     checkpoint_interval_seconds=CHECKPOINT_INTERVAL_SECONDS)
+    worker = ShardWorker(boto3.client('kinesis', endpoint_url=KINESIS_ENDPOINT_URL), lease_table, STREAM_NAME,
+                         limit=KINESIS_GET_RECORDS_LIMIT, lease_refresh_seconds=LEASE_REFRESH_SECONDS,
+                         min_poll_interval_seconds=KINESIS_POLL_MIN_INTERVAL_SECONDS,
+                         max_poll_interval_seconds=KINESIS_POLL_MAX_INTERVAL_SECONDS,
+                         checkpointer=checkpointer, metrics=metrics)
+    try:
+        consume(worker.record_batches(yield_empty=True), checkpointer, worker_index)
+    except KeyboardInterrupt:
+        logging.info("Shutting down worker process.")
+    finally:
+        worker.close()
+
+
+if __name__ == "__main__":
+    # A profile request during startup stays pending instead of killing the process, until
+    # profiler.start() (single shard) or forward_signal_to_children (worker parent) handles it
+    signal.pthread_sigmask(signal.SIG_BLOCK, [signal.SIGUSR1])
+    try:
+        if SHARD_ID:
+            logging.info(f"Starting to consume records from Kinesis stream: {STREAM_NAME}, Shard ID: {SHARD_ID} "
+                         f"(ingestion mode: {INGESTION_MODE})")
+            checkpointer = create_single_shard_checkpointer()
+            if KINESIS_CONSUMER_MODE == 'efo':
+                fetched_batches = get_records_from_subscription(STREAM_NAME, SHARD_ID, checkpointer=checkpointer)
+            else:
+                fetched_batches = get_records_from_kinesis(stream_name=STREAM_NAME, shard_id=SHARD_ID,
+                                                           limit=KINESIS_GET_RECORDS_LIMIT, yield_empty=True,
+                                                           checkpointer=checkpointer)
+            consume(fetched_batches, checkpointer)
+        else:
+            logging.info(f"Starting {CONSUMER_PROCESSES} consumer processes for Kinesis stream: {STREAM_NAME}")
+            # Profile captures are requested on the parent (the container's main process) and run in every worker
+            forward_signal_to_children(signal.SIGUSR1)
+            run_worker_processes(consume_leased_shards, CONSUMER_PROCESSES, blocked_signals=[signal.SIGUSR1])
     except KeyboardInterrupt:
         logging.info("Shutting down consumer.")
     except Exception as e:
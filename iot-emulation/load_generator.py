@@ -0,0 +1,255 @@
+import json
+import math
+import time
+import asyncio
+import threading
+import h5py
+import numpy as np
+from argparse import ArgumentParser
+from datetime import datetime, timedelta
+from awscrt import io, mqtt
+from awsiot import mqtt_connection_builder
+
+import logging
+logging.basicConfig(level=logging.INFO)
+
+SAMPLING_RATE_HZ = 400
+PART_SIZE = 256
+PARTS_PER_CHUNK = 16
+# AWS IoT Core throttles publishes above this rate on a single connection
+MAX_PUBLISHES_PER_CONNECTION = 100
+
+
+def parse_arguments():
+    """Parse command-line arguments for the load generator."""
+    parser = ArgumentParser(description="Publish ECG data of many emulated devices to AWS IoT Core or a local broker.")
+    parser.add_argument("--endpoint", help="AWS IoT Core endpoint.")
+    parser.add_argument("--cert", help="Path to the device certificate.")
+    parser.add_argument("--private_key", help="Path to the private key.")
+    parser.add_argument("--root_ca", help="Path to the Root CA certificate.")
+    parser.add_argument("--local_broker", help="host:port of a local MQTT broker (no TLS), e.g. localhost:1883.")
+    parser.add_argument("--topic", default="iot/ecg/data-chunks/", help="MQTT topic to publish messages to.")
+    parser.add_argument("--hdf5_file", required=True, help="Path to the HDF5 file containing ECG data.")
+    parser.add_argument("--dataset_name", default="tracings", help="Name of the dataset in the HDF5 file.")
+    parser.add_argument("--records", default=20, type=int, help="Tracings pre-encoded and replayed by the devices.")
+    parser.add_argument("--devices", default=1000, type=int, help="Number of emulated devices.")
+    parser.add_argument("--device_prefix", default="loadgen_device_", help="Prefix of the emulated device ids.")
+    parser.add_argument("--connections", type=int,
+                        help="MQTT connections shared by the devices. AWS IoT Core allows "
+                             f"{MAX_PUBLISHES_PER_CONNECTION} publishes/s per connection, so the default opens "
+                             "enough connections to stay below it (devices * 400 / 256 / 100).")
+    parser.add_argument("--duration", default=60.0, type=float, help="Seconds to publish for.")
+    parser.add_argument("--qos", default=0, type=int, choices=[0, 1], help="MQTT QoS; 1 measures latency to PUBACK.")
+    parser.add_argument("--report_interval", default=5.0, type=float, help="Seconds between progress reports.")
+    return parser.parse_args()
+
+
+def default_connections(n_devices):
+    """Number of connections that keeps every connection below the IoT Core publish limit."""
+    publish_rate = n_devices * SAMPLING_RATE_HZ / PART_SIZE
+    return max(1, math.ceil(publish_rate / MAX_PUBLISHES_PER_CONNECTION))
+
+
+def format_timestamp(timestamp):
+    """Same timestamp format as send_ecg_data.prepare_message."""
+    return timestamp.strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+
+
+def pre_encode_parts(path_to_hdf5, dataset_name, n_records):
+    """
+    JSON-encode the ecg_data of every part once, so the send loop only fills in the metadata.
+
+    Parameters:
+    path_to_hdf5 (str): Path to the HDF5 file containing ECG data.
+    dataset_name (str): Name of the dataset in the HDF5 file.
+    n_records (int): Number of tracings to encode.
+
+    Returns:
+    list[list[str]]: Encoded ecg_data per tracing and part.
+    """
+    with h5py.File(path_to_hdf5, "r") as f:
+        tracings = f[dataset_name][:n_records]
+    return [[json.dumps(tracing[start:start + PART_SIZE].tolist()) for start in range(0, len(tracing), PART_SIZE)]
+            for tracing in tracings]
+
+
+def encode_message(device_id, chunk_idx, part, timestamp_capture_begin, encoded_ecg_data):
+    """
+    Build the message payload with the same fields as send_ecg_data.prepare_message.
+    """
+    return (
+        f'{{"device_id": "{device_id}", '
+        f'"timestamp_chunk_sent": "{format_timestamp(datetime.now())}", '
+        f'"timestamp_capture_begin": "{format_timestamp(timestamp_capture_begin)}", '
+        f'"sampling_rate_hz": {SAMPLING_RATE_HZ}, "chunk_idx": {chunk_idx}, "part": {part}, '
+        f'"ecg_data": {encoded_ecg_data}}}'
+    )
+
+
+def build_connection(args, client_id):
+    """Build an mTLS connection to AWS IoT Core, or a plain TCP connection to a local broker."""
+    if args.local_broker:
+        host, port = args.local_broker.rsplit(":", 1)
+        client = mqtt.Client(io.ClientBootstrap.get_or_create_static_default(), None)
+        return mqtt.Connection(client=client, host_name=host, port=int(port), client_id=client_id,
+                               clean_session=True)
+    return mqtt_connection_builder.mtls_from_path(
+        endpoint=args.endpoint,
+        cert_filepath=args.cert,
+        pri_key_filepath=args.private_key,
+        ca_filepath=args.root_ca,
+        client_id=client_id,
+        clean_session=True,
+    )
+
+
+class PublishStats:
+    """
+    Counts publishes and collects publish latencies (publish call until the CRT future completes).
+
+    Completion callbacks run on CRT threads, so updates are guarded by a lock.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.sent = 0
+        self.failed = 0
+        self.latencies = []
+        self.late_seconds = []
+
+    def track(self, publish_future, started):
+        with self._lock:
+            self.sent += 1
+
+        def on_done(future):
+            latency = time.perf_counter() - started
+            with self._lock:
+                if future.exception() is not None:
+                    self.failed += 1
+                else:
+                    self.latencies.append(latency)
+
+        publish_future.add_done_callback(on_done)
+
+    def record_lateness(self, seconds):
+        with self._lock:
+            self.late_seconds.append(seconds)
+
+    def take(self):
+        with self._lock:
+            snapshot = (self.sent, self.failed, self.latencies, self.late_seconds)
+            self.sent, self.failed, self.latencies, self.late_seconds = 0, 0, [], []
+        return snapshot
+
+
+def report(sent, failed, latencies, late_seconds, elapsed, label):
+    line = f"{label}: {sent / elapsed:.1f} msg/s, {failed} failed"
+    if latencies:
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+        line += f", publish latency p50={p50:.1f}ms p95={p95:.1f}ms p99={p99:.1f}ms"
+    if late_seconds:
+        line += f", pacing lag p99={np.percentile(late_seconds, 99) * 1000:.1f}ms"
+    print(line)
+
+
+async def emulate_device(device_index, args, connection, encoded_parts, stats, started_at, stop_at):
+    """
+    Publish the parts of one device at exactly one part per 256 samples at 400 Hz.
+
+    Send times are scheduled against the start time instead of sleeping a fixed
+    interval after each publish, so time spent publishing never accumulates as drift.
+    Devices start with evenly spread phase offsets so the load is uniform.
+    """
+    loop = asyncio.get_running_loop()
+    interval = PART_SIZE / SAMPLING_RATE_HZ
+    device_id = f"{args.device_prefix}{device_index}"
+    start = started_at + interval * device_index / args.devices
+    capture_start = datetime.now() + timedelta(seconds=start - loop.time())
+
+    sequence = 0
+    while True:
+        send_at = start + sequence * interval
+        if send_at >= stop_at:
+            return
+        delay = send_at - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        stats.record_lateness(loop.time() - send_at)
+
+        chunk_idx, part = divmod(sequence, PARTS_PER_CHUNK)
+        encoded_ecg_data = encoded_parts[(device_index + chunk_idx) % len(encoded_parts)][part]
+        timestamp_capture_begin = capture_start + timedelta(seconds=sequence * interval)
+        payload = encode_message(device_id, chunk_idx, part, timestamp_capture_begin, encoded_ecg_data)
+
+        publish_started = time.perf_counter()
+        publish_future, _ = connection.publish(topic=args.topic, payload=payload,
+                                               qos=mqtt.QoS.AT_LEAST_ONCE if args.qos else mqtt.QoS.AT_MOST_ONCE)
+        stats.track(publish_future, publish_started)
+        sequence += 1
+
+
+async def run_load(args, connections, encoded_parts):
+    loop = asyncio.get_running_loop()
+    stats = PublishStats()
+    started_at = loop.time() + 1.0
+    stop_at = started_at + args.duration
+
+    devices = [
+        asyncio.ensure_future(emulate_device(i, args, connections[i % len(connections)], encoded_parts, stats,
+                                             started_at, stop_at))
+        for i in range(args.devices)
+    ]
+    expected_rate = args.devices * SAMPLING_RATE_HZ / PART_SIZE
+    print(f"Emulating {args.devices} devices on {len(connections)} connections (target {expected_rate:.1f} msg/s)")
+
+    await asyncio.sleep(max(0.0, started_at - loop.time()))
+    totals = [0, 0, [], []]
+    last_report = loop.time()
+    while not all(device.done() for device in devices):
+        await asyncio.sleep(args.report_interval)
+        now = loop.time()
+        snapshot = stats.take()
+        report(*snapshot, now - last_report, f"t={now - started_at:.0f}s")
+        totals = [total + value for total, value in zip(totals, snapshot)]
+        last_report = now
+    for device in devices:
+        device.result()
+
+    # Let the last publishes complete before the final summary
+    await asyncio.sleep(1.0)
+    snapshot = stats.take()
+    totals = [total + value for total, value in zip(totals, snapshot)]
+    report(*totals, args.duration, "total")
+
+
+def main():
+    args = parse_arguments()
+    if not args.local_broker and not (args.endpoint and args.cert and args.private_key and args.root_ca):
+        raise SystemExit("Either --local_broker or --endpoint, --cert, --private_key and --root_ca are required.")
+
+    if args.connections is None:
+        args.connections = default_connections(args.devices)
+    publish_rate = args.devices * SAMPLING_RATE_HZ / PART_SIZE / args.connections
+    if publish_rate > MAX_PUBLISHES_PER_CONNECTION and not args.local_broker:
+        print(f"Warning: {publish_rate:.0f} publishes/s per connection exceed the AWS IoT Core limit of "
+              f"{MAX_PUBLISHES_PER_CONNECTION}/s; throttling will be measured instead of the pipeline.")
+
+    print(f"Pre-encoding {args.records} tracings from {args.hdf5_file}...")
+    encoded_parts = pre_encode_parts(args.hdf5_file, args.dataset_name, args.records)
+
+    connections = [build_connection(args, f"{args.device_prefix}connection_{i}") for i in range(args.connections)]
+    for connection in connections:
+        connection.connect().result()
+    print(f"Connected {len(connections)} MQTT connections.")
+
+    try:
+        asyncio.run(run_load(args, connections, encoded_parts))
+    finally:
+        print("Disconnecting...")
+        for connection in connections:
+            connection.disconnect().result()
+        print("Disconnected successfully.")
+
+
+if __name__ == "__main__":
+    main()
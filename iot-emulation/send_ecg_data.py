@@ -23,7 +23,7 @@ def parse_arguments():
     parser.add_argument("--root_ca", required=True, help="Path to the Root CA certificate.")
     parser.add_argument("--hdf5_file", required=True, help="Path to the HDF5 file containing ECG data.")
     parser.add_argument("--dataset_name", required=True, help="Name of the dataset in the HDF5 file.")
-    parser.add_argument("--interval", default=0.64, type=int, help="Interval in seconds between data chunks.")
+    parser.add_argument("--interval", default=0.64, type=float, help="Interval in seconds between data chunks.")
     return parser.parse_args()
 
 
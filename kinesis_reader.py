@@ -0,0 +1,147 @@
+import time
+import logging
+
+from wire_format import decode_record
+
+# GetRecords is limited to 5 calls per second per shard
+GET_RECORDS_MIN_INTERVAL_SECONDS = 0.2
+
+
+class AdaptivePoller:
+    """
+    Decides when to call GetRecords next on one shard.
+
+    While the shard has a backlog (MillisBehindLatest > 0) it is read again as
+    soon as the per-shard call rate allows. Once caught up, empty responses back
+    off exponentially up to `max_interval_seconds`, and any record resets the backoff.
+    Throttled calls back off the same way as empty ones.
+    """
+
+    def __init__(self, min_interval_seconds=GET_RECORDS_MIN_INTERVAL_SECONDS, max_interval_seconds=1.0,
+                 backoff_factor=2.0):
+        self.min_interval_seconds = min_interval_seconds
+        self.max_interval_seconds = max_interval_seconds
+        self.backoff_factor = backoff_factor
+        self.idle_interval_seconds = min_interval_seconds
+        self.millis_behind_latest = None
+
+    def next_interval(self, n_records, millis_behind_latest):
+        """
+        Record a GetRecords response and return the time until the next call.
+
+        Parameters:
+        n_records (int): Number of records returned.
+        millis_behind_latest (int): MillisBehindLatest of the response.
+
+        Returns:
+        float: Seconds between the start of this call and the start of the next one.
+        """
+        self.millis_behind_latest = millis_behind_latest
+        if n_records or millis_behind_latest:
+            self.idle_interval_seconds = self.min_interval_seconds
+            return self.min_interval_seconds
+        return self.backoff()
+
+    def backoff(self):
+        """
+        Return the current idle interval and grow it for the next idle response.
+        """
+        interval = self.idle_interval_seconds
+        self.idle_interval_seconds = min(self.idle_interval_seconds * self.backoff_factor, self.max_interval_seconds)
+        return interval
+
+
+def register_stream_consumer(kinesis_client, stream_name, consumer_name, timeout_seconds=60):
+    """
+    Register (or look up) an enhanced fan-out consumer and wait until it is active.
+
+    Parameters:
+    kinesis_client: boto3 Kinesis client.
+    stream_name (str): Name of the Kinesis stream.
+    consumer_name (str): Name of the stream consumer.
+    timeout_seconds (float): How long to wait for the consumer to become active.
+
+    Returns:
+    str: Consumer ARN.
+    """
+    stream_arn = kinesis_client.describe_stream_summary(StreamName=stream_name)["StreamDescriptionSummary"]["StreamARN"]
+    try:
+        consumer = kinesis_client.describe_stream_consumer(StreamARN=stream_arn, ConsumerName=consumer_name)[
+            "ConsumerDescription"]
+    except kinesis_client.exceptions.ResourceNotFoundException:
+        logging.info(f"Registering enhanced fan-out consumer '{consumer_name}' on stream '{stream_name}'.")
+        consumer = kinesis_client.register_stream_consumer(StreamARN=stream_arn, ConsumerName=consumer_name)[
+            "Consumer"]
+
+    deadline = time.monotonic() + timeout_seconds
+    while consumer["ConsumerStatus"] != "ACTIVE":
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"Stream consumer '{consumer_name}' is still {consumer['ConsumerStatus']}")
+        time.sleep(1)
+        consumer = kinesis_client.describe_stream_consumer(ConsumerARN=consumer["ConsumerARN"])["ConsumerDescription"]
+    return consumer["ConsumerARN"]
+
+
+def subscribe_to_shard_records(kinesis_client, consumer_arn, shard_id, sequence_number=None,
+                               shard_iterator_type="TRIM_HORIZON", yield_empty=False, checkpointer=None,
+                               metrics=None):
+    """
+    Receive records pushed through SubscribeToShard (enhanced fan-out) instead of polling.
+
+    Subscriptions expire after five minutes and are renewed from the last
+    continuation sequence number, so no records are skipped between them.
+
+    Parameters:
+    kinesis_client: boto3 Kinesis client.
+    consumer_arn (str): ARN from register_stream_consumer.
+    shard_id (str): Shard to subscribe to.
+    sequence_number (str): Resume right after this sequence number, e.g. a checkpoint.
+    shard_iterator_type (str): Starting position when there is no sequence number.
+    yield_empty (bool): Also yield empty lists for events without records.
+    checkpointer (ShardCheckpointer): Optional checkpointer to report received records to.
+    metrics (MetricsRegistry): Optional registry for MillisBehindLatest and decode time.
+
+    Yields:
+    list[dict]: Parsed records of one subscription event.
+    """
+    while True:
+        if sequence_number is not None:
+            starting_position = {"Type": "AFTER_SEQUENCE_NUMBER", "SequenceNumber": sequence_number}
+        else:
+            starting_position = {"Type": shard_iterator_type}
+        logging.info(f"Subscribing to shard {shard_id} from {starting_position}.")
+        try:
+            response = kinesis_client.subscribe_to_shard(ConsumerARN=consumer_arn, ShardId=shard_id,
+                                                         StartingPosition=starting_position)
+            for event in response["EventStream"]:
+                shard_event = event.get("SubscribeToShardEvent")
+                if shard_event is None:
+                    continue
+                records = shard_event["Records"]
+                decode_started = time.perf_counter()
+                parsed_records = [decode_record(record["Data"]) for record in records]
+                if metrics is not None:
+                    metrics.observe("MillisBehindLatest", shard_event["MillisBehindLatest"],
+                                    dimensions={"ShardId": shard_id})
+                    metrics.observe("DecodeTime", (time.perf_counter() - decode_started) * 1000)
+                    metrics.increment("RecordsFetched", len(records))
+                if records:
+                    if checkpointer is not None:
+                        checkpointer.fetched(shard_id, records[-1]["SequenceNumber"], len(parsed_records))
+                    logging.debug(f"Received {len(parsed_records)} records from shard {shard_id}.")
+                    yield parsed_records
+                elif yield_empty:
+                    yield []
+
+                sequence_number = shard_event.get("ContinuationSequenceNumber")
+                if sequence_number is None:
+                    # Closed shard read to the end; its children continue the device streams
+                    logging.info(f"Shard {shard_id} was closed and fully read.")
+                    return
+        except kinesis_client.exceptions.ResourceInUseException as e:
+            # The previous subscription for this consumer and shard is still being torn down
+            logging.warning(f"Subscription to shard {shard_id} is still in use: {e}")
+            time.sleep(1)
+        except Exception as e:
+            logging.error(f"Error in subscription to shard {shard_id}: {e}")
+            time.sleep(1)
@@ -1,20 +1,55 @@
 import os
 import json
+import logging
+import base64
+import time
 import boto3
+import threading
+import numpy as np
 
 from decimal import Decimal
-from boto3.dynamodb.conditions import Key, Attr
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 
+from metrics import MetricsRegistry
+from wire_format import check_compression, encode_window, unpack_samples
+
 
 DYNAMODB_TABLE_NAME = os.environ.get("DYNAMODB_TABLE_NAME")
 KINESIS_STREAM_NAME = os.environ.get("KINESIS_STREAM_NAME")
-
-dynamodb = boto3.resource("dynamodb")
-table = dynamodb.Table(DYNAMODB_TABLE_NAME)
-kinesis = boto3.client("kinesis")
+# "json" keeps the legacy payload, "binary" uses the wire_format envelope
+KINESIS_PAYLOAD_FORMAT = os.environ.get("KINESIS_PAYLOAD_FORMAT", "json")
+KINESIS_PAYLOAD_COMPRESSION = os.environ.get("KINESIS_PAYLOAD_COMPRESSION", "none")
+# Optional endpoint overrides, e.g. DynamoDB Local / kinesalite for local benchmarks
+DYNAMODB_ENDPOINT_URL = os.environ.get("DYNAMODB_ENDPOINT_URL")
+KINESIS_ENDPOINT_URL = os.environ.get("KINESIS_ENDPOINT_URL")
+# Number of devices whose records are processed concurrently within one invocation
+AGGREGATION_WORKERS = int(os.environ.get("AGGREGATION_WORKERS", 8))
+# DEBUG logs every record and part; INFO keeps only errors and per-invocation summaries
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO")
+# 'emf' prints CloudWatch Embedded Metric Format lines at the end of each invocation
+METRICS_EXPORTER = os.environ.get("METRICS_EXPORTER", "emf")
+
+# The Lambda runtime attaches its handler to the root logger
+logger = logging.getLogger()
+logger.setLevel(LOG_LEVEL)
+
+# A codec the runtime can't provide fails the cold start instead of every window
+if KINESIS_PAYLOAD_FORMAT == "binary":
+    check_compression(KINESIS_PAYLOAD_COMPRESSION)
+
+# Flushed explicitly at the end of each invocation
+metrics = MetricsRegistry("ECGAggregation", exporter=METRICS_EXPORTER, flush_interval_seconds=float("inf"))
+
+# Low-level clients only: unlike boto3 resources they are safe to share between threads
+dynamodb_client = boto3.client("dynamodb", endpoint_url=DYNAMODB_ENDPOINT_URL)
+kinesis = boto3.client("kinesis", endpoint_url=KINESIS_ENDPOINT_URL)
 
 AGGREGATED_DATA_PARTS = 16
+AGGREGATED_DATA_LENGTH = 4096
+AGGREGATED_DATA_LEADS = 12
+SINGLE_LEAD_DEVICE_ID = "physical_iot_device_1"
 
 
 def lambda_handler(event, context):
@@ -24,44 +59,110 @@ def lambda_handler(event, context):
     # Capture the processing start time
     lambda_processing_started = datetime.now(timezone.utc).isoformat()
 
-    print("DEBUG: Received event from DynamoDB Streams.")
-    print("DEBUG: Event Metadata:")
-    print(f"Event ID: {context.aws_request_id}")
-    print(f"Function Name: {context.function_name}")
-    print(f"Event Source: {event.get('eventSource', 'Unknown')}")
-    print(f"Number of Records: {len(event['Records'])}")
-    print(f"DEBUG: Print whole event.")
+    logger.debug(f"Received event from DynamoDB Streams. Event ID: {context.aws_request_id}, "
+                 f"Function Name: {context.function_name}, "
+                 f"Event Source: {event.get('eventSource', 'Unknown')}, "
+                 f"Number of Records: {len(event['Records'])}")
+    metrics.increment("PartsReceived", len(event["Records"]))
+
+    # Records of one device are processed in order; different devices run concurrently
+    records_by_device = OrderedDict()
+    for record in event["Records"]:
+        device_id = record["dynamodb"].get("Keys", {}).get("device_id", {}).get("S")
+        records_by_device.setdefault(device_id, []).append(record)
+
+    # Completed windows of the whole invocation are sent with batched PutRecords calls
+    producer = KinesisBatchProducer(kinesis, KINESIS_STREAM_NAME)
+
+    failed_sequence_numbers = []
+    with ThreadPoolExecutor(max_workers=AGGREGATION_WORKERS) as executor:
+        futures = [
+            executor.submit(process_device_records, records, lambda_processing_started, producer)
+            for records in records_by_device.values()
+        ]
+        for future in futures:
+            failed_sequence_number = future.result()
+            if failed_sequence_number is not None:
+                failed_sequence_numbers.append(failed_sequence_number)
+
+    producer.flush()
+    for result in producer.results:
+        chunk = result["context"]
+        if "ErrorCode" in result:
+            metrics.increment("KinesisPutFailures")
+            logger.error(
+                f"Failed to send chunk {chunk['chunk_idx']} of device {chunk['device_id']} to Kinesis: "
+                f"{result['ErrorCode']} {result.get('ErrorMessage', '')}"
+            )
+            failed_sequence_numbers.append(chunk["sequence_number"])
+            release_chunk_lock(chunk)
+            continue
+        # A failed completion must not fail the whole batch; the chunk's record is retried on its own
+        try:
+            complete_chunk(chunk["device_id"], chunk["chunk_idx"], chunk["items"])
+            metrics.increment("ChunksAggregated")
+        except Exception as e:
+            logger.error(f"Failed to mark chunk {chunk['chunk_idx']} of device {chunk['device_id']} as done: {e}")
+            failed_sequence_numbers.append(chunk["sequence_number"])
+            release_chunk_lock(chunk)
+
+    metrics.increment("FailedRecords", len(set(failed_sequence_numbers)))
+    logger.info(f"Processed {len(event['Records'])} records from {len(records_by_device)} devices, "
+                f"{len(producer.results)} windows sent, {len(set(failed_sequence_numbers))} records failed.")
+    metrics.flush()
+
+    # Partial batch response: only the failed records (and what follows them) are retried
+    return {"batchItemFailures": [
+        {"itemIdentifier": sequence_number} for sequence_number in dict.fromkeys(failed_sequence_numbers)
+    ]}
+
+
+def process_device_records(records, lambda_processing_started, producer=None):
+    """
+    Process the stream records of a single device in order.
+
+    Stops at the first failing record, since the event source retries from the
+    lowest reported sequence number and later records of the device would be
+    replayed anyway.
 
-    try:
-        for record in event["Records"]:
-            print("DEBUG: Processing record metadata:")
-            print(f"Event Name: {record['eventName']}")
-            print(f"Event Source ARN: {record['eventSourceARN']}")
-            print(f"Record Keys: {record['dynamodb'].get('Keys', {})}")
+    Returns the sequence number of the failed record, or None if all succeeded.
+    """
+    for record in records:
+        logger.debug(f"Processing record: Event Name: {record['eventName']}, "
+                     f"Event Source ARN: {record['eventSourceARN']}, "
+                     f"Record Keys: {record['dynamodb'].get('Keys', {})}")
 
+        try:
             if record["eventName"] == "INSERT":
-                process_new_record(record["dynamodb"]["NewImage"], lambda_processing_started)
-    except Exception as e:
-        print(f"ERROR: Failed to process event. Exception: {e}")
-        raise
+                buffer_part(record["dynamodb"]["NewImage"])
+                process_new_record(record["dynamodb"]["NewImage"], lambda_processing_started,
+                                   producer=producer, sequence_number=record["dynamodb"]["SequenceNumber"])
+        except Exception as e:
+            logger.error(f"Failed to process record {record['dynamodb'].get('SequenceNumber')}. Exception: {e}")
+            return record["dynamodb"]["SequenceNumber"]
+    return None
 
 
-def process_new_record(new_image, lambda_processing_started):
+def buffer_part(new_image):
     """
-    Process a new DynamoDB record to check for aggregation conditions.
+    Keep a parsed copy of a newly inserted part in the part assembler.
     """
-    print("DEBUG: Processing new image metadata (excluding ecg_data):")
+    device_id = new_image["device_id"]["S"]
+    chunk_idx = int(new_image["chunk_idx"]["N"])
+    part_assembler.add(device_id, chunk_idx, parse_part(new_image))
 
+
+def process_new_record(new_image, lambda_processing_started, producer=None, sequence_number=None):
+    """
+    Process a new DynamoDB record to check for aggregation conditions.
+    """
     device_id = new_image["device_id"]["S"]
     chunk_idx = int(new_image["chunk_idx"]["N"])
     part = int(new_image["part"]["N"])
     timestamp_capture_begin = new_image["timestamp_capture_begin"]["S"]
 
-    print("DEBUG: Extracted necessary fields")
-    print("device_id:", device_id)
-    print("chunk_idx:", chunk_idx)
-    print("part:", part)
-    print("timestamp_capture_begin:", timestamp_capture_begin)
+    logger.debug(f"Processing new image: device_id {device_id}, chunk_idx {chunk_idx}, part {part}, "
+                 f"timestamp_capture_begin {timestamp_capture_begin}")
 
     # Skip processing for other parts of the chunk
     # Trigger processing only for 15th part,
@@ -70,65 +171,256 @@ def process_new_record(new_image, lambda_processing_started):
         return
 
     # Attempt to mark the record as "processing"
+    key = {"device_id": {"S": device_id}, "timestamp_capture_begin": {"S": timestamp_capture_begin}}
     try:
-        table.update_item(
-            Key={"device_id": device_id, "timestamp_capture_begin": timestamp_capture_begin},
+        dynamodb_client.update_item(
+            TableName=DYNAMODB_TABLE_NAME,
+            Key=key,
             UpdateExpression="SET processing = :in_progress",
             ConditionExpression="attribute_not_exists(processing)",
-            ExpressionAttributeValues={":in_progress": True},
+            ExpressionAttributeValues={":in_progress": {"BOOL": True}},
         )
-        print(
-            f"DEBUG: Successfully marked record as 'processing' for device {device_id}, chunk {chunk_idx}, part {part}."
+        logger.debug(
+            f"Successfully marked record as 'processing' for device {device_id}, chunk {chunk_idx}, part {part}."
         )
-    except Exception as e:
-        print(
-            f"DEBUG: Record already processed or in progress for device {device_id}, chunk {chunk_idx}, part {part}. Exiting. Error: {e}"
+    except dynamodb_client.exceptions.ConditionalCheckFailedException as e:
+        logger.debug(
+            f"Record already processed or in progress for device {device_id}, chunk {chunk_idx}, part {part}. Exiting. Error: {e}"
         )
         return  # Exit if the item is already marked as processing or processed
 
-    aggregate_ecg_data(device_id, chunk_idx, lambda_processing_started)
+    try:
+        with metrics.timer("AggregationTime"):
+            aggregate_ecg_data(device_id, chunk_idx, lambda_processing_started,
+                               producer=producer, sequence_number=sequence_number)
+    except Exception:
+        # Release the lock so the retried record can aggregate the chunk again
+        release_processing_lock(device_id, timestamp_capture_begin)
+        raise
 
 
-def aggregate_ecg_data(device_id, chunk_idx, lambda_processing_started):
+def release_processing_lock(device_id, timestamp_capture_begin):
     """
-    Aggregate ECG data for a specific device and chunk from DynamoDB.
+    Remove the "processing" lock from a chunk's last part so the chunk can be aggregated again.
     """
-    print(
-        f"DEBUG: Aggregating ECG data for device {device_id}, chunk index {chunk_idx}."
+    dynamodb_client.update_item(
+        TableName=DYNAMODB_TABLE_NAME,
+        Key={"device_id": {"S": device_id}, "timestamp_capture_begin": {"S": timestamp_capture_begin}},
+        UpdateExpression="REMOVE processing",
     )
 
-    # using index here to query efficiently on device_id & chunk_id combination
-    response = table.query(
-        IndexName="DeviceIdChunkIdxIndex",
-        KeyConditionExpression=Key("device_id").eq(device_id) & Key("chunk_idx").eq(chunk_idx),
+
+def release_chunk_lock(chunk):
+    """
+    Release the processing lock of a chunk whose window was not completed, so its retried record can
+    aggregate it again. Errors are logged rather than raised, as the chunk is already reported as failed.
+    """
+    last_part = max(chunk["items"], key=lambda x: x["part"])
+    try:
+        release_processing_lock(chunk["device_id"], last_part["timestamp_capture_begin"])
+    except Exception as e:
+        logger.error(f"Failed to release the processing lock of chunk {chunk['chunk_idx']} "
+                     f"of device {chunk['device_id']}: {e}")
+
+
+class PartAssembler:
+    """
+    Reassembly buffer for chunk parts seen on the DynamoDB stream.
+
+    Parts are kept per (device_id, chunk_idx) in parsed form (float32 samples plus
+    the metadata needed for aggregation), so a chunk can be aggregated without
+    reading its parts back from the GSI. The buffer lives at module level and so
+    survives across invocations of a warm container; it is bounded both by the
+    number of chunks held and by their age.
+    """
+
+    def __init__(self, max_chunks=64, max_age_seconds=120):
+        self.max_chunks = max_chunks
+        self.max_age_seconds = max_age_seconds
+        self._chunks = OrderedDict()  # (device_id, chunk_idx) -> (last_update, {part: parsed_part})
+        self._lock = threading.Lock()
+
+    def _evict(self, now):
+        while self._chunks:
+            key, (last_update, _) = next(iter(self._chunks.items()))
+            if len(self._chunks) > self.max_chunks or now - last_update > self.max_age_seconds:
+                del self._chunks[key]
+            else:
+                break
+
+    def add(self, device_id, chunk_idx, parsed_part, now=None):
+        now = time.monotonic() if now is None else now
+        key = (device_id, chunk_idx)
+        with self._lock:
+            _, parts = self._chunks.pop(key, (now, {}))
+            parts[parsed_part["part"]] = parsed_part
+            # Re-insert so the OrderedDict stays sorted by last update
+            self._chunks[key] = (now, parts)
+            self._evict(now)
+
+    def get_parts(self, device_id, chunk_idx):
+        with self._lock:
+            _, parts = self._chunks.get((device_id, chunk_idx), (None, {}))
+            return dict(parts)
+
+    def discard(self, device_id, chunk_idx):
+        with self._lock:
+            self._chunks.pop((device_id, chunk_idx), None)
+
+    def __len__(self):
+        return len(self._chunks)
+
+
+part_assembler = PartAssembler(
+    max_chunks=int(os.environ.get("PART_ASSEMBLER_MAX_CHUNKS", 64)),
+    max_age_seconds=float(os.environ.get("PART_ASSEMBLER_MAX_AGE_SECONDS", 120)),
+)
+
+
+def query_chunk_parts(device_id, chunk_idx, parts=None, max_retries=5):
+    """
+    Read stored parts of a chunk in the raw DynamoDB attribute format.
+
+    DeviceIdChunkIdxIndex only projects the table keys and the part number, so
+    finding the parts of a chunk reads a few bytes per part. Only the wanted
+    parts (all of them if `parts` is None) are then read from the table with
+    BatchGetItem, so the ECG payloads of parts already buffered are not read again.
+
+    The low-level client is used so numbers stay strings ({"N": "..."}) instead of
+    being turned into Decimal objects one by one by the boto3 resource layer.
+    """
+    wanted = None if parts is None else set(parts)
+    query_kwargs = {
+        "TableName": DYNAMODB_TABLE_NAME,
+        "IndexName": "DeviceIdChunkIdxIndex",
+        "KeyConditionExpression": "device_id = :device_id AND chunk_idx = :chunk_idx",
+        "ExpressionAttributeValues": {":device_id": {"S": device_id}, ":chunk_idx": {"N": str(chunk_idx)}},
+    }
+    keys = []
+    while True:
+        response = dynamodb_client.query(**query_kwargs)
+        keys.extend(
+            {"device_id": item["device_id"], "timestamp_capture_begin": item["timestamp_capture_begin"]}
+            for item in response["Items"]
+            if wanted is None or int(item["part"]["N"]) in wanted
+        )
+        if "LastEvaluatedKey" not in response:
+            break
+        query_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+    items = []
+    # BatchGetItem takes at most 100 keys per call
+    for start in range(0, len(keys), 100):
+        request_items = {DYNAMODB_TABLE_NAME: {"Keys": keys[start:start + 100]}}
+        for attempt in range(max_retries + 1):
+            response = dynamodb_client.batch_get_item(RequestItems=request_items)
+            items.extend(response["Responses"].get(DYNAMODB_TABLE_NAME, []))
+            request_items = response.get("UnprocessedKeys")
+            if not request_items:
+                break
+            if attempt < max_retries:
+                time.sleep(min(0.05 * 2 ** attempt, 1.0))
+        else:
+            logger.error(f"{len(request_items[DYNAMODB_TABLE_NAME]['Keys'])} parts of device {device_id}, "
+                         f"chunk {chunk_idx} could not be read after {max_retries} retries.")
+    return items
+
+
+def ecg_data_to_array(ecg_data_attr):
+    """
+    Convert a raw DynamoDB `ecg_data` list attribute to a float32 NumPy array.
+
+    Returns an array of shape (n,) for single-lead parts and (n, leads) for multi-lead parts.
+    """
+    values = ecg_data_attr["L"]
+    if values and "L" in values[0]:
+        return np.array([[point["N"] for point in row["L"]] for row in values], dtype=np.float32)
+    return np.array([point["N"] for point in values], dtype=np.float32)
+
+
+def part_samples(image):
+    """
+    Decode the samples of a raw part item, stored either packed (see lambda_ingest.py) or as an `ecg_data` list.
+    """
+    if "ecg_data_packed" not in image:
+        return ecg_data_to_array(image["ecg_data"])
+    data = image["ecg_data_packed"]["B"]
+    if isinstance(data, str):
+        # Binary attributes arrive base64-encoded in DynamoDB stream events
+        data = base64.b64decode(data)
+    shape = [int(dim["N"]) for dim in image["ecg_data_shape"]["L"]]
+    return unpack_samples(data, shape, float(image["ecg_data_scale"]["N"]))
+
+
+def parse_part(image):
+    """
+    Parse a raw part item (stream NewImage or query result) into the fields used for aggregation.
+    """
+    return {
+        "part": int(image["part"]["N"]),
+        "timestamp_capture_begin": image["timestamp_capture_begin"]["S"],
+        "timestamp_chunk_sent": image["timestamp_chunk_sent"]["S"],
+        "sampling_rate_hz": float(image["sampling_rate_hz"]["N"]),
+        "timestamp_iot_core_rule_triggered": int(image["timestamp_iot_core_rule_triggered"]["N"]),
+        "ecg_data": part_samples(image),
+    }
+
+
+def aggregate_ecg_data(device_id, chunk_idx, lambda_processing_started, producer=None, sequence_number=None):
+    """
+    Aggregate ECG data for a specific device and chunk.
+
+    Parts already seen on the stream are taken from the part assembler; only the
+    missing ones are read back from DynamoDB. With a producer, the window is
+    buffered for a batched PutRecords call and the chunk is completed once it
+    has been accepted; otherwise it is sent and completed immediately.
+    """
+    logger.debug(
+        f"Aggregating ECG data for device {device_id}, chunk index {chunk_idx}."
     )
 
-    items = response["Items"]
-    print(
-        f"DEBUG: Retrieved {len(items)} items for device {device_id}, chunk {chunk_idx}."
+    parts_by_idx = part_assembler.get_parts(device_id, chunk_idx)
+    missing_parts = sorted(set(range(AGGREGATED_DATA_PARTS)) - set(parts_by_idx))
+    logger.debug(
+        f"{len(parts_by_idx)} parts buffered for device {device_id}, chunk {chunk_idx}; "
+        f"missing parts: {missing_parts}"
     )
 
+    if missing_parts:
+        metrics.increment("PartsQueried", len(missing_parts))
+        # using index here to query efficiently on device_id & chunk_id combination
+        for item in query_chunk_parts(device_id, chunk_idx, parts=missing_parts):
+            parsed_part = parse_part(item)
+            parts_by_idx[parsed_part["part"]] = parsed_part
+            part_assembler.add(device_id, chunk_idx, parsed_part)
+
     # Ensure we have all parts (0 through 15)
-    parts = sorted([int(item["part"]) for item in items])
-    print(f"DEBUG: Retrieved parts: {parts}")
+    parts = sorted(parts_by_idx)
+    logger.debug(f"Retrieved parts: {parts}")
     if parts != list(range(AGGREGATED_DATA_PARTS)):
-        print(
-            f"DEBUG: Missing parts for device {device_id}, chunk {chunk_idx}. Parts present: {parts}"
+        logger.debug(
+            f"Missing parts for device {device_id}, chunk {chunk_idx}. Parts present: {parts}"
         )
         return
 
-    aggregated_data = []
+    items = [parts_by_idx[part] for part in parts]
+    aggregated_data = np.zeros((AGGREGATED_DATA_LENGTH, AGGREGATED_DATA_LEADS), dtype=np.float32)
+    aggregated_data_length = 0
     timestamps_capture_begin = []
     timestamps_chunk_sent = []
     timestamp_iot_rule_triggered = []
     sampling_rates = set()
 
-    for item in sorted(items, key=lambda x: int(x["part"])):
+    for item in items:
         data = item["ecg_data"]
-        if device_id == "physical_iot_device_1":
-            # Transform data into a 2D array for this device
-            data = [[point] + [0] * 11 for point in data]
-        aggregated_data.extend(data)
+        part_start = aggregated_data_length
+        aggregated_data_length += len(data)
+        if aggregated_data_length <= AGGREGATED_DATA_LENGTH:
+            if device_id == SINGLE_LEAD_DEVICE_ID:
+                # Single-lead device: DI lead only, remaining leads stay zero
+                aggregated_data[part_start:aggregated_data_length, 0] = data
+            else:
+                aggregated_data[part_start:aggregated_data_length, :] = data
         timestamps_capture_begin.append(item["timestamp_capture_begin"])
         timestamps_chunk_sent.append(item["timestamp_chunk_sent"])
         sampling_rates.add(item["sampling_rate_hz"])
@@ -148,28 +440,53 @@ def aggregate_ecg_data(device_id, chunk_idx, lambda_processing_started):
         "timestamp_lambda_processing_started": lambda_processing_started,
     }
 
-    print(f"DEBUG: Aggregated metadata: {aggregated_metadata}")
-    print(f"DEBUG: Aggregated data length: {len(aggregated_data)}")
-    if len(aggregated_data) != 4096:
-        print(
-            f"ERROR: Unexpected data size for device {device_id}, chunk {chunk_idx}: {len(aggregated_data)}"
+    logger.debug(f"Aggregated metadata: {aggregated_metadata}")
+    logger.debug(f"Aggregated data length: {aggregated_data_length}")
+    if aggregated_data_length != AGGREGATED_DATA_LENGTH:
+        logger.error(
+            f"Unexpected data size for device {device_id}, chunk {chunk_idx}: {aggregated_data_length}"
         )
         return
 
     # Send the aggregated data to Kinesis
-    send_to_kinesis(device_id, chunk_idx, aggregated_data, aggregated_metadata)
+    if producer is None:
+        send_to_kinesis(device_id, chunk_idx, aggregated_data, aggregated_metadata)
+        complete_chunk(device_id, chunk_idx, items)
+    else:
+        chunk = {"device_id": device_id, "chunk_idx": chunk_idx, "items": items, "sequence_number": sequence_number}
+        send_to_kinesis(device_id, chunk_idx, aggregated_data, aggregated_metadata, producer=producer, context=chunk)
 
-    for item in items:
-        table.update_item(
-            Key={"device_id": item["device_id"], "timestamp_capture_begin": item["timestamp_capture_begin"]},
-            UpdateExpression="SET processing = :complete",
-            ExpressionAttributeValues={":complete": "done"},
-        )
-        print(
-            f"DEBUG: Marked record as 'complete' for device {device_id}, timestamp_capture_begin {item['timestamp_capture_begin']}."
-        )
+    logger.debug(f"Final metadata with processing times: {aggregated_metadata}")
+
+
+def complete_chunk(device_id, chunk_idx, items):
+    """
+    Mark a chunk as done once its window is in Kinesis and drop its buffered parts.
+    """
+    mark_chunk_done(device_id, chunk_idx, items)
+    part_assembler.discard(device_id, chunk_idx)
 
-    print(f"DEBUG: Final metadata with processing times: {aggregated_metadata}")
+
+def mark_chunk_done(device_id, chunk_idx, items):
+    """
+    Mark a chunk as aggregated with a single chunk-level completion marker.
+
+    Only the last part's item carries the "processing" lock taken in
+    process_new_record, so that item alone is set to "done" (one write instead
+    of one update per part).
+    """
+    last_part = max(items, key=lambda x: x["part"])
+    timestamp_capture_begin = last_part["timestamp_capture_begin"]
+    dynamodb_client.update_item(
+        TableName=DYNAMODB_TABLE_NAME,
+        Key={"device_id": {"S": device_id}, "timestamp_capture_begin": {"S": timestamp_capture_begin}},
+        UpdateExpression="SET processing = :complete, parts_aggregated = :parts",
+        ExpressionAttributeValues={":complete": {"S": "done"}, ":parts": {"N": str(len(items))}},
+    )
+    logger.debug(
+        f"Marked chunk {chunk_idx} as 'complete' for device {device_id}, "
+        f"timestamp_capture_begin {timestamp_capture_begin}."
+    )
 
 
 def decimal_serializer(obj):
@@ -182,27 +499,122 @@ def decimal_serializer(obj):
     raise TypeError(f"Type {type(obj)} not serializable")
 
 
-def send_to_kinesis(device_id, chunk_idx, aggregated_data, aggregated_metadata):
+def send_to_kinesis(device_id, chunk_idx, aggregated_data, aggregated_metadata, producer=None, context=None):
     """
     Send the aggregated ECG data to Kinesis for downstream processing.
+
+    With a producer the record is only buffered; `context` is returned with its PutRecords result.
     """
     payload = {
         "device_id": device_id,
         "chunk_idx": chunk_idx,
         **aggregated_metadata,  # Add aggregated metadata
     }
-    print(
-        f"DEBUG: Sending payload to Kinesis (excluding aggregated_data): {json.dumps(payload, default=decimal_serializer)}"
-    )
-
-    # Add the aggregated data to the payload
-    payload["aggregated_data"] = aggregated_data
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(
+            f"Sending payload to Kinesis (excluding aggregated_data): {json.dumps(payload, default=decimal_serializer)}"
+        )
 
     processing_finished = datetime.now(timezone.utc).isoformat()
     payload["timestamp_lambda_processing_finished"] = processing_finished
 
-    serialized_payload = json.dumps(payload, default=decimal_serializer)
+    if KINESIS_PAYLOAD_FORMAT == "binary":
+        serialized_payload = encode_window(
+            payload, aggregated_data, compression=KINESIS_PAYLOAD_COMPRESSION, default=decimal_serializer
+        )
+    else:
+        # Add the aggregated data to the payload
+        payload["aggregated_data"] = aggregated_data.tolist()
+        serialized_payload = json.dumps(payload, default=decimal_serializer)
+
+    if producer is not None:
+        producer.add(serialized_payload, device_id, context)
+        logger.debug(f"Buffered chunk {chunk_idx} of device {device_id} for PutRecords.")
+        return
+
     response = kinesis.put_record(
         StreamName=KINESIS_STREAM_NAME, Data=serialized_payload, PartitionKey=device_id
     )
-    print(f"DEBUG: Successfully sent data to Kinesis. Response metadata: {response}")
+    logger.debug(f"Successfully sent data to Kinesis. Response metadata: {response}")
+
+
+class KinesisBatchProducer:
+    """
+    Buffers Kinesis records and sends them with PutRecords.
+
+    A request is flushed before it would exceed the PutRecords limits (500 records,
+    5 MB including partition keys). Entries rejected by Kinesis are retried on their
+    own with backoff. Every entry gets a result carrying either its SequenceNumber/ShardId
+    or the final ErrorCode, together with the caller's context.
+
+    Retried entries land in the stream after entries accepted in the same request,
+    so a device's windows may arrive out of order. Consumers tolerate this: each
+    window is inferred on its own and results are keyed by device_id and
+    timestamp_capture_begin, not by arrival order.
+    """
+
+    MAX_RECORDS_PER_REQUEST = 500
+    MAX_BYTES_PER_REQUEST = 5 * 1024 * 1024
+
+    def __init__(self, kinesis_client, stream_name, max_retries=3, base_backoff_seconds=0.1):
+        self.kinesis_client = kinesis_client
+        self.stream_name = stream_name
+        self.max_retries = max_retries
+        self.base_backoff_seconds = base_backoff_seconds
+        self.results = []
+        self._entries = []
+        self._entries_bytes = 0
+        self._lock = threading.Lock()
+
+    def add(self, data, partition_key, context=None):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        entry_bytes = len(data) + len(partition_key.encode("utf-8"))
+        with self._lock:
+            if self._entries and (len(self._entries) >= self.MAX_RECORDS_PER_REQUEST
+                                  or self._entries_bytes + entry_bytes > self.MAX_BYTES_PER_REQUEST):
+                self._flush_locked()
+            self._entries.append({"Data": data, "PartitionKey": partition_key, "context": context})
+            self._entries_bytes += entry_bytes
+
+    def flush(self):
+        """
+        Send all buffered records and return their per-entry results.
+        """
+        with self._lock:
+            return self._flush_locked()
+
+    def _flush_locked(self):
+        entries, self._entries, self._entries_bytes = self._entries, [], 0
+        if not entries:
+            return []
+
+        results = [None] * len(entries)
+        pending = list(range(len(entries)))
+        for attempt in range(self.max_retries + 1):
+            if attempt > 0:
+                time.sleep(self.base_backoff_seconds * (2 ** (attempt - 1)))
+            try:
+                response = self.kinesis_client.put_records(
+                    StreamName=self.stream_name,
+                    Records=[{"Data": entries[i]["Data"], "PartitionKey": entries[i]["PartitionKey"]} for i in pending],
+                )
+            except Exception as e:
+                logger.error(f"PutRecords call failed (attempt {attempt + 1}): {e}")
+                for i in pending:
+                    results[i] = {"ErrorCode": type(e).__name__, "ErrorMessage": str(e)}
+                continue
+
+            retry = []
+            for i, entry_result in zip(pending, response["Records"]):
+                results[i] = entry_result
+                if "ErrorCode" in entry_result:
+                    retry.append(i)
+            logger.debug(f"PutRecords sent {len(pending)} records, {len(retry)} failed (attempt {attempt + 1}).")
+            pending = retry
+            if not pending:
+                break
+
+        flushed = [dict(result, context=entry["context"]) for entry, result in zip(entries, results)]
+        self.results.extend(flushed)
+        return flushed
@@ -0,0 +1,53 @@
+import os
+import boto3
+import logging
+
+from wire_format import pack_samples
+
+
+DYNAMODB_TABLE_NAME = os.environ.get("DYNAMODB_TABLE_NAME")
+# Optional endpoint override, e.g. DynamoDB Local for local benchmarks
+DYNAMODB_ENDPOINT_URL = os.environ.get("DYNAMODB_ENDPOINT_URL")
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO")
+
+logger = logging.getLogger()
+logger.setLevel(LOG_LEVEL)
+
+dynamodb_client = boto3.client("dynamodb", endpoint_url=DYNAMODB_ENDPOINT_URL)
+
+
+def build_packed_item(message):
+    """
+    Build the raw table item for one part, with the samples packed into a single Binary attribute.
+
+    `ecg_data` (256 x 12 Number attributes) is replaced by `ecg_data_packed` (int16
+    samples), `ecg_data_shape` and `ecg_data_scale`; lambda_aggregation.part_samples
+    decodes it. All other fields are stored as the IoT rule selected them.
+    """
+    sample_bytes, shape, scale = pack_samples(message["ecg_data"])
+    return {
+        "device_id": {"S": message["device_id"]},
+        "timestamp_capture_begin": {"S": message["timestamp_capture_begin"]},
+        "chunk_idx": {"N": str(message["chunk_idx"])},
+        "part": {"N": str(message["part"])},
+        "sampling_rate_hz": {"N": str(message["sampling_rate_hz"])},
+        "timestamp_chunk_sent": {"S": message["timestamp_chunk_sent"]},
+        "timestamp_iot_core_rule_triggered": {"N": str(message["timestamp_iot_core_rule_triggered"])},
+        "ecg_data_packed": {"B": sample_bytes},
+        "ecg_data_shape": {"L": [{"N": str(dim)} for dim in shape]},
+        "ecg_data_scale": {"N": repr(scale)},
+    }
+
+
+def lambda_handler(event, context):
+    """
+    Lambda handler invoked by the IoT Core rule with the selected fields of one part message.
+    """
+    logger.debug(f"Received part {event.get('part')} of chunk {event.get('chunk_idx')} "
+                 f"from device {event.get('device_id')}.")
+
+    item = build_packed_item(event)
+    dynamodb_client.put_item(TableName=DYNAMODB_TABLE_NAME, Item=item)
+
+    logger.debug(f"Stored packed part ({len(item['ecg_data_packed']['B'])} sample bytes, "
+                 f"scale {item['ecg_data_scale']['N']}).")
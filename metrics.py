@@ -0,0 +1,225 @@
+"""
+Lightweight counters and histograms for the inference service and the aggregation Lambda.
+
+Metrics are exported in one of two ways:
+
+- "emf": every flush interval, one CloudWatch Embedded Metric Format line per
+  dimension set is printed to stdout. The awslogs driver (Fargate) and the Lambda
+  runtime ship them to CloudWatch Logs, which turns them into metrics without any
+  API calls. Histogram values are emitted as value arrays, so CloudWatch can
+  compute percentiles.
+- "prometheus": cumulative counters and bucketed histograms are served in the
+  Prometheus text format over HTTP (see MetricsRegistry.serve_prometheus).
+"""
+import re
+import json
+import time
+import bisect
+import logging
+import threading
+from contextlib import contextmanager
+
+# EMF allows at most 100 values per metric in one log line
+EMF_MAX_VALUES = 100
+# Upper bounds of the Prometheus histogram buckets per unit
+DEFAULT_BUCKETS = {
+    "Milliseconds": (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000),
+    "Count": (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024),
+}
+PROMETHEUS_UNIT_SUFFIXES = {"Milliseconds": "_milliseconds"}
+
+
+class _Histogram:
+    def __init__(self, unit, buckets):
+        self.unit = unit
+        self.buckets = buckets
+        self.bucket_counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        # Values observed since the last EMF flush
+        self.values = []
+
+    def observe(self, value, keep_value):
+        self.bucket_counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if keep_value:
+            self.values.append(value)
+
+
+class MetricsRegistry:
+    """
+    Thread-safe registry of counters and histograms, keyed by name and dimensions.
+    """
+
+    def __init__(self, namespace, exporter="emf", flush_interval_seconds=60, dimensions=None):
+        """
+        Parameters:
+        namespace (str): CloudWatch namespace, also the Prometheus metric name prefix.
+        exporter (str): 'emf', 'prometheus' or 'none'.
+        flush_interval_seconds (float): How often EMF lines are printed.
+        dimensions (dict): Dimensions added to every metric, e.g. {"Service": "inference"}.
+        """
+        if exporter not in ("emf", "prometheus", "none"):
+            raise ValueError(f"Unknown metrics exporter '{exporter}', expected 'emf', 'prometheus' or 'none'")
+        self.namespace = namespace
+        self.exporter = exporter
+        self.flush_interval_seconds = flush_interval_seconds
+        self.dimensions = dict(dimensions or {})
+        self._counters = {}  # (name, dimensions) -> [value since last flush, cumulative value]
+        self._histograms = {}  # (name, dimensions) -> _Histogram
+        self._lock = threading.Lock()
+        self._next_flush = time.monotonic() + flush_interval_seconds
+
+    def _key(self, name, dimensions):
+        merged = dict(self.dimensions, **(dimensions or {}))
+        return name, tuple(sorted((key, str(value)) for key, value in merged.items()))
+
+    def increment(self, name, value=1, dimensions=None):
+        """
+        Add to a counter.
+        """
+        if self.exporter == "none":
+            return
+        key = self._key(name, dimensions)
+        with self._lock:
+            counter = self._counters.setdefault(key, [0, 0])
+            counter[0] += value
+            counter[1] += value
+        self._maybe_flush()
+
+    def observe(self, name, value, unit="Milliseconds", dimensions=None):
+        """
+        Record one value of a histogram, e.g. a duration in milliseconds or a batch size.
+        """
+        if self.exporter == "none" or value is None:
+            return
+        key = self._key(name, dimensions)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                buckets = DEFAULT_BUCKETS.get(unit, DEFAULT_BUCKETS["Count"])
+                histogram = self._histograms[key] = _Histogram(unit, buckets)
+            histogram.observe(value, keep_value=self.exporter == "emf")
+        self._maybe_flush()
+
+    @contextmanager
+    def timer(self, name, dimensions=None):
+        """
+        Observe the duration of the block in milliseconds.
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, (time.perf_counter() - started) * 1000, "Milliseconds", dimensions)
+
+    def _maybe_flush(self):
+        if self.exporter == "emf" and time.monotonic() >= self._next_flush:
+            self.flush()
+
+    def flush(self):
+        """
+        Print the values observed since the last flush as EMF lines (no-op for other exporters).
+        """
+        if self.exporter != "emf":
+            return
+        with self._lock:
+            self._next_flush = time.monotonic() + self.flush_interval_seconds
+            by_dimensions = {}
+            for (name, dimensions), counter in self._counters.items():
+                if counter[0]:
+                    by_dimensions.setdefault(dimensions, []).append((name, "Count", [counter[0]]))
+                    counter[0] = 0
+            for (name, dimensions), histogram in self._histograms.items():
+                if histogram.values:
+                    by_dimensions.setdefault(dimensions, []).append((name, histogram.unit, histogram.values))
+                    histogram.values = []
+
+        timestamp = int(time.time() * 1000)
+        for dimensions, metrics in by_dimensions.items():
+            # Split long value arrays over several lines
+            n_lines = max((len(values) - 1) // EMF_MAX_VALUES + 1 for _, _, values in metrics)
+            for line in range(n_lines):
+                line_metrics = [(name, unit, values[line * EMF_MAX_VALUES:(line + 1) * EMF_MAX_VALUES])
+                                for name, unit, values in metrics]
+                line_metrics = [metric for metric in line_metrics if metric[2]]
+                emf_line = {
+                    "_aws": {
+                        "Timestamp": timestamp,
+                        "CloudWatchMetrics": [{
+                            "Namespace": self.namespace,
+                            "Dimensions": [[key for key, _ in dimensions]],
+                            "Metrics": [{"Name": name, "Unit": unit} for name, unit, _ in line_metrics],
+                        }],
+                    },
+                }
+                emf_line.update(dimensions)
+                for name, _, values in line_metrics:
+                    emf_line[name] = values if len(values) > 1 else values[0]
+                print(json.dumps(emf_line), flush=True)
+
+    def render_prometheus(self):
+        """
+        Render all metrics in the Prometheus text exposition format.
+        """
+        prefix = _snake_case(self.namespace)
+        lines = []
+        with self._lock:
+            for (name, dimensions), counter in sorted(self._counters.items()):
+                metric = f"{prefix}_{_snake_case(name)}_total"
+                if f"# TYPE {metric} counter" not in lines:
+                    lines.append(f"# TYPE {metric} counter")
+                lines.append(f"{metric}{_labels(dimensions)} {counter[1]}")
+            for (name, dimensions), histogram in sorted(self._histograms.items()):
+                metric = f"{prefix}_{_snake_case(name)}{PROMETHEUS_UNIT_SUFFIXES.get(histogram.unit, '')}"
+                if f"# TYPE {metric} histogram" not in lines:
+                    lines.append(f"# TYPE {metric} histogram")
+                cumulative = 0
+                for bound, count in zip(list(histogram.buckets) + ["+Inf"], histogram.bucket_counts):
+                    cumulative += count
+                    lines.append(f"{metric}_bucket{_labels(dimensions + (('le', str(bound)),))} {cumulative}")
+                lines.append(f"{metric}_sum{_labels(dimensions)} {histogram.sum}")
+                lines.append(f"{metric}_count{_labels(dimensions)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def serve_prometheus(self, port):
+        """
+        Serve /metrics on a daemon thread.
+
+        Parameters:
+        port (int): Port to listen on.
+
+        Returns:
+        ThreadingHTTPServer: The running server.
+        """
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        registry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = registry.render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer(("", port), MetricsHandler)
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+        logging.info(f"Serving Prometheus metrics on port {port}.")
+        return server
+
+
+def _snake_case(name):
+    return re.sub(r"(?<=[a-z0-9])([A-Z])", r"_\1", name).lower()
+
+
+def _labels(dimensions):
+    if not dimensions:
+        return ""
+    return "{" + ",".join(f'{_snake_case(key)}="{value}"' for key, value in dimensions) + "}"
@@ -0,0 +1,166 @@
+import queue
+import logging
+import threading
+
+# Marks the end of the stream between stages
+_END_OF_STREAM = object()
+
+
+class PipelinedConsumer:
+    """
+    Three-stage consumer: fetch, infer and sink joined by bounded queues.
+
+    The fetch stage (pulling and preparing batches) and the sink stage (persisting
+    results) run on background threads, while inference runs on the calling thread.
+    The fetch for batch N+1 and the writes for batch N-1 thus overlap with
+    inference of batch N. Bounded queues provide backpressure: a slow model stalls
+    the fetcher and a slow sink stalls the model instead of buffering without limit.
+
+    A batch that a stage fails on is logged and skipped. With `on_error`, the
+    failure is reported first; an exception raised by `on_error` stops the
+    pipeline and is re-raised by run().
+    """
+
+    def __init__(self, source, prepare, infer, sink, max_pending_batches=2, poll_interval_seconds=0.5,
+                 on_error=None):
+        """
+        Parameters:
+        source (iterable): Yields raw record batches, e.g. from the batching scheduler.
+        prepare (callable): Turns a raw record batch into model input, run on the fetch thread.
+        infer (callable): Runs the model on a prepared batch, run on the calling thread.
+        sink (callable): Persists an inferred batch, run on the sink thread.
+        max_pending_batches (int): Capacity of each inter-stage queue.
+        poll_interval_seconds (float): How often blocked stages re-check for shutdown.
+        on_error (callable): Optional on_error(stage, batch, error), called with the stage name
+                             ('prepare', 'infer' or 'sink') and the batch passed to the failing stage.
+        """
+        self.source = source
+        self.prepare = prepare
+        self.infer = infer
+        self.sink = sink
+        self.poll_interval_seconds = poll_interval_seconds
+        self.on_error = on_error
+
+        self._infer_queue = queue.Queue(maxsize=max_pending_batches)
+        self._sink_queue = queue.Queue(maxsize=max_pending_batches)
+        self._stop = threading.Event()
+        self._fatal_error = None
+
+    def _put(self, q, item):
+        # Block for backpressure, but keep checking whether the pipeline is shutting down
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=self.poll_interval_seconds)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q):
+        while True:
+            try:
+                return q.get(timeout=self.poll_interval_seconds)
+            except queue.Empty:
+                if self._stop.is_set():
+                    return _END_OF_STREAM
+
+    def _report_error(self, stage, batch, error):
+        # Returns False when on_error asked to stop the pipeline
+        if self.on_error is None:
+            return True
+        try:
+            self.on_error(stage, batch, error)
+            return True
+        except Exception as e:
+            self._fatal_error = e
+            self._stop.set()
+            return False
+
+    def _fetch_stage(self):
+        try:
+            for record_batch in self.source:
+                if self._stop.is_set():
+                    break
+                try:
+                    prepared = self.prepare(record_batch)
+                except Exception as e:
+                    logging.error(f"Error preparing batch: {e}")
+                    if not self._report_error("prepare", record_batch, e):
+                        break
+                    continue
+                if not self._put(self._infer_queue, prepared):
+                    break
+        except Exception as e:
+            logging.error(f"Fetch stage failed: {e}")
+            self._fatal_error = e
+            self._stop.set()
+        finally:
+            self._put_end(self._infer_queue)
+
+    def _sink_stage(self):
+        while True:
+            inferred = self._get(self._sink_queue)
+            if inferred is _END_OF_STREAM:
+                break
+            try:
+                self.sink(inferred)
+            except Exception as e:
+                logging.error(f"Error saving batch: {e}")
+                if not self._report_error("sink", inferred, e):
+                    break
+
+    def _put_end(self, q):
+        # The end marker must get through even when shutting down, so don't honour _stop here
+        while True:
+            try:
+                q.put(_END_OF_STREAM, timeout=self.poll_interval_seconds)
+                return
+            except queue.Full:
+                if self._stop.is_set():
+                    return
+
+    def stop(self):
+        """
+        Ask all stages to finish; in-flight batches already inferred are still written.
+        """
+        self._stop.set()
+
+    def run(self):
+        """
+        Run the pipeline until the source is exhausted or stop() is called.
+
+        Raises:
+        Exception: Re-raises a fatal error from the fetch stage or from on_error.
+        """
+        fetch_thread = threading.Thread(target=self._fetch_stage, name="fetch-stage", daemon=True)
+        sink_thread = threading.Thread(target=self._sink_stage, name="sink-stage", daemon=True)
+        fetch_thread.start()
+        sink_thread.start()
+
+        try:
+            while True:
+                prepared = self._get(self._infer_queue)
+                if prepared is _END_OF_STREAM or self._fatal_error is not None:
+                    break
+                try:
+                    inferred = self.infer(prepared)
+                except Exception as e:
+                    logging.error(f"Error processing batch: {e}")
+                    if not self._report_error("infer", prepared, e):
+                        break
+                    continue
+                # Inferred batches are written even while shutting down, unless the sink stage stopped
+                while sink_thread.is_alive():
+                    try:
+                        self._sink_queue.put(inferred, timeout=self.poll_interval_seconds)
+                        break
+                    except queue.Full:
+                        continue
+        finally:
+            self._stop.set()
+            self._put_end(self._sink_queue)
+            sink_thread.join()
+            fetch_thread.join(timeout=self.poll_interval_seconds)
+
+        if self._fatal_error is not None:
+            raise self._fatal_error
@@ -1,8 +1,13 @@
+import os
+import glob
+import time
 import numpy as np
 import warnings
+import multiprocessing
 from tensorflow.keras.models import load_model
 from tensorflow.keras.optimizers import Adam
-from dataset import ECGSequence
+from tensorflow.keras.utils import Progbar
+from dataset import PrefetchingECGLoader, chunk_aligned_batch_size, open_ecg_sequence
 
 warnings.filterwarnings("ignore")
 
@@ -13,30 +18,39 @@ def predict_ecg_samples(
     dataset_name="tracings",
     output_file="./dnn_output.npy",
     batch_size=32,
+    n_prefetch=2,
+    align_to_chunks=False,
 ):
     """
     Predict ECG samples using a pre-trained model and save the predictions.
 
+    Batches are read by a background thread while the previous batch is predicted.
+
     Parameters:
-    path_to_hdf5 (str): Path to the HDF5 file containing ECG tracings.
+    path_to_hdf5 (str): Path to the HDF5 file containing ECG tracings, or to a .npy file from convert_dataset.py.
     path_to_model (str): Path to the pre-trained Keras model file.
     dataset_name (str): Name of the dataset within the HDF5 file. Default is 'tracings'.
     output_file (str): Path to save the output predictions. Default is './dnn_output.npy'.
     batch_size (int): Batch size for prediction. Default is 32.
+    n_prefetch (int): Number of batches read ahead of prediction. Default is 2.
+    align_to_chunks (bool): Round the batch size down to whole HDF5 chunks. Default is False.
 
     Returns:
     np.array: Predictions as a NumPy array.
     """
+    if align_to_chunks:
+        batch_size = chunk_aligned_batch_size(path_to_hdf5, dataset_name, batch_size)
+
     # Load the ECG sequence
-    seq = ECGSequence(path_to_hdf5, dataset_name, batch_size=batch_size)
+    seq = open_ecg_sequence(path_to_hdf5, dataset_name, batch_size=batch_size)
 
     # Load the pre-trained model
     model = load_model(path_to_model, compile=False)
     model.compile(loss="binary_crossentropy", optimizer=Adam())
 
     # Predict on the ECG sequence
-    print("Predicting on ECG samples...")
-    y_score = model.predict(seq, verbose=1)
+    print(f"Predicting on ECG samples (batch size {batch_size})...")
+    y_score = predict_sequence(model, seq, n_prefetch=n_prefetch, progress=Progbar(len(seq)))
 
     # Save the predictions to a file
     np.save(output_file, y_score)
@@ -45,18 +59,247 @@ def predict_ecg_samples(
     return y_score
 
 
+def predict_sequence(model, seq, n_prefetch=2, progress=None):
+    """
+    Predict every batch of a sequence while the next batches are read in the background.
+
+    Parameters:
+    model: Keras model.
+    seq (ECGSequence): Sequence of tracings to predict.
+    n_prefetch (int): Number of batches read ahead of prediction.
+    progress (Progbar): Optional progress bar advanced once per batch.
+
+    Returns:
+    np.array: Predictions for the whole sequence.
+    """
+    y_scores = []
+    for batch in PrefetchingECGLoader(seq, n_prefetch=n_prefetch):
+        y_scores.append(np.asarray(model.predict_on_batch(batch)))
+        if progress is not None:
+            progress.add(1)
+    return np.concatenate(y_scores)
+
+
+def shard_file_name(shard_dir, start_idx, end_idx):
+    return os.path.join(shard_dir, f"shard_{start_idx:010d}_{end_idx:010d}.npy")
+
+
+def saved_ranges(shard_dir):
+    """
+    List the sample ranges already saved in `shard_dir`, sorted by start.
+
+    Files are named after the samples they hold, so a run with a different shard
+    or batch size still finds the predictions of an earlier one.
+    """
+    ranges = []
+    for path in glob.glob(os.path.join(shard_dir, "shard_*_*.npy")):
+        _, start_idx, end_idx = os.path.basename(path)[:-len(".npy")].split("_")
+        ranges.append((int(start_idx), int(end_idx)))
+    return sorted(ranges)
+
+
+def missing_ranges(ranges, n_samples):
+    """
+    Return the sample ranges of [0, n_samples) not covered by `ranges`.
+    """
+    missing = []
+    position = 0
+    for start_idx, end_idx in ranges:
+        if start_idx > position:
+            missing.append((position, min(start_idx, n_samples)))
+        position = max(position, end_idx)
+    if position < n_samples:
+        missing.append((position, n_samples))
+    return [(start_idx, end_idx) for start_idx, end_idx in missing if start_idx < end_idx]
+
+
+def merge_saved_ranges(shard_dir, n_samples):
+    """
+    Concatenate the saved predictions of [0, n_samples) in sample order.
+    """
+    y_scores = []
+    position = 0
+    for start_idx, end_idx in saved_ranges(shard_dir):
+        if end_idx <= position or start_idx >= n_samples:
+            continue
+        if start_idx > position:
+            raise ValueError(f"Predictions for samples {position}-{start_idx} are missing from {shard_dir}")
+        # Ranges saved by runs with different shard sizes may overlap
+        y_score = np.load(shard_file_name(shard_dir, start_idx, end_idx))
+        y_scores.append(y_score[position - start_idx:n_samples - start_idx])
+        position = min(end_idx, n_samples)
+    if position < n_samples:
+        raise ValueError(f"Predictions for samples {position}-{n_samples} are missing from {shard_dir}")
+    return np.concatenate(y_scores)
+
+
+# Model of the current worker process, loaded once by init_shard_worker
+_worker_model = None
+
+
+def init_shard_worker(path_to_model, intra_op_threads):
+    """
+    Load the model once per worker process and split the CPU cores between the workers.
+    """
+    global _worker_model
+    import tensorflow as tf
+
+    if intra_op_threads:
+        tf.config.threading.set_intra_op_parallelism_threads(intra_op_threads)
+    _worker_model = load_model(path_to_model, compile=False)
+
+
+def save_range(shard_dir, start_idx, y_score):
+    """
+    Save the predictions of the samples starting at `start_idx`.
+
+    The file is written under a temporary name and renamed when complete, so an
+    interrupted run never leaves a partial file behind.
+    """
+    output_file = shard_file_name(shard_dir, start_idx, start_idx + len(y_score))
+    tmp_file = f"{output_file}.tmp"
+    with open(tmp_file, "wb") as f:
+        np.save(f, y_score)
+    os.replace(tmp_file, output_file)
+
+
+def predict_shard(path_to_hdf5, dataset_name, batch_size, n_prefetch, shard_dir, save_every, start_idx, end_idx):
+    """
+    Predict one shard of the dataset in a worker process.
+
+    Predictions are saved every `save_every` samples (rounded up to whole
+    batches), so a crash only loses the work since the last save.
+
+    Returns:
+    tuple: (worker process id, number of samples, seconds spent).
+    """
+    started = time.perf_counter()
+    seq = open_ecg_sequence(path_to_hdf5, dataset_name, batch_size=batch_size, start_idx=start_idx, end_idx=end_idx)
+    y_scores = []
+    saved_idx = start_idx
+    for batch in PrefetchingECGLoader(seq, n_prefetch=n_prefetch):
+        y_scores.append(np.asarray(_worker_model.predict_on_batch(batch)))
+        if sum(len(y_score) for y_score in y_scores) >= save_every:
+            y_score = np.concatenate(y_scores)
+            save_range(shard_dir, saved_idx, y_score)
+            saved_idx += len(y_score)
+            y_scores = []
+    if y_scores:
+        save_range(shard_dir, saved_idx, np.concatenate(y_scores))
+    return os.getpid(), end_idx - start_idx, time.perf_counter() - started
+
+
+def predict_shard_task(task):
+    return predict_shard(*task)
+
+
+def predict_ecg_samples_sharded(
+    path_to_hdf5,
+    path_to_model,
+    dataset_name="tracings",
+    output_file="./dnn_output.npy",
+    batch_size=32,
+    n_workers=2,
+    shard_size=10000,
+    shard_dir=None,
+    n_prefetch=2,
+    align_to_chunks=False,
+    save_every=1000,
+):
+    """
+    Predict ECG samples with several worker processes, each holding its own model.
+
+    The samples still missing from `shard_dir` are split into shards of
+    `shard_size` tracings that are predicted independently. Workers save their
+    predictions every `save_every` samples in files named after the sample
+    range they hold, so a crashed or interrupted run resumes where it stopped,
+    even with a different shard or batch size. Once every sample is covered the
+    files are merged into `output_file`.
+
+    Parameters:
+    path_to_hdf5 (str): Path to the HDF5 file containing ECG tracings, or to a .npy file from convert_dataset.py.
+    path_to_model (str): Path to the pre-trained Keras model file.
+    dataset_name (str): Name of the dataset within the HDF5 file. Default is 'tracings'.
+    output_file (str): Path to save the merged predictions. Default is './dnn_output.npy'.
+    batch_size (int): Batch size for prediction. Default is 32.
+    n_workers (int): Number of worker processes. Default is 2.
+    shard_size (int): Tracings per shard. Default is 10000.
+    shard_dir (str): Directory of the saved sample ranges. Default is '<output_file>.shards'.
+    n_prefetch (int): Number of batches read ahead of prediction in each worker. Default is 2.
+    align_to_chunks (bool): Round the batch and shard sizes down to whole HDF5 chunks. Default is False.
+    save_every (int): Samples predicted by a worker between saves. Default is 1000.
+
+    Returns:
+    np.array: Predictions as a NumPy array.
+    """
+    if align_to_chunks:
+        batch_size = chunk_aligned_batch_size(path_to_hdf5, dataset_name, batch_size)
+        shard_size = max(batch_size, shard_size // batch_size * batch_size)
+    shard_dir = shard_dir or f"{output_file}.shards"
+    os.makedirs(shard_dir, exist_ok=True)
+
+    n_samples = len(open_ecg_sequence(path_to_hdf5, dataset_name).x)
+    missing = missing_ranges(saved_ranges(shard_dir), n_samples)
+    pending = [(start_idx, min(start_idx + shard_size, end_idx))
+               for missing_start_idx, end_idx in missing
+               for start_idx in range(missing_start_idx, end_idx, shard_size)]
+    n_missing = sum(end_idx - start_idx for start_idx, end_idx in missing)
+    print(f"Predicting {n_missing} of {n_samples} ECG samples in {len(pending)} shards with {n_workers} workers "
+          f"({n_samples - n_missing} samples already done)...")
+
+    intra_op_threads = max(1, (os.cpu_count() or 1) // n_workers)
+    worker_stats = {}
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(n_workers, initializer=init_shard_worker, initargs=(path_to_model, intra_op_threads)) as pool:
+        tasks = [(path_to_hdf5, dataset_name, batch_size, n_prefetch, shard_dir, save_every, start_idx, end_idx)
+                 for start_idx, end_idx in pending]
+        progress = Progbar(len(pending))
+        # Shards finish in any order; each one is already saved when it is reported here
+        for pid, shard_samples, seconds in pool.imap_unordered(predict_shard_task, tasks):
+            samples, total_seconds = worker_stats.get(pid, (0, 0.0))
+            worker_stats[pid] = (samples + shard_samples, total_seconds + seconds)
+            progress.add(1)
+
+    for pid, (samples, seconds) in sorted(worker_stats.items()):
+        print(f"Worker {pid}: {samples} samples in {seconds:.1f}s ({samples / seconds:.1f} samples/s)")
+
+    # Merge the saved ranges in sample order
+    y_score = merge_saved_ranges(shard_dir, n_samples)
+    np.save(output_file, y_score)
+    print(f"Output predictions saved to {output_file}")
+    return y_score
+
+
 PATH_TO_HDF5 = "./data/ecg_tracings.hdf5"
 PATH_TO_MODEL = "./data/model.hdf5"
 DATASET_NAME = "tracings"
 OUTPUT_FILE = "./data/model_predictions.npy"
 BATCH_SIZE = 32
+# More than one worker switches to sharded prediction, which also resumes interrupted runs
+N_WORKERS = 1
+SHARD_SIZE = 10000
+# Round the batch size down to whole HDF5 chunks, so each chunk is decompressed once
+ALIGN_TO_CHUNKS = False
 
 
 if __name__ == "__main__":
-    predictions = predict_ecg_samples(
-        path_to_hdf5=PATH_TO_HDF5,
-        path_to_model=PATH_TO_MODEL,
-        dataset_name=DATASET_NAME,
-        output_file=OUTPUT_FILE,
-        batch_size=BATCH_SIZE,
-    )
+    if N_WORKERS > 1:
+        predictions = predict_ecg_samples_sharded(
+            path_to_hdf5=PATH_TO_HDF5,
+            path_to_model=PATH_TO_MODEL,
+            dataset_name=DATASET_NAME,
+            output_file=OUTPUT_FILE,
+            batch_size=BATCH_SIZE,
+            n_workers=N_WORKERS,
+            shard_size=SHARD_SIZE,
+            align_to_chunks=ALIGN_TO_CHUNKS,
+        )
+    else:
+        predictions = predict_ecg_samples(
+            path_to_hdf5=PATH_TO_HDF5,
+            path_to_model=PATH_TO_MODEL,
+            dataset_name=DATASET_NAME,
+            output_file=OUTPUT_FILE,
+            batch_size=BATCH_SIZE,
+            align_to_chunks=ALIGN_TO_CHUNKS,
+        )
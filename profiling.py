@@ -0,0 +1,217 @@
+"""
+On-demand profiling of the running inference service.
+
+A capture is requested by sending SIGUSR1 to a consumer process (the parent of the
+worker processes forwards it to all of them) or at startup with PROFILE_ON_START.
+inference_kcl.py blocks SIGUSR1 when it starts and worker processes inherit it
+blocked (see shard_consumer.run_worker_processes), so a request sent while they
+load TensorFlow waits for its handler instead of killing them. On ECS the signal
+is sent through ECS Exec, e.g.
+
+    aws ecs execute-command --cluster <cluster> --task <task> --interactive \
+        --container ecg-inference-container --command "sh -c 'kill -USR1 1'"
+
+Each capture records:
+
+- a statistical profile of every thread (fetch, inference, sink and IoT publish
+  workers), sampled from sys._current_frames() for a fixed duration. It is written
+  as collapsed stacks, one "thread;module:function;... count" line per stack, the
+  input format of flamegraph.pl, inferno and speedscope. Threads blocked on a
+  queue show up in their wait frames, so pipeline backpressure is visible too.
+- a TensorFlow profiler trace of the next N batches (op-level timing, opened with
+  TensorBoard's profile plugin), for the Keras backend.
+
+Files are written to a local directory or an s3:// URI (see archive.open_archive_store):
+
+    {root}/{name}-{pid}-{started}.collapsed
+    {root}/{name}-{pid}-{started}-tf/plugins/profile/...
+"""
+import os
+import sys
+import time
+import signal
+import shutil
+import logging
+import tempfile
+import threading
+import multiprocessing
+from collections import Counter
+from datetime import datetime, timezone
+
+from archive import open_archive_store
+
+
+def sample_stacks(duration_seconds, interval_seconds=0.01, exclude_thread_ids=()):
+    """
+    Sample the stacks of all threads of this process.
+
+    Parameters:
+    duration_seconds (float): How long to sample.
+    interval_seconds (float): Time between samples.
+    exclude_thread_ids (iterable[int]): Threads left out, e.g. the sampling thread itself.
+
+    Returns:
+    Counter: Number of samples per collapsed stack.
+    """
+    exclude_thread_ids = set(exclude_thread_ids)
+    stacks = Counter()
+    deadline = time.monotonic() + duration_seconds
+    while time.monotonic() < deadline:
+        thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id in exclude_thread_ids:
+                continue
+            frames = []
+            while frame is not None:
+                frames.append(f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_name}")
+                frame = frame.f_back
+            frames.append(thread_names.get(thread_id, str(thread_id)).replace(" ", "_"))
+            stacks[";".join(reversed(frames))] += 1
+        time.sleep(interval_seconds)
+    return stacks
+
+
+def collapsed_stacks(stacks):
+    """
+    Format stack sample counts as collapsed stack lines, most frequent first.
+    """
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+def forward_signal_to_children(signum):
+    """
+    Forward `signum` received by this process to its child processes.
+
+    The signal is unblocked once the handler is installed, like in OnDemandProfiler.start.
+    """
+    def handler(received_signum, frame):
+        for process in multiprocessing.active_children():
+            os.kill(process.pid, received_signum)
+
+    signal.signal(signum, handler)
+    if hasattr(signal, "pthread_sigmask"):
+        signal.pthread_sigmask(signal.SIG_UNBLOCK, [signum])
+
+
+class OnDemandProfiler:
+    """
+    Captures a sampling profile and a TensorFlow trace when requested.
+
+    Stack sampling runs on a background thread for `duration_seconds`. The
+    TensorFlow trace is started and stopped by the inference thread around the
+    next `tf_batches` batches through before_batch/after_batch, so it only
+    covers inference and stays pending while no batches arrive.
+    """
+
+    def __init__(self, output_uri, name="inference", duration_seconds=30, sample_interval_seconds=0.01,
+                 tf_batches=20, endpoint_url=None):
+        """
+        Parameters:
+        output_uri (str): Local directory or s3://bucket/prefix for the results.
+        name (str): Prefix of the result files.
+        duration_seconds (float): Length of the sampling profile.
+        sample_interval_seconds (float): Time between stack samples.
+        tf_batches (int): Batches covered by the TensorFlow trace; 0 disables it.
+        endpoint_url (str): Optional S3 endpoint override.
+        """
+        self.output_uri = output_uri
+        self.store = open_archive_store(output_uri, endpoint_url)
+        self.name = name
+        self.duration_seconds = duration_seconds
+        self.sample_interval_seconds = sample_interval_seconds
+        self.tf_batches = tf_batches
+        self._requested = threading.Event()
+        self._thread = None
+        # TensorFlow trace state, only touched by the inference thread once a trace is requested
+        self._tf_requested_prefix = None
+        self._tf_prefix = None
+        self._tf_logdir = None
+        self._tf_batches_left = 0
+
+    def start(self, signum=getattr(signal, "SIGUSR1", None)):
+        """
+        Start the capture thread and request captures on `signum`.
+
+        Must be called from the main thread when a signal is given. The signal
+        is unblocked once the handler is installed, so a request that arrived
+        while a worker process started with it blocked is captured now.
+        """
+        if signum is not None:
+            signal.signal(signum, lambda received_signum, frame: self.request())
+            if hasattr(signal, "pthread_sigmask"):
+                signal.pthread_sigmask(signal.SIG_UNBLOCK, [signum])
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+        logging.info(f"Profiler ready (pid {os.getpid()}), results are written to {self.output_uri}.")
+
+    def request(self):
+        """
+        Request a capture. Safe to call from a signal handler.
+        """
+        self._requested.set()
+
+    def _run(self):
+        while True:
+            self._requested.wait()
+            self._requested.clear()
+            try:
+                self.capture()
+            except Exception as e:
+                logging.error(f"Profile capture failed: {e}")
+
+    def capture(self):
+        """
+        Sample all threads for the configured duration and write the collapsed stacks.
+        """
+        prefix = f"{self.name}-{os.getpid()}-{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}"
+        if self.tf_batches > 0:
+            self._tf_requested_prefix = prefix
+        logging.info(f"Capturing a {self.duration_seconds:.0f}s sampling profile ({prefix}).")
+        stacks = sample_stacks(self.duration_seconds, self.sample_interval_seconds,
+                               exclude_thread_ids=[threading.get_ident()])
+        self.store.write(f"{prefix}.collapsed", collapsed_stacks(stacks).encode("utf-8"))
+        logging.info(f"Wrote {sum(stacks.values())} stack samples to {prefix}.collapsed.")
+
+    def before_batch(self):
+        """
+        Start a requested TensorFlow trace. Called by the inference thread before each batch.
+        """
+        if self._tf_requested_prefix is None or self._tf_logdir is not None:
+            return
+        self._tf_prefix, self._tf_requested_prefix = self._tf_requested_prefix, None
+        try:
+            import tensorflow as tf
+
+            logdir = tempfile.mkdtemp(prefix="tf-profile-")
+            tf.profiler.experimental.start(logdir)
+        except Exception as e:
+            logging.warning(f"Could not start the TensorFlow profiler: {e}")
+            return
+        self._tf_logdir = logdir
+        self._tf_batches_left = self.tf_batches
+
+    def after_batch(self):
+        """
+        Stop the TensorFlow trace after its last batch and write it out.
+        """
+        if self._tf_logdir is None:
+            return
+        self._tf_batches_left -= 1
+        if self._tf_batches_left > 0:
+            return
+
+        import tensorflow as tf
+
+        logdir, self._tf_logdir = self._tf_logdir, None
+        try:
+            tf.profiler.experimental.stop()
+            for directory, _, filenames in os.walk(logdir):
+                for filename in filenames:
+                    path = os.path.join(directory, filename)
+                    with open(path, "rb") as f:
+                        self.store.write(f"{self._tf_prefix}-tf/{os.path.relpath(path, logdir)}", f.read())
+            logging.info(f"Wrote TensorFlow trace of {self.tf_batches} batches to {self._tf_prefix}-tf/.")
+        except Exception as e:
+            logging.error(f"Could not write the TensorFlow trace: {e}")
+        finally:
+            shutil.rmtree(logdir, ignore_errors=True)
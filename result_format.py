@@ -0,0 +1,104 @@
+"""
+Batch formatting of inference results for the result sink.
+
+Predictions of a whole batch are thresholded and mapped to abnormality labels with
+NumPy, and every result is serialized once into a DynamoDB attribute-value map (for
+the low-level BatchWriteItem API) and once into the JSON bytes published over MQTT,
+without converting scores to Decimal and back.
+"""
+import json
+import numpy as np
+
+try:
+    import orjson
+except ImportError:  # fall back to the standard library encoder
+    orjson = None
+
+ABNORMALITIES = ["1dAVb", "RBBB", "LBBB", "SB", "AF", "ST"]
+# Scores are sigmoid outputs of a float32 model, more decimals carry no information
+SCORE_DECIMALS = 6
+
+_ABNORMALITY_BITS = 1 << np.arange(len(ABNORMALITIES))
+# Labels (and their attribute values) for every combination of abnormalities, indexed by bitmask
+ABNORMALITY_LABELS = [[label for i, label in enumerate(ABNORMALITIES) if code >> i & 1]
+                      for code in range(1 << len(ABNORMALITIES))]
+_ABNORMALITY_ATTRIBUTES = [{"L": [{"S": label} for label in labels]} for labels in ABNORMALITY_LABELS]
+
+
+def abnormality_codes(predictions, threshold=0.5):
+    """
+    Threshold a batch of predictions into one bitmask per record.
+
+    Parameters:
+    predictions (np.array): Scores of shape (batch_size, len(ABNORMALITIES)).
+    threshold (float): Scores above it count as detected.
+
+    Returns:
+    np.array: Bitmask per record, bit i set when ABNORMALITIES[i] was detected.
+    """
+    return (np.asarray(predictions) > threshold).astype(np.int64) @ _ABNORMALITY_BITS
+
+
+def detect_abnormalities(predictions, threshold=0.5):
+    """
+    Map a batch of predictions to the labels of the detected abnormalities.
+
+    Returns:
+    list[list[str]]: Detected abnormalities per record.
+    """
+    return [ABNORMALITY_LABELS[code] for code in abnormality_codes(predictions, threshold).tolist()]
+
+
+def to_attribute_value(value):
+    """
+    Serialize a JSON-like value into a DynamoDB attribute value.
+    """
+    if isinstance(value, str):
+        return {"S": value}
+    if isinstance(value, bool):
+        return {"BOOL": value}
+    if isinstance(value, (int, float)):
+        return {"N": repr(value)}
+    if value is None:
+        return {"NULL": True}
+    if isinstance(value, (list, tuple)):
+        return {"L": [to_attribute_value(item) for item in value]}
+    if isinstance(value, dict):
+        return {"M": {key: to_attribute_value(item) for key, item in value.items()}}
+    raise TypeError(f"Type {type(value)} not serializable")
+
+
+def dumps(obj):
+    """
+    Encode a JSON-like object to compact UTF-8 JSON bytes, with orjson when available.
+    """
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+
+def format_results(records, predictions, threshold=0.5):
+    """
+    Format a batch of records and their predictions for storage and publishing.
+
+    Parameters:
+    records (list[dict]): Result records without 'aggregated_data'.
+    predictions (np.array): Scores of shape (batch_size, len(ABNORMALITIES)).
+    threshold (float): Scores above it count as detected.
+
+    Returns:
+    tuple: (list of DynamoDB attribute-value maps, list of MQTT payloads as bytes), in record order.
+    """
+    scores = np.round(np.asarray(predictions, dtype=np.float64), SCORE_DECIMALS).tolist()
+    codes = abnormality_codes(predictions, threshold).tolist()
+
+    items, payloads = [], []
+    for record, record_scores, code in zip(records, scores, codes):
+        item = {key: to_attribute_value(value) for key, value in record.items()}
+        item["prediction"] = {"L": [{"N": repr(score)} for score in record_scores]}
+        item["detected_abnormalities"] = _ABNORMALITY_ATTRIBUTES[code]
+        items.append(item)
+
+        payloads.append(dumps(dict(record, prediction=record_scores,
+                                   detected_abnormalities=ABNORMALITY_LABELS[code])))
+    return items, payloads
@@ -0,0 +1,172 @@
+import time
+import random
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait
+
+# BatchWriteItem accepts at most 25 put requests per call
+DYNAMODB_BATCH_WRITE_LIMIT = 25
+
+
+class BatchResultSink:
+    """
+    Batched writer for inference results.
+
+    Items are written with BatchWriteItem in groups of 25, unprocessed items are
+    retried with exponential backoff, and the MQTT publishes for the same batch are
+    sent concurrently over a pooled executor. Items and payloads arrive already
+    serialized (see result_format.format_results). Both the DynamoDB and the IoT
+    client are injected, so the sink can run against DynamoDB Local or moto.
+    """
+
+    def __init__(self, dynamodb_client, table_name, iot_client, key_names=("device_id", "timestamp_capture_begin"),
+                 topic_template="iot/ecg/{device_id}/chunk-results/", max_publish_workers=8, max_retries=8,
+                 base_backoff_seconds=0.05, max_backoff_seconds=2.0):
+        """
+        Parameters:
+        dynamodb_client: Low-level boto3 DynamoDB client (items are attribute-value maps).
+        table_name (str): Name of the processed-results table.
+        iot_client: boto3 'iot-data' client.
+        key_names (tuple[str]): Key attributes of the table, used to drop duplicate keys within a batch.
+        topic_template (str): MQTT topic, formatted with the record's device_id.
+        max_publish_workers (int): Size of the thread pool used for publishes.
+        max_retries (int): Retries for unprocessed BatchWriteItem entries before giving up.
+        base_backoff_seconds (float): Initial backoff between retries.
+        max_backoff_seconds (float): Upper bound for a single backoff.
+        """
+        self.dynamodb_client = dynamodb_client
+        self.table_name = table_name
+        self.key_names = key_names
+        self.iot_client = iot_client
+        self.topic_template = topic_template
+        self.max_retries = max_retries
+        self.base_backoff_seconds = base_backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self._publish_executor = ThreadPoolExecutor(max_workers=max_publish_workers,
+                                                    thread_name_prefix="iot-publish")
+
+    def _backoff(self, attempt):
+        # Full jitter exponential backoff
+        delay = min(self.max_backoff_seconds, self.base_backoff_seconds * (2 ** attempt))
+        time.sleep(random.uniform(0, delay))
+
+    def _write_chunk(self, items):
+        """
+        Write up to 25 items, retrying unprocessed ones.
+
+        Returns:
+        int: Number of items that could not be written after all retries.
+        """
+        table_name = self.table_name
+        request_items = {table_name: [{"PutRequest": {"Item": item}} for item in items]}
+
+        for attempt in range(self.max_retries + 1):
+            response = self.dynamodb_client.batch_write_item(RequestItems=request_items)
+            unprocessed = response.get("UnprocessedItems", {})
+            if not unprocessed.get(table_name):
+                return 0
+            request_items = unprocessed
+            if attempt < self.max_retries:
+                logging.warning(f"Retrying {len(unprocessed[table_name])} unprocessed items "
+                                f"(attempt {attempt + 1}/{self.max_retries}).")
+                self._backoff(attempt)
+
+        return len(request_items[table_name])
+
+    def write_items(self, items):
+        """
+        Write items to DynamoDB with BatchWriteItem in groups of 25.
+
+        Parameters:
+        items (list[dict]): Attribute-value maps to put; later items win on duplicate keys.
+
+        Returns:
+        int: Number of items that failed to be written.
+        """
+        # BatchWriteItem rejects requests that contain the same key twice
+        unique_items = {tuple(tuple(item[name].items()) for name in self.key_names): item for item in items}
+        items = list(unique_items.values())
+
+        failed = 0
+        for start in range(0, len(items), DYNAMODB_BATCH_WRITE_LIMIT):
+            failed += self._write_chunk(items[start:start + DYNAMODB_BATCH_WRITE_LIMIT])
+        return failed
+
+    def _publish(self, device_id, payload):
+        self.iot_client.publish(
+            topic=self.topic_template.format(device_id=device_id),
+            qos=1,
+            payload=payload
+        )
+
+    def submit_publishes(self, device_ids, payloads):
+        """
+        Start publishing each payload to its device topic without waiting.
+
+        Parameters:
+        device_ids (list[str]): Device of each payload.
+        payloads (list[bytes]): Encoded results to publish.
+
+        Returns:
+        list[Future]: One future per payload, in the same order.
+        """
+        return [self._publish_executor.submit(self._publish, device_id, payload)
+                for device_id, payload in zip(device_ids, payloads)]
+
+    def wait_for_publishes(self, device_ids, futures):
+        """
+        Wait for publishes started by submit_publishes and log failures.
+
+        Parameters:
+        device_ids (list[str]): Device of each publish.
+        futures (list[Future]): Futures returned by submit_publishes.
+
+        Returns:
+        int: Number of publishes that failed.
+        """
+        wait(futures)
+
+        failed = 0
+        for device_id, future in zip(device_ids, futures):
+            error = future.exception()
+            if error is not None:
+                failed += 1
+                logging.error(f"Failed to publish result for Device ID: {device_id}: {error}")
+        return failed
+
+    def flush(self, items, payloads):
+        """
+        Persist and publish one batch of results.
+
+        Parameters:
+        items (list[dict]): DynamoDB attribute-value maps of the results.
+        payloads (list[bytes]): MQTT payloads of the same results, in the same order.
+
+        Returns:
+        dict: Flush statistics (records, failed writes, failed publishes, timings in seconds).
+        """
+        flush_started = time.monotonic()
+        # Start the publishes first so they overlap with the DynamoDB writes
+        device_ids = [item["device_id"]["S"] for item in items]
+        publish_futures = self.submit_publishes(device_ids, payloads)
+        failed_writes = self.write_items(items)
+        write_finished = time.monotonic()
+        failed_publishes = self.wait_for_publishes(device_ids, publish_futures)
+        flush_finished = time.monotonic()
+
+        stats = {
+            "records": len(items),
+            "failed_writes": failed_writes,
+            "failed_publishes": failed_publishes,
+            "write_seconds": write_finished - flush_started,
+            "flush_seconds": flush_finished - flush_started,
+        }
+        logging.debug(f"Flushed {stats['records']} results in {stats['flush_seconds']:.3f}s "
+                      f"(DynamoDB {stats['write_seconds']:.3f}s, failed writes {failed_writes}, "
+                      f"failed publishes {failed_publishes}).")
+        return stats
+
+    def close(self):
+        """
+        Wait for outstanding publishes and release the executor.
+        """
+        self._publish_executor.shutdown(wait=True)
@@ -0,0 +1,676 @@
+import os
+import math
+import time
+import socket
+import logging
+import signal
+import threading
+import multiprocessing
+
+from botocore.exceptions import ClientError
+
+from wire_format import decode_record
+from kinesis_reader import AdaptivePoller, GET_RECORDS_MIN_INTERVAL_SECONDS
+
+# Checkpoint value of a closed shard that has been read to the end; its children may be leased
+SHARD_END = "SHARD_END"
+
+
+def list_shards(kinesis_client, stream_name):
+    """
+    List all shards of a stream, including closed parents still within the retention period.
+
+    Parameters:
+    kinesis_client: boto3 Kinesis client.
+    stream_name (str): Name of the Kinesis stream.
+
+    Returns:
+    list[dict]: Shard descriptions as returned by ListShards.
+    """
+    shards = []
+    request = {"StreamName": stream_name}
+    while True:
+        response = kinesis_client.list_shards(**request)
+        shards.extend(response["Shards"])
+        if not response.get("NextToken"):
+            return shards
+        # StreamName must not be repeated together with NextToken
+        request = {"NextToken": response["NextToken"]}
+
+
+def get_shard_iterator(kinesis_client, stream_name, shard_id, sequence_number=None,
+                       shard_iterator_type="TRIM_HORIZON"):
+    """
+    Get a shard iterator that resumes right after `sequence_number`, or starts at `shard_iterator_type`.
+
+    Parameters:
+    kinesis_client: boto3 Kinesis client.
+    stream_name (str): Name of the Kinesis stream.
+    shard_id (str): Shard to read.
+    sequence_number (str): Last processed (or fetched) sequence number, if any.
+    shard_iterator_type (str): Iterator type used when there is no sequence number.
+
+    Returns:
+    str: Shard iterator.
+    """
+    request = {"StreamName": stream_name, "ShardId": shard_id, "ShardIteratorType": shard_iterator_type}
+    if sequence_number is not None:
+        request.update(ShardIteratorType="AFTER_SEQUENCE_NUMBER", StartingSequenceNumber=sequence_number)
+    return kinesis_client.get_shard_iterator(**request)["ShardIterator"]
+
+
+def create_lease_table(dynamodb_client, table_name):
+    """
+    Create the shard lease table (same schema as terraform-aws/dynamodb.tf) if it does not exist.
+
+    Parameters:
+    dynamodb_client: boto3 DynamoDB client, e.g. pointing at DynamoDB Local.
+    table_name (str): Name of the table to create.
+    """
+    if table_name in dynamodb_client.list_tables()["TableNames"]:
+        return
+    dynamodb_client.create_table(
+        TableName=table_name,
+        KeySchema=[{"AttributeName": "shard_id", "KeyType": "HASH"}],
+        AttributeDefinitions=[{"AttributeName": "shard_id", "AttributeType": "S"}],
+        BillingMode="PAY_PER_REQUEST",
+    )
+    dynamodb_client.get_waiter("table_exists").wait(TableName=table_name)
+
+
+class ShardLeaseTable:
+    """
+    Shard leases shared by all consumer processes of all tasks, stored in DynamoDB.
+
+    Every shard has one item holding its current owner, the lease expiry time and a
+    lease counter used for optimistic locking. A worker keeps its leases by renewing
+    them; leases that are not renewed expire and are taken over by other workers.
+    Workers holding fewer leases than their fair share take free leases first and
+    then steal one lease at a time from the most loaded worker.
+    """
+
+    def __init__(self, dynamodb_client, table_name, worker_id, lease_duration_seconds=30):
+        self.dynamodb_client = dynamodb_client
+        self.table_name = table_name
+        self.worker_id = worker_id
+        self.lease_duration_seconds = lease_duration_seconds
+
+    def sync_shards(self, shards):
+        """
+        Create a lease for every shard that does not have one yet.
+
+        Parameters:
+        shards (list[dict]): Shard descriptions from list_shards.
+        """
+        for shard in shards:
+            parent_shard_ids = [shard[key] for key in ("ParentShardId", "AdjacentParentShardId") if shard.get(key)]
+            try:
+                self.dynamodb_client.put_item(
+                    TableName=self.table_name,
+                    Item={
+                        "shard_id": {"S": shard["ShardId"]},
+                        "parent_shard_ids": {"L": [{"S": parent_id} for parent_id in parent_shard_ids]},
+                        "lease_counter": {"N": "0"},
+                        "lease_expires_at": {"N": "0"},
+                    },
+                    ConditionExpression="attribute_not_exists(shard_id)",
+                )
+                logging.info(f"Created lease for shard {shard['ShardId']}")
+            except ClientError as e:
+                if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                    raise
+
+    def list_leases(self):
+        """
+        Read all leases.
+
+        Returns:
+        list[dict]: Leases with 'shard_id', 'lease_owner', 'lease_expires_at', 'lease_counter',
+                    'checkpoint' and 'parent_shard_ids'.
+        """
+        leases = []
+        request = {"TableName": self.table_name, "ConsistentRead": True}
+        while True:
+            response = self.dynamodb_client.scan(**request)
+            leases.extend(parse_lease(item) for item in response["Items"])
+            if "LastEvaluatedKey" not in response:
+                return leases
+            request["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+    def leases_to_take(self, leases, now):
+        """
+        Pick the leases this worker should try to take to reach its fair share.
+
+        Shards whose parents have not been read to the end are skipped, so records
+        of a device are never processed out of order across a split or merge.
+
+        Parameters:
+        leases (list[dict]): Current leases from list_leases.
+        now (float): Current epoch time in seconds.
+
+        Returns:
+        list[dict]: Leases to take, in order of preference.
+        """
+        finished = {lease["shard_id"] for lease in leases if lease["checkpoint"] == SHARD_END}
+        known = {lease["shard_id"] for lease in leases}
+        # Parents that already left the stream's retention period count as finished
+        eligible = [lease for lease in leases if lease["checkpoint"] != SHARD_END
+                    and all(parent_id in finished or parent_id not in known for parent_id in lease["parent_shard_ids"])]
+
+        leases_per_owner = {}
+        for lease in eligible:
+            if lease["lease_owner"] and lease["lease_expires_at"] > now:
+                leases_per_owner.setdefault(lease["lease_owner"], []).append(lease)
+        n_workers = len(set(leases_per_owner) | {self.worker_id})
+        target = math.ceil(len(eligible) / n_workers)
+        n_missing = target - len(leases_per_owner.get(self.worker_id, []))
+        if n_missing <= 0:
+            return []
+
+        free = [lease for lease in eligible if not lease["lease_owner"] or lease["lease_expires_at"] <= now]
+        if free:
+            return free[:n_missing]
+
+        # Steal a single lease per refresh so that the load converges without thrashing
+        busiest_owner, busiest_leases = max(leases_per_owner.items(), key=lambda item: len(item[1]),
+                                            default=(None, []))
+        if busiest_owner != self.worker_id and len(busiest_leases) > target:
+            return busiest_leases[:1]
+        return []
+
+    def take_lease(self, lease, now):
+        """
+        Take a lease, failing if another worker changed it since it was read.
+
+        Parameters:
+        lease (dict): Lease from list_leases.
+        now (float): Current epoch time in seconds.
+
+        Returns:
+        bool: True if this worker now owns the lease.
+        """
+        condition = "lease_counter = :counter"
+        if lease["lease_counter"] == 0:
+            # Items written without a counter parse as counter 0
+            condition += " OR attribute_not_exists(lease_counter)"
+        try:
+            self.dynamodb_client.update_item(
+                TableName=self.table_name,
+                Key={"shard_id": {"S": lease["shard_id"]}},
+                UpdateExpression="SET lease_owner = :owner, lease_expires_at = :expires_at "
+                                 "ADD lease_counter :one",
+                ConditionExpression=condition,
+                ExpressionAttributeValues={
+                    ":owner": {"S": self.worker_id},
+                    ":expires_at": {"N": str(now + self.lease_duration_seconds)},
+                    ":one": {"N": "1"},
+                    ":counter": {"N": str(lease["lease_counter"])},
+                },
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                return False
+            raise
+        if lease["lease_owner"] and lease["lease_owner"] != self.worker_id and lease["lease_expires_at"] > now:
+            logging.info(f"Took lease for shard {lease['shard_id']} from {lease['lease_owner']}")
+        else:
+            logging.info(f"Took lease for shard {lease['shard_id']}")
+        return True
+
+    def _update_owned_lease(self, shard_id, update_expression, values=None):
+        try:
+            self.dynamodb_client.update_item(
+                TableName=self.table_name,
+                Key={"shard_id": {"S": shard_id}},
+                UpdateExpression=update_expression,
+                ConditionExpression="lease_owner = :owner",
+                ExpressionAttributeValues={":owner": {"S": self.worker_id}, **(values or {})},
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                return False
+            raise
+        return True
+
+    def renew_lease(self, shard_id, now):
+        """
+        Extend a lease owned by this worker.
+
+        The lease counter is bumped as well, so a take_lease based on a read from
+        before the renewal fails instead of taking a lease that is still in use.
+
+        Returns:
+        bool: False if the lease was taken over by another worker.
+        """
+        return self._update_owned_lease(shard_id, "SET lease_expires_at = :expires_at ADD lease_counter :one",
+                                        {":expires_at": {"N": str(now + self.lease_duration_seconds)},
+                                         ":one": {"N": "1"}})
+
+    def release_lease(self, shard_id):
+        """
+        Give up a lease so another worker can take it immediately.
+        """
+        return self._update_owned_lease(shard_id, "SET lease_expires_at = :zero REMOVE lease_owner",
+                                        {":zero": {"N": "0"}})
+
+    def mark_shard_end(self, shard_id):
+        """
+        Record that a closed shard was read to the end and release its lease.
+        """
+        return self._update_owned_lease(shard_id, "SET checkpoint = :shard_end, lease_expires_at = :zero "
+                                                  "REMOVE lease_owner",
+                                        {":shard_end": {"S": SHARD_END}, ":zero": {"N": "0"}})
+
+    def get_checkpoint(self, shard_id):
+        """
+        Return the checkpointed sequence number of a shard, or None.
+        """
+        item = self.dynamodb_client.get_item(
+            TableName=self.table_name,
+            Key={"shard_id": {"S": shard_id}},
+            ConsistentRead=True,
+        ).get("Item")
+        return parse_lease(item)["checkpoint"] if item else None
+
+    def checkpoint(self, shard_id, sequence_number, require_lease=True):
+        """
+        Save the last processed sequence number of a shard.
+
+        Parameters:
+        shard_id (str): Shard to checkpoint.
+        sequence_number (str): Last processed sequence number, or SHARD_END.
+        require_lease (bool): Only write while this worker owns the lease. Single-shard
+                              consumers that don't take leases write unconditionally.
+
+        Returns:
+        bool: False if the lease is owned by another worker.
+        """
+        if require_lease and sequence_number == SHARD_END:
+            return self.mark_shard_end(shard_id)
+        if require_lease:
+            return self._update_owned_lease(shard_id, "SET checkpoint = :checkpoint",
+                                            {":checkpoint": {"S": sequence_number}})
+        # The item may not exist yet; give it the lease counter take_lease conditions on
+        self.dynamodb_client.update_item(
+            TableName=self.table_name,
+            Key={"shard_id": {"S": shard_id}},
+            UpdateExpression="SET checkpoint = :checkpoint, lease_counter = if_not_exists(lease_counter, :zero)",
+            ExpressionAttributeValues={":checkpoint": {"S": sequence_number}, ":zero": {"N": "0"}},
+        )
+        return True
+
+
+def parse_lease(item):
+    """
+    Convert a lease item in DynamoDB attribute format to a plain dict.
+    """
+    return {
+        "shard_id": item["shard_id"]["S"],
+        "lease_owner": item.get("lease_owner", {}).get("S"),
+        "lease_expires_at": float(item.get("lease_expires_at", {"N": "0"})["N"]),
+        "lease_counter": int(item.get("lease_counter", {"N": "0"})["N"]),
+        "checkpoint": item.get("checkpoint", {}).get("S"),
+        "parent_shard_ids": [parent["S"] for parent in item.get("parent_shard_ids", {}).get("L", [])],
+    }
+
+
+class ShardWorker:
+    """
+    Reads all shards leased by one consumer process.
+
+    Held leases are renewed every `lease_refresh_seconds` on a background thread,
+    so a consumer stalled by pipeline backpressure keeps its leases. Leases are
+    rebalanced and taken over on the same schedule from the fetch loop, and leases
+    found lost by the renewal stop being read at its next iteration. Shards that
+    were closed by a split or merge are
+    read to the end and marked with SHARD_END, which makes their children eligible
+    for leasing.
+
+    With a checkpointer, reading a newly taken shard resumes after its lease's
+    checkpoint, and SHARD_END is only recorded once the shard's last records were
+    processed. Expired shard iterators are renewed from the last fetched record.
+
+    Every shard is polled on its own schedule (see kinesis_reader.AdaptivePoller):
+    shards with a backlog are drained at the per-shard call limit while idle ones back off.
+    """
+
+    def __init__(self, kinesis_client, lease_table, stream_name, limit=15, shard_iterator_type="TRIM_HORIZON",
+                 lease_refresh_seconds=10, shard_sync_seconds=60,
+                 min_poll_interval_seconds=GET_RECORDS_MIN_INTERVAL_SECONDS, max_poll_interval_seconds=1.0,
+                 checkpointer=None, metrics=None):
+        self.kinesis_client = kinesis_client
+        self.lease_table = lease_table
+        self.stream_name = stream_name
+        self.limit = limit
+        self.shard_iterator_type = shard_iterator_type
+        self.lease_refresh_seconds = lease_refresh_seconds
+        self.shard_sync_seconds = shard_sync_seconds
+        self.min_poll_interval_seconds = min_poll_interval_seconds
+        self.max_poll_interval_seconds = max_poll_interval_seconds
+        self.checkpointer = checkpointer
+        self.metrics = metrics
+        # shard_id -> next shard iterator
+        self.shard_iterators = {}
+        # shard_id -> (AdaptivePoller, monotonic time of the next GetRecords call)
+        self.poll_schedule = {}
+        # shard_id -> sequence number of the last fetched record, used to renew expired iterators
+        self.last_sequence_numbers = {}
+        # Exhausted shards whose SHARD_END checkpoint waits for their last records to be processed
+        self.ending_shards = set()
+        self._next_lease_refresh = 0
+        self._next_shard_sync = 0
+        # Guards the set of held shards, which the renewal thread reads and prunes
+        self._lock = threading.Lock()
+        self._lost_shards = set()
+        self._stop_renewal = threading.Event()
+        self._renewal_thread = None
+
+    def renew_leases(self, now):
+        """
+        Renew every held lease. Lost leases are dropped by the fetch loop before its next poll.
+
+        Parameters:
+        now (float): Current epoch time in seconds.
+        """
+        with self._lock:
+            reading_shards = list(self.shard_iterators)
+            ending_shards = list(self.ending_shards)
+        for shard_id in reading_shards:
+            if not self.lease_table.renew_lease(shard_id, now):
+                logging.info(f"Lost lease for shard {shard_id}, stopping reads.")
+                with self._lock:
+                    self._lost_shards.add(shard_id)
+        for shard_id in ending_shards:
+            # Fails once the SHARD_END checkpoint released the lease
+            if not self.lease_table.renew_lease(shard_id, now):
+                with self._lock:
+                    self.ending_shards.discard(shard_id)
+
+    def _renew_leases_periodically(self):
+        while not self._stop_renewal.wait(self.lease_refresh_seconds):
+            try:
+                self.renew_leases(time.time())
+            except Exception as e:
+                logging.error(f"Error renewing shard leases: {e}")
+
+    def start_lease_renewal(self):
+        """
+        Start renewing held leases on a background thread, independently of the record consumer.
+        """
+        if self._renewal_thread is None:
+            self._renewal_thread = threading.Thread(target=self._renew_leases_periodically,
+                                                    name="lease-renewal", daemon=True)
+            self._renewal_thread.start()
+
+    def _drop_lost_shards(self):
+        with self._lock:
+            lost_shards, self._lost_shards = self._lost_shards, set()
+        for shard_id in lost_shards:
+            self._drop_shard(shard_id)
+
+    def refresh_leases(self, now):
+        """
+        Sync leases with the stream's shards and take new ones.
+
+        Parameters:
+        now (float): Current epoch time in seconds.
+        """
+        if now >= self._next_shard_sync:
+            self.lease_table.sync_shards(list_shards(self.kinesis_client, self.stream_name))
+            self._next_shard_sync = now + self.shard_sync_seconds
+
+        self._drop_lost_shards()
+        for lease in self.lease_table.leases_to_take(self.lease_table.list_leases(), now):
+            shard_id = lease["shard_id"]
+            if shard_id in self.shard_iterators or shard_id in self.ending_shards:
+                continue
+            if self.lease_table.take_lease(lease, now):
+                checkpoint = lease["checkpoint"] if self.checkpointer is not None else None
+                if checkpoint is not None:
+                    logging.info(f"Resuming shard {shard_id} after sequence number {checkpoint}")
+                shard_iterator = get_shard_iterator(self.kinesis_client, self.stream_name, shard_id,
+                                                    checkpoint, self.shard_iterator_type)
+                with self._lock:
+                    self.shard_iterators[shard_id] = shard_iterator
+                self.last_sequence_numbers[shard_id] = checkpoint
+                self.poll_schedule[shard_id] = (AdaptivePoller(self.min_poll_interval_seconds,
+                                                               self.max_poll_interval_seconds), 0)
+        self._next_lease_refresh = now + self.lease_refresh_seconds
+
+    def _drop_shard(self, shard_id):
+        with self._lock:
+            self.shard_iterators.pop(shard_id, None)
+        self.last_sequence_numbers.pop(shard_id, None)
+        self.poll_schedule.pop(shard_id, None)
+
+    def next_poll_time(self):
+        """
+        Monotonic time at which the next leased shard is due to be polled, or None without leases.
+        """
+        return min((next_poll for _, next_poll in self.poll_schedule.values()), default=None)
+
+    def poll(self):
+        """
+        Call GetRecords once on every leased shard that is due.
+
+        Returns:
+        list[dict]: Parsed records from the polled shards.
+        """
+        records = []
+        for shard_id, shard_iterator in list(self.shard_iterators.items()):
+            poller, next_poll = self.poll_schedule[shard_id]
+            call_started = time.monotonic()
+            if call_started < next_poll:
+                continue
+            try:
+                response = self.kinesis_client.get_records(ShardIterator=shard_iterator, Limit=self.limit)
+            except self.kinesis_client.exceptions.ProvisionedThroughputExceededException:
+                logging.warning(f"Reads from shard {shard_id} were throttled, backing off.")
+                if self.metrics is not None:
+                    self.metrics.increment("ReadThrottles")
+                self.poll_schedule[shard_id] = (poller, call_started + poller.backoff())
+                continue
+            except self.kinesis_client.exceptions.ExpiredIteratorException:
+                logging.warning(f"Shard iterator of shard {shard_id} expired, renewing it.")
+                self.shard_iterators[shard_id] = get_shard_iterator(
+                    self.kinesis_client, self.stream_name, shard_id,
+                    self.last_sequence_numbers.get(shard_id), self.shard_iterator_type)
+                continue
+            except Exception as e:
+                logging.error(f"Error fetching records from shard {shard_id}: {e}")
+                continue
+
+            fetch_finished = time.monotonic()
+            shard_records = response["Records"]
+            parsed_records = []
+            for record in shard_records:
+                # A record that can never be decoded is skipped, otherwise the shard would be stuck on it
+                try:
+                    parsed_records.append(decode_record(record["Data"]))
+                except Exception as e:
+                    logging.error(f"Skipping malformed record {record['SequenceNumber']} of shard {shard_id}: {e}")
+                    if self.metrics is not None:
+                        self.metrics.increment("MalformedRecords")
+            records.extend(parsed_records)
+            millis_behind_latest = response.get("MillisBehindLatest")
+            next_interval = poller.next_interval(len(shard_records), millis_behind_latest)
+            self.poll_schedule[shard_id] = (poller, call_started + next_interval)
+            if self.metrics is not None:
+                self.metrics.observe("FetchTime", (fetch_finished - call_started) * 1000)
+                self.metrics.observe("DecodeTime", (time.monotonic() - fetch_finished) * 1000)
+                self.metrics.observe("MillisBehindLatest", millis_behind_latest, dimensions={"ShardId": shard_id})
+                self.metrics.increment("RecordsFetched", len(shard_records))
+            if shard_records:
+                self.last_sequence_numbers[shard_id] = shard_records[-1]["SequenceNumber"]
+                if self.checkpointer is not None:
+                    self.checkpointer.fetched(shard_id, shard_records[-1]["SequenceNumber"], len(parsed_records))
+
+            next_shard_iterator = response.get("NextShardIterator")
+            if next_shard_iterator is None:
+                logging.info(f"Shard {shard_id} was closed and fully read, releasing it to its children.")
+                self._drop_shard(shard_id)
+                if self.checkpointer is not None:
+                    with self._lock:
+                        self.ending_shards.add(shard_id)
+                    self.checkpointer.fetched(shard_id, SHARD_END, 0)
+                else:
+                    self.lease_table.mark_shard_end(shard_id)
+                # Look for the child shards right away instead of waiting for the next refresh
+                self._next_lease_refresh = 0
+                self._next_shard_sync = 0
+            else:
+                self.shard_iterators[shard_id] = next_shard_iterator
+        return records
+
+    def record_batches(self, yield_empty=False):
+        """
+        Yield batches of parsed records from all leased shards.
+
+        Parameters:
+        yield_empty (bool): Also yield empty lists on idle polls, so callers can act on timeouts.
+
+        Yields:
+        list[dict]: Records returned by one round of GetRecords calls.
+        """
+        self.start_lease_renewal()
+        while True:
+            self._drop_lost_shards()
+            now = time.time()
+            if now >= self._next_lease_refresh:
+                try:
+                    self.refresh_leases(now)
+                except Exception as e:
+                    logging.error(f"Error refreshing shard leases: {e}")
+                    self._next_lease_refresh = now + self.lease_refresh_seconds
+
+            records = self.poll()
+            if records:
+                logging.debug(f"Retrieved {len(records)} records from {len(self.shard_iterators)} shards.")
+                yield records
+            elif yield_empty:
+                yield []
+
+            # Sleep until the next shard is due, but not past the next lease refresh
+            next_poll = self.next_poll_time()
+            sleep_seconds = self.max_poll_interval_seconds if next_poll is None else next_poll - time.monotonic()
+            sleep_seconds = min(sleep_seconds, self._next_lease_refresh - time.time())
+            if sleep_seconds > 0:
+                time.sleep(sleep_seconds)
+
+    def close(self):
+        """
+        Release all held leases so other workers don't have to wait for them to expire.
+
+        Processed positions are checkpointed first, while the leases are still held.
+        """
+        self._stop_renewal.set()
+        if self._renewal_thread is not None:
+            self._renewal_thread.join()
+            self._renewal_thread = None
+        if self.checkpointer is not None:
+            self.checkpointer.flush()
+        for shard_id in list(self.shard_iterators) + list(self.ending_shards):
+            try:
+                self.lease_table.release_lease(shard_id)
+            except Exception as e:
+                logging.error(f"Error releasing lease for shard {shard_id}: {e}")
+        self.shard_iterators.clear()
+        self.last_sequence_numbers.clear()
+        self.poll_schedule.clear()
+        self.ending_shards.clear()
+
+
+def default_worker_id():
+    """
+    Unique id of this consumer process across all tasks.
+    """
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def run_worker_processes(target, n_processes, args=(), restart_delay_seconds=5, blocked_signals=()):
+    """
+    Run `target(worker_index, *args)` in `n_processes` processes and restart any that exit.
+
+    Processes are started with 'spawn', so each one imports its own TensorFlow and
+    boto3 clients instead of inheriting them through fork. Signals in
+    `blocked_signals` are blocked while a process starts, so it inherits them
+    blocked: they stay pending instead of running the default action (usually
+    terminating it) until the worker installs its handler and unblocks them.
+
+    Parameters:
+    target (callable): Module-level function run in every worker process.
+    n_processes (int): Number of worker processes.
+    args (tuple): Extra arguments passed to target.
+    restart_delay_seconds (float): How often exited processes are checked for and restarted.
+    blocked_signals (iterable[int]): Signals the worker processes start with blocked.
+    """
+    context = multiprocessing.get_context("spawn")
+    blocked_signals = list(blocked_signals)
+    processes = {}
+    try:
+        while True:
+            for worker_index in range(n_processes):
+                process = processes.get(worker_index)
+                if process is not None and process.is_alive():
+                    continue
+                if process is not None:
+                    logging.warning(f"Worker process {worker_index} exited with code {process.exitcode}, restarting.")
+                process = context.Process(target=target, args=(worker_index,) + tuple(args))
+                if blocked_signals:
+                    previous_mask = signal.pthread_sigmask(signal.SIG_BLOCK, blocked_signals)
+                    try:
+                        process.start()
+                    finally:
+                        signal.pthread_sigmask(signal.SIG_SETMASK, previous_mask)
+                else:
+                    process.start()
+                processes[worker_index] = process
+            time.sleep(restart_delay_seconds)
+    finally:
+        for process in processes.values():
+            process.join(timeout=restart_delay_seconds)
+            if process.is_alive():
+                process.terminate()
+
+
+def log_leased_records(worker_index, stream_name, lease_table_name, kinesis_endpoint, dynamodb_endpoint):
+    """
+    Worker process for the local check below: log how many records each poll returns.
+    """
+    import boto3
+
+    logging.basicConfig(format='%(asctime)s: %(levelname)s  %(message)s', level=logging.INFO)
+    lease_table = ShardLeaseTable(boto3.client("dynamodb", endpoint_url=dynamodb_endpoint), lease_table_name,
+                                  default_worker_id(), lease_duration_seconds=10)
+    worker = ShardWorker(boto3.client("kinesis", endpoint_url=kinesis_endpoint), lease_table, stream_name,
+                         lease_refresh_seconds=3)
+    try:
+        for records in worker.record_batches():
+            logging.info(f"Worker {worker_index} ({sorted(worker.shard_iterators)}): {len(records)} records")
+    finally:
+        worker.close()
+
+
+if __name__ == "__main__":
+    # Local check against a Kinesis stand-in (kinesalite, moto server) and DynamoDB Local
+    import boto3
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(description="Consume a local multi-shard Kinesis stream with leased worker processes.")
+    parser.add_argument("--stream_name", default="ecg-aggregated-chunks-data-stream", help="Kinesis stream name.")
+    parser.add_argument("--lease_table", default="ecg-inference-shard-leases", help="Lease table name.")
+    parser.add_argument("--kinesis_endpoint", default="http://localhost:4567", help="Kinesis endpoint.")
+    parser.add_argument("--dynamodb_endpoint", default="http://localhost:8000", help="DynamoDB endpoint.")
+    parser.add_argument("--shards", default=4, type=int, help="Shards to create if the stream does not exist.")
+    parser.add_argument("--processes", default=2, type=int, help="Worker processes.")
+    args = parser.parse_args()
+
+    logging.basicConfig(format='%(asctime)s: %(levelname)s  %(message)s', level=logging.INFO)
+    kinesis = boto3.client("kinesis", endpoint_url=args.kinesis_endpoint)
+    if args.stream_name not in kinesis.list_streams()["StreamNames"]:
+        kinesis.create_stream(StreamName=args.stream_name, ShardCount=args.shards)
+        kinesis.get_waiter("stream_exists").wait(StreamName=args.stream_name)
+    create_lease_table(boto3.client("dynamodb", endpoint_url=args.dynamodb_endpoint), args.lease_table)
+
+    run_worker_processes(log_leased_records, args.processes,
+                         args=(args.stream_name, args.lease_table, args.kinesis_endpoint, args.dynamodb_endpoint))
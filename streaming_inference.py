@@ -0,0 +1,240 @@
+import time
+import logging
+import numpy as np
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta, timezone
+
+WINDOW_SIZE = 4096
+N_LEADS = 12
+PARTS_PER_CHUNK = 16
+
+
+def offset_timestamp(timestamp, seconds):
+    """
+    Shift a device timestamp such as '2024-12-03T14:00:00.000Z' by `seconds`, keeping its format.
+
+    Parameters:
+    timestamp (str): ISO timestamp as sent by the device, with fractional seconds and optional 'Z'.
+    seconds (float): Offset to add.
+
+    Returns:
+    str: The shifted timestamp with the same number of fractional digits.
+    """
+    if not seconds:
+        return timestamp
+    suffix = "Z" if timestamp.endswith("Z") else ""
+    base, _, fraction = timestamp[:len(timestamp) - len(suffix)].partition(".")
+    shifted = datetime.strptime(base, "%Y-%m-%dT%H:%M:%S") + timedelta(
+        seconds=seconds + (float("0." + fraction) if fraction else 0.0))
+    if not fraction:
+        return shifted.strftime("%Y-%m-%dT%H:%M:%S") + suffix
+    return shifted.strftime("%Y-%m-%dT%H:%M:%S.%f")[:19 + 1 + len(fraction)] + suffix
+
+
+class DeviceWindowBuffer:
+    """
+    Ring buffer holding the most recent WINDOW_SIZE samples of one device.
+
+    Parts are appended as they arrive; a window is emitted as soon as the buffer
+    is full and at least `stride` new samples arrived since the previous window.
+    With the default stride of WINDOW_SIZE windows don't overlap, which matches
+    the chunks produced by the Lambda reassembly path.
+    """
+
+    def __init__(self, window_size=WINDOW_SIZE, stride=WINDOW_SIZE, n_leads=N_LEADS):
+        self.window_size = window_size
+        self.stride = stride
+        self.buffer = np.zeros((window_size, n_leads), dtype=np.float32)
+        self.reset()
+
+    def reset(self):
+        self.write_pos = 0
+        self.filled = 0
+        self.samples_since_emit = 0
+        self.last_sequence = None
+        # (rows, message metadata) for the parts that overlap the current window
+        self.parts = deque()
+        self.parts_rows = 0
+
+    def add_part(self, samples, metadata, sequence):
+        """
+        Append a part and return a window if one is due.
+
+        Parameters:
+        samples (np.array): Part samples of shape (n,) for single-lead or (n, leads) for multi-lead devices.
+        metadata (dict): The part message without 'ecg_data'.
+        sequence (int): Position of the part in the device's stream (chunk_idx * 16 + part).
+
+        Returns:
+        tuple or None: (window of shape (window_size, leads), metadata of the parts it spans,
+            offset of the window's first sample within the first of those parts).
+        """
+        if self.last_sequence is not None and sequence != self.last_sequence + 1:
+            # A part was lost or re-ordered: never stitch non-contiguous signal into one window
+            logging.warning(f"Gap in parts for device {metadata.get('device_id')} "
+                            f"({self.last_sequence} -> {sequence}), resetting window buffer.")
+            self.reset()
+        self.last_sequence = sequence
+
+        n_rows = len(samples)
+        first_rows = min(n_rows, self.window_size - self.write_pos)
+        self._write(self.write_pos, samples[:first_rows])
+        if first_rows < n_rows:
+            self._write(0, samples[first_rows:])
+        self.write_pos = (self.write_pos + n_rows) % self.window_size
+        self.filled = min(self.filled + n_rows, self.window_size)
+        self.samples_since_emit += n_rows
+
+        self.parts.append((n_rows, metadata))
+        self.parts_rows += n_rows
+        while self.parts_rows - self.parts[0][0] >= self.window_size:
+            self.parts_rows -= self.parts.popleft()[0]
+
+        if self.filled < self.window_size or self.samples_since_emit < self.stride:
+            return None
+        self.samples_since_emit %= self.stride
+
+        # Oldest sample sits at write_pos once the buffer has wrapped
+        window = np.concatenate((self.buffer[self.write_pos:], self.buffer[:self.write_pos]))
+        first_part_offset = self.parts_rows - self.window_size
+        return window, [part_metadata for _, part_metadata in self.parts], first_part_offset
+
+    def _write(self, start, samples):
+        end = start + len(samples)
+        if samples.ndim == 1:
+            # Single-lead device: DI lead only, remaining leads are zero
+            self.buffer[start:end, 0] = samples
+            self.buffer[start:end, 1:] = 0
+        else:
+            self.buffer[start:end, :] = samples
+
+
+class StreamingWindowAssembler:
+    """
+    Turns raw 256-sample part messages (as sent by iot-emulation/send_ecg_data.py)
+    into window records with the same fields the Lambda reassembly path puts on
+    Kinesis, so they can go straight through the regular inference and sink stages.
+    """
+
+    def __init__(self, stride=WINDOW_SIZE, window_size=WINDOW_SIZE, max_devices=10000):
+        self.stride = stride
+        self.window_size = window_size
+        self.max_devices = max_devices
+        self._devices = OrderedDict()
+
+    def _device_buffer(self, device_id):
+        device_buffer = self._devices.pop(device_id, None)
+        if device_buffer is None:
+            device_buffer = DeviceWindowBuffer(window_size=self.window_size, stride=self.stride)
+        # Keep devices in least-recently-used order and drop the stalest beyond max_devices
+        self._devices[device_id] = device_buffer
+        while len(self._devices) > self.max_devices:
+            self._devices.popitem(last=False)
+        return device_buffer
+
+    def add_part(self, message):
+        """
+        Add one part message and return the window record it completes, if any.
+
+        Parameters:
+        message (dict): Part message with 'device_id', 'chunk_idx', 'part', 'ecg_data' and timestamps.
+
+        Returns:
+        dict or None: Window record with 'aggregated_data' of shape (window_size, 12).
+        """
+        assembly_started = datetime.now(timezone.utc).isoformat()
+        device_id = message["device_id"]
+        metadata = {key: value for key, value in message.items() if key != "ecg_data"}
+        samples = np.asarray(message["ecg_data"], dtype=np.float32)
+        sequence = int(message["chunk_idx"]) * PARTS_PER_CHUNK + int(message["part"])
+
+        result = self._device_buffer(device_id).add_part(samples, metadata, sequence)
+        if result is None:
+            return None
+
+        window, parts, first_part_offset = result
+        rule_triggered = [part["timestamp_iot_core_rule_triggered"] for part in parts
+                          if part.get("timestamp_iot_core_rule_triggered") is not None]
+        sampling_rate_hz = parts[0]["sampling_rate_hz"]
+        timestamp_iot_core_rule_triggered = None
+        if rule_triggered:
+            # Epoch milliseconds from the IoT rule, converted to ISO like the Lambda reassembly does
+            timestamp_iot_core_rule_triggered = datetime.fromtimestamp(max(rule_triggered) / 1000,
+                                                                       timezone.utc).isoformat()
+        return {
+            "device_id": device_id,
+            "chunk_idx": parts[0]["chunk_idx"],
+            "sampling_rate_hz": sampling_rate_hz,
+            # Capture time of the window's first sample: with a stride that isn't a multiple of the part
+            # length, windows starting inside the same part must still get distinct result keys
+            "timestamp_capture_begin": offset_timestamp(parts[0]["timestamp_capture_begin"],
+                                                        first_part_offset / float(sampling_rate_hz)),
+            "timestamp_chunk_sent": max(part["timestamp_chunk_sent"] for part in parts),
+            "timestamp_iot_core_rule_triggered": timestamp_iot_core_rule_triggered,
+            # This stage replaces the Lambda reassembly, so it fills the same timestamps
+            "timestamp_lambda_processing_started": assembly_started,
+            "timestamp_lambda_processing_finished": datetime.now(timezone.utc).isoformat(),
+            "aggregated_data": window,
+        }
+
+    def windows(self, part_batches):
+        """
+        Map batches of part messages to batches of window records.
+
+        Empty input batches are passed through as empty lists, so a downstream
+        batching scheduler keeps seeing idle polls.
+
+        Parameters:
+        part_batches (iterable[list[dict]]): Batches of part messages, e.g. from get_records_from_kinesis.
+
+        Yields:
+        list[dict]: Window records completed by each input batch.
+        """
+        for part_batch in part_batches:
+            window_records = []
+            for message in part_batch:
+                try:
+                    window_record = self.add_part(message)
+                except Exception as e:
+                    logging.error(f"Error adding part for device {message.get('device_id')}: {e}")
+                    continue
+                if window_record is not None:
+                    window_records.append(window_record)
+            yield window_records
+
+
+if __name__ == "__main__":
+    # Local check: feed parts from an HDF5 file through the assembler and the model
+    import os
+    import sys
+    from argparse import ArgumentParser
+    from tensorflow.keras.models import load_model
+
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "iot-emulation"))
+    from send_ecg_data import get_ecg_chunks, prepare_message
+
+    parser = ArgumentParser(description="Run streaming windowed inference on parts read from an HDF5 file.")
+    parser.add_argument("--hdf5_file", required=True, help="Path to the HDF5 file containing ECG data.")
+    parser.add_argument("--dataset_name", default="tracings", help="Name of the dataset in the HDF5 file.")
+    parser.add_argument("--model", default="./data/model.hdf5", help="Path to the Keras model.")
+    parser.add_argument("--stride", default=WINDOW_SIZE, type=int, help="Samples between consecutive windows.")
+    parser.add_argument("--max_windows", default=10, type=int, help="Stop after this many windows.")
+    args = parser.parse_args()
+
+    logging.basicConfig(format='%(asctime)s: %(levelname)s  %(message)s', level=logging.INFO)
+    model = load_model(args.model, compile=False)
+    assembler = StreamingWindowAssembler(stride=args.stride)
+
+    n_windows = 0
+    for chunk_idx, part, ecg_chunk in get_ecg_chunks(args.hdf5_file, args.dataset_name, chunk_size=256):
+        message = prepare_message(0, ecg_chunk, chunk_idx, part, datetime.now(), 400)
+        window_record = assembler.add_part(message)
+        if window_record is None:
+            continue
+        started = time.monotonic()
+        prediction = model.predict(window_record["aggregated_data"][np.newaxis], verbose=0)[0]
+        logging.info(f"Window {n_windows} (chunk {window_record['chunk_idx']}): "
+                     f"prediction {np.round(prediction, 3).tolist()} in {time.monotonic() - started:.3f}s")
+        n_windows += 1
+        if n_windows >= args.max_windows:
+            break
@@ -21,13 +21,15 @@ resource "aws_dynamodb_table" "ecg_data_raw_table" {
     type = "N"
   }
 
+  # Only keys and part numbers: the aggregation Lambda reads the payloads of missing parts with BatchGetItem
   global_secondary_index {
-    name            = "DeviceIdChunkIdxIndex"
-    hash_key        = "device_id"
-    range_key       = "chunk_idx"
-    projection_type = "ALL"
-    read_capacity   = 25
-    write_capacity  = 25
+    name               = "DeviceIdChunkIdxIndex"
+    hash_key           = "device_id"
+    range_key          = "chunk_idx"
+    projection_type    = "INCLUDE"
+    non_key_attributes = ["part"]
+    read_capacity      = 25
+    write_capacity     = 25
   }
 
   stream_enabled    = true
@@ -56,3 +58,15 @@ resource "aws_dynamodb_table" "ecg_abnormality_detection_results_table" {
   stream_enabled = true
   stream_view_type = "NEW_IMAGE"
 }
+
+
+resource "aws_dynamodb_table" "ecg_inference_shard_leases_table" {
+  name         = local.dynamodb_table_name_shard_leases
+  hash_key     = "shard_id"
+  billing_mode = "PAY_PER_REQUEST"
+
+  attribute {
+    name = "shard_id"
+    type = "S"
+  }
+}
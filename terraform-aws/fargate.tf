@@ -135,21 +135,43 @@ resource "aws_iam_policy" "ecs_task_policy" {
 
   policy = jsonencode({
     Version = "2012-10-17",
-    Statement = [
+    Statement = concat([
       {
         Effect   = "Allow",
         Action   = [
           "kinesis:GetRecords",
           "kinesis:GetShardIterator",
           "kinesis:DescribeStream",
-          "kinesis:ListStreams"
+          "kinesis:ListStreams",
+          "kinesis:ListShards",
+          "kinesis:DescribeStreamSummary",
+          "kinesis:RegisterStreamConsumer"
         ],
         Resource = aws_kinesis_stream.ecg_aggregated_chunks_data.arn
       },
+      {
+        Effect   = "Allow",
+        Action   = [
+          "kinesis:DescribeStreamConsumer",
+          "kinesis:SubscribeToShard"
+        ],
+        Resource = "${aws_kinesis_stream.ecg_aggregated_chunks_data.arn}/consumer/*"
+      },
+      {
+        Effect   = "Allow",
+        Action   = [
+          "dynamodb:PutItem",
+          "dynamodb:GetItem",
+          "dynamodb:UpdateItem",
+          "dynamodb:Scan"
+        ],
+        Resource = aws_dynamodb_table.ecg_inference_shard_leases_table.arn
+      },
       {
         Effect   = "Allow",
         Action   = [
           "dynamodb:PutItem",
+          "dynamodb:BatchWriteItem",
           "dynamodb:GetItem",
           "dynamodb:UpdateItem"
         ],
@@ -162,7 +184,34 @@ resource "aws_iam_policy" "ecs_task_policy" {
         ],
         Resource = "*"
       }
-    ]
+    ], var.waveform_archive_enabled ? [
+      {
+        Effect   = "Allow",
+        Action   = [
+          "s3:PutObject"
+        ],
+        Resource = "${aws_s3_bucket.waveform_archive[0].arn}/*"
+      }
+    ] : [], var.profiling_enabled ? [
+      {
+        Effect   = "Allow",
+        Action   = [
+          "s3:PutObject"
+        ],
+        Resource = "${aws_s3_bucket.inference_profiles[0].arn}/*"
+      },
+      {
+        # ECS Exec session channels, used to send SIGUSR1 to the consumer
+        Effect   = "Allow",
+        Action   = [
+          "ssmmessages:CreateControlChannel",
+          "ssmmessages:CreateDataChannel",
+          "ssmmessages:OpenControlChannel",
+          "ssmmessages:OpenDataChannel"
+        ],
+        Resource = "*"
+      }
+    ] : [])
   })
 }
 
@@ -188,12 +237,19 @@ resource "aws_ecs_task_definition" "fargate_task" {
       name      = local.fargate_task_container_name
       image     = local.fargate_task_image_uri
       essential = true
-      environment = [
+      environment = concat([
         { name = "STREAM_NAME", value = local.kinesis_ecg_chunks_stream_name },
-        { name = "SHARD_ID", value = local.kinesis_shard_id_name },
+        { name = "LEASE_TABLE_NAME", value = local.dynamodb_table_name_shard_leases },
+        { name = "CONSUMER_PROCESSES", value = tostring(var.fargate_consumer_processes) },
         { name = "AWS_REGION", value = var.region },
-
-      ]
+        { name = "LOG_LEVEL", value = var.fargate_log_level },
+        { name = "METRICS_EXPORTER", value = "emf" },
+
+      ], var.waveform_archive_enabled ? [
+        { name = "ARCHIVE_URI", value = "s3://${aws_s3_bucket.waveform_archive[0].bucket}/windows" },
+      ] : [], var.profiling_enabled ? [
+        { name = "PROFILE_URI", value = "s3://${aws_s3_bucket.inference_profiles[0].bucket}/profiles" },
+      ] : [])
       logConfiguration = {
         logDriver = "awslogs"
         options = {
@@ -210,9 +266,12 @@ resource "aws_ecs_service" "fargate_service" {
   name            = local.fargate_service_name
   cluster         = aws_ecs_cluster.fargate_cluster.id
   task_definition = aws_ecs_task_definition.fargate_task.arn
-  desired_count   = 1 # Ensure only one task is running for single Kinesis shard
+  desired_count   = var.fargate_desired_count # Shards are balanced across tasks through the lease table
   launch_type     = "FARGATE"
 
+  # ECS Exec sends SIGUSR1 to the consumer to capture a profile (see profiling.py)
+  enable_execute_command = var.profiling_enabled
+
   network_configuration {
     subnets         = aws_subnet.fargate_cluster_public_subnet[*].id
     security_groups = [aws_security_group.fargate_sg.id]
@@ -15,10 +15,21 @@ SQL
   sql_version = "2016-03-23"
   enabled     = true
 
-  dynamodbv2 {
-    role_arn   = aws_iam_role.iot_core_dynamodb_role.arn
-    put_item {
-      table_name = local.dynamodb_table_name_ecg_raw
+  dynamic "dynamodbv2" {
+    for_each = var.raw_ecg_format == "list" ? [1] : []
+    content {
+      role_arn = aws_iam_role.iot_core_dynamodb_role.arn
+      put_item {
+        table_name = local.dynamodb_table_name_ecg_raw
+      }
+    }
+  }
+
+  # Packed storage: the ingest Lambda converts ecg_data to int16 Binary before writing the part
+  dynamic "lambda" {
+    for_each = var.raw_ecg_format == "packed" ? [1] : []
+    content {
+      function_arn = aws_lambda_function.ecg_parts_ingest_func[0].arn
     }
   }
 
@@ -26,6 +37,15 @@ SQL
     log_group_name = aws_cloudwatch_log_group.iot_core_log_group.name
     role_arn       = aws_iam_role.iot_core_dynamodb_role.arn
   }
+
+  # Messages the rule could not write to DynamoDB or hand to the ingest Lambda
+  error_action {
+    sqs {
+      queue_url  = aws_sqs_queue.ecg_parts_dead_letter_queue.url
+      role_arn   = aws_iam_role.iot_core_dynamodb_role.arn
+      use_base64 = false
+    }
+  }
 }
 
 
@@ -51,7 +71,7 @@ EOF
 
 resource "aws_iam_policy" "iot_core_dynamodb_role_write_policy" {
   name        = local.iot_core_dynamodb_write_policy
-  description = "Allow IoT Core to write to DynamoDB and CloudWatch."
+  description = "Allow IoT Core to write to DynamoDB, CloudWatch and the dead-letter queue."
 
   policy = <<EOF
 {
@@ -73,6 +93,11 @@ resource "aws_iam_policy" "iot_core_dynamodb_role_write_policy" {
         "logs:PutLogEvents"
       ],
       "Resource": "${aws_cloudwatch_log_group.iot_core_log_group.arn}:log-stream:*"
+    },
+    {
+      "Effect": "Allow",
+      "Action": "sqs:SendMessage",
+      "Resource": "${aws_sqs_queue.ecg_parts_dead_letter_queue.arn}"
     }
   ]
 }
@@ -1,5 +1,5 @@
 resource "aws_kinesis_stream" "ecg_aggregated_chunks_data" {
   name             = local.kinesis_ecg_chunks_stream_name
-  shard_count      = 1
+  shard_count      = var.kinesis_shard_count
   retention_period = 24 # hours
 }
\ No newline at end of file
@@ -1,16 +1,41 @@
+# The Lambda packages hold the handler and the repository modules it imports;
+# numpy comes from the layer
+data "archive_file" "lambda_aggregation_zip" {
+  type        = "zip"
+  output_path = "${path.module}/../lambda_aggregation.zip"
+
+  source {
+    content  = file("${path.module}/../lambda_aggregation.py")
+    filename = "lambda_aggregation.py"
+  }
+  source {
+    content  = file("${path.module}/../wire_format.py")
+    filename = "wire_format.py"
+  }
+  source {
+    content  = file("${path.module}/../metrics.py")
+    filename = "metrics.py"
+  }
+}
+
 resource "aws_lambda_function" "ecg_chunks_aggregator_func" {
-  filename      = "../lambda_aggregation.zip"
-  function_name = local.lambda_aggregator_function_name
-  role          = aws_iam_role.ecg_chunks_aggregator_func_execution_role.arn
-  handler       = "lambda_aggregation.lambda_handler"
-  runtime       = "python3.9"
-  timeout       = 60
-  memory_size   = 128
+  filename         = data.archive_file.lambda_aggregation_zip.output_path
+  source_code_hash = data.archive_file.lambda_aggregation_zip.output_base64sha256
+  function_name    = local.lambda_aggregator_function_name
+  role             = aws_iam_role.ecg_chunks_aggregator_func_execution_role.arn
+  handler          = "lambda_aggregation.lambda_handler"
+  runtime          = "python3.9"
+  timeout          = 60
+  memory_size      = 128
+  layers           = [var.lambda_numpy_layer_arn]
 
   environment {
     variables = {
       DYNAMODB_TABLE_NAME = aws_dynamodb_table.ecg_data_raw_table.name
       KINESIS_STREAM_NAME = aws_kinesis_stream.ecg_aggregated_chunks_data.name
+      KINESIS_PAYLOAD_FORMAT = var.kinesis_payload_format
+      KINESIS_PAYLOAD_COMPRESSION = var.kinesis_payload_compression
+      LOG_LEVEL = var.lambda_log_level
     }
   }
 }
@@ -19,6 +44,7 @@ resource "aws_lambda_event_source_mapping" "ecg_chunks_aggregator_func_dynamodb_
   event_source_arn  = aws_dynamodb_table.ecg_data_raw_table.stream_arn
   function_name     = aws_lambda_function.ecg_chunks_aggregator_func.arn
   starting_position = "LATEST"
+  function_response_types = ["ReportBatchItemFailures"]
 }
 
 
@@ -55,6 +81,7 @@ resource "aws_iam_policy" "ecg_chunks_aggregator_func_policy" {
         Effect = "Allow"
         Action = [
           "dynamodb:Query",
+          "dynamodb:BatchGetItem",
           "dynamodb:UpdateItem",
           "dynamodb:PutItem",
           "dynamodb:GetItem"
@@ -77,7 +104,8 @@ resource "aws_iam_policy" "ecg_chunks_aggregator_func_policy" {
       {
         Effect = "Allow"
         Action = [
-          "kinesis:PutRecord"
+          "kinesis:PutRecord",
+          "kinesis:PutRecords"
         ]
         Resource = aws_kinesis_stream.ecg_aggregated_chunks_data.arn
       },
@@ -96,3 +124,100 @@ resource "aws_iam_policy" "ecg_chunks_aggregator_func_policy" {
 
 
 
+
+data "archive_file" "lambda_ingest_zip" {
+  type        = "zip"
+  output_path = "${path.module}/../lambda_ingest.zip"
+
+  source {
+    content  = file("${path.module}/../lambda_ingest.py")
+    filename = "lambda_ingest.py"
+  }
+  source {
+    content  = file("${path.module}/../wire_format.py")
+    filename = "wire_format.py"
+  }
+}
+
+resource "aws_lambda_function" "ecg_parts_ingest_func" {
+  count            = var.raw_ecg_format == "packed" ? 1 : 0
+  filename         = data.archive_file.lambda_ingest_zip.output_path
+  source_code_hash = data.archive_file.lambda_ingest_zip.output_base64sha256
+  function_name    = local.lambda_ingest_function_name
+  role             = aws_iam_role.ecg_parts_ingest_func_execution_role[0].arn
+  handler          = "lambda_ingest.lambda_handler"
+  runtime          = "python3.9"
+  timeout          = 10
+  memory_size      = 128
+  layers           = [var.lambda_numpy_layer_arn]
+
+  environment {
+    variables = {
+      DYNAMODB_TABLE_NAME = aws_dynamodb_table.ecg_data_raw_table.name
+      LOG_LEVEL = var.lambda_log_level
+    }
+  }
+
+  # The IoT rule invokes the function asynchronously, so failed parts are only kept here
+  dead_letter_config {
+    target_arn = aws_sqs_queue.ecg_parts_dead_letter_queue.arn
+  }
+}
+
+resource "aws_lambda_permission" "ecg_parts_ingest_func_iot_invoke" {
+  count         = var.raw_ecg_format == "packed" ? 1 : 0
+  statement_id  = "AllowIoTRuleInvoke"
+  action        = "lambda:InvokeFunction"
+  function_name = aws_lambda_function.ecg_parts_ingest_func[0].function_name
+  principal     = "iot.amazonaws.com"
+  source_arn    = aws_iot_topic_rule.iot_topic_rule.arn
+}
+
+resource "aws_iam_role" "ecg_parts_ingest_func_execution_role" {
+  count = var.raw_ecg_format == "packed" ? 1 : 0
+  name  = "${local.lambda_ingest_function_name}-role"
+
+  assume_role_policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        Action = "sts:AssumeRole"
+        Effect = "Allow"
+        Principal = {
+          Service = "lambda.amazonaws.com"
+        }
+      }
+    ]
+  })
+}
+
+resource "aws_iam_role_policy" "ecg_parts_ingest_func_policy" {
+  count = var.raw_ecg_format == "packed" ? 1 : 0
+  name  = "${local.lambda_ingest_function_name}-policy"
+  role  = aws_iam_role.ecg_parts_ingest_func_execution_role[0].id
+
+  policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        Effect   = "Allow"
+        Action   = ["dynamodb:PutItem"]
+        Resource = aws_dynamodb_table.ecg_data_raw_table.arn
+      },
+      {
+        Effect   = "Allow"
+        Action   = ["sqs:SendMessage"]
+        Resource = aws_sqs_queue.ecg_parts_dead_letter_queue.arn
+      },
+      {
+        Effect = "Allow"
+        Action = [
+          "logs:CreateLogGroup",
+          "logs:CreateLogStream",
+          "logs:PutLogEvents"
+        ]
+        Resource = "arn:aws:logs:*:*:*"
+      }
+    ]
+  })
+}
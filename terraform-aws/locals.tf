@@ -7,8 +7,12 @@ locals {
   dynamodb_table_name_ecg_raw = "ecg-data-chunks-raw"
   dynamodb_table_name_ecg_processed = "ecg-data-chunks-processed"
   lambda_aggregator_function_name = "ecg-data-parts-aggregator-func"
+  lambda_ingest_function_name = "ecg-data-parts-ingest-func"
   kinesis_ecg_chunks_stream_name = "ecg-aggregated-chunks-data-stream"
-  kinesis_shard_id_name = "shardId-000000000000"
+  dynamodb_table_name_shard_leases = "ecg-inference-shard-leases"
+  s3_bucket_name_waveform_archive = "ecg-waveform-archive"
+  s3_bucket_name_inference_profiles = "ecg-inference-profiles"
+  sqs_queue_name_ecg_parts_dead_letter = "ecg-data-parts-dead-letter-queue"
   ecr_docker_ecg_inference_name = "ecg-docker-inference"
   fargate_cluster_name = "ecg-abnormality-detection-cluster"
   fargate_task_execution_role = "fargate-ecg-task-execution-role"
@@ -9,5 +9,8 @@ terraform {
     local = {
       source = "hashicorp/local"
     }
+    archive = {
+      source = "hashicorp/archive"
+    }
   }
 }
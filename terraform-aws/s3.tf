@@ -0,0 +1,9 @@
+resource "aws_s3_bucket" "waveform_archive" {
+  count  = var.waveform_archive_enabled ? 1 : 0
+  bucket = local.s3_bucket_name_waveform_archive
+}
+
+resource "aws_s3_bucket" "inference_profiles" {
+  count  = var.profiling_enabled ? 1 : 0
+  bucket = local.s3_bucket_name_inference_profiles
+}
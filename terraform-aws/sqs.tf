@@ -0,0 +1,6 @@
+# Messages the IoT rule could not deliver and packed parts the ingest Lambda failed
+# to write after its retries end up here instead of being dropped
+resource "aws_sqs_queue" "ecg_parts_dead_letter_queue" {
+  name                      = local.sqs_queue_name_ecg_parts_dead_letter
+  message_retention_seconds = 1209600
+}
@@ -2,3 +2,57 @@
 variable "region" {
   description = "AWS resources default region."
 }
+
+variable "lambda_numpy_layer_arn" {
+  description = "ARN of a Lambda layer providing NumPy for the python3.9 runtime (e.g. AWS SDK for pandas)."
+}
+
+variable "kinesis_shard_count" {
+  description = "Shards of the aggregated chunks stream; inference tasks balance them through the lease table."
+  default     = 1
+}
+
+variable "fargate_desired_count" {
+  description = "Number of inference tasks consuming the aggregated chunks stream."
+  default     = 1
+}
+
+variable "fargate_consumer_processes" {
+  description = "Inference worker processes per task, each holding its own model."
+  default     = 1
+}
+
+variable "raw_ecg_format" {
+  description = "Storage of raw part samples: 'list' (IoT rule writes ecg_data as Numbers) or 'packed' (ingest Lambda writes int16 Binary)."
+  default     = "list"
+}
+
+variable "kinesis_payload_format" {
+  description = "Aggregated window payload: 'json' (legacy) or 'binary' (wire_format.py). Switch to 'binary' only after every inference task runs a consumer that decodes it."
+  default     = "json"
+}
+
+variable "kinesis_payload_compression" {
+  description = "Compression of binary window payloads: 'none' or 'zlib'. 'zstd' and 'lz4' need their packages in the Lambda package as well."
+  default     = "none"
+}
+
+variable "waveform_archive_enabled" {
+  description = "Archive inferred windows and predictions as Parquet in S3 (see archive.py). Best-effort: windows buffered when a consumer dies are not archived."
+  default     = false
+}
+
+variable "profiling_enabled" {
+  description = "Enable ECS Exec on the inference tasks to request profiles with SIGUSR1 (see profiling.py), written to an S3 bucket."
+  default     = false
+}
+
+variable "lambda_log_level" {
+  description = "Log level of the Lambda functions. DEBUG logs every stream record and part."
+  default     = "INFO"
+}
+
+variable "fargate_log_level" {
+  description = "Log level of the inference service. DEBUG logs every fetched and scheduled batch."
+  default     = "INFO"
+}
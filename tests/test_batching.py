@@ -0,0 +1,64 @@
+from batching import AdaptiveBatcher
+
+
+def make_batcher(**kwargs):
+    params = dict(max_batch_size=64, max_wait_seconds=1.0, latency_budget_seconds=2.0)
+    params.update(kwargs)
+    return AdaptiveBatcher(**params)
+
+
+def test_single_observation_does_not_lock_target():
+    for arrival_rate, expected in [(1, 1), (10, 10), (100, 64), (1000, 64)]:
+        batcher = make_batcher()
+        batcher.observe_latency(1, 0.05)
+        batcher.arrival_rate = arrival_rate
+        assert batcher.target_batch_size() == expected
+
+
+def test_target_grows_past_largest_measured_size_under_load():
+    batcher = make_batcher()
+    # 40 ms fixed cost plus 1 ms per sample
+    batcher.observe_latency(1, 0.041)
+    batcher.observe_latency(8, 0.048)
+    batcher.arrival_rate = 1000
+    assert batcher.target_batch_size() == 64
+
+
+def test_target_respects_latency_budget():
+    batcher = make_batcher(latency_budget_seconds=0.2, max_wait_seconds=0.1)
+    batcher.observe_latency(1, 0.01)
+    batcher.observe_latency(2, 0.02)
+    batcher.arrival_rate = 1000
+    # 10 ms per sample: 64 samples would take 0.64 s
+    assert batcher.estimate_predict_time(64) + min(64 / 1000, 0.1) > 0.2
+    assert batcher.target_batch_size() < 64
+
+
+def test_leftover_records_keep_their_arrival_time():
+    batcher = make_batcher(min_batch_size=4, max_batch_size=4, max_wait_seconds=1.0)
+    batcher.add([{"i": i} for i in range(3)], now=0.0)
+    assert batcher.ready_batches(now=0.1) == []
+    batcher.add([{"i": i} for i in range(3, 6)], now=0.5)
+    batches = batcher.ready_batches(now=0.5)
+    assert [len(batch) for batch in batches] == [4]
+    # The leftovers arrived at 0.5 s, so they are due at 1.5 s, not one second after the full batch was popped
+    assert batcher.ready_batches(now=1.4) == []
+    assert [len(batch) for batch in batcher.ready_batches(now=1.5)] == [2]
+
+
+def test_leftover_from_first_fetch_is_flushed_on_its_own_deadline():
+    batcher = make_batcher(min_batch_size=2, max_batch_size=2, max_wait_seconds=1.0)
+    batcher.add([{"i": 0}], now=0.0)
+    batcher.add([{"i": 1}, {"i": 2}], now=0.9)
+    assert [len(batch) for batch in batcher.ready_batches(now=0.9)] == [2]
+    assert batcher.ready_batches(now=1.0) == []
+    assert [batch[0]["i"] for batch in batcher.ready_batches(now=2.0)] == [2]
+
+
+def test_pending_records_are_yielded_when_the_source_ends():
+    batcher = make_batcher(min_batch_size=4, max_batch_size=4, max_wait_seconds=60)
+    records = [{"id": i} for i in range(6)]
+
+    batches = list(batcher.batches(iter([records[:3], records[3:]])))
+
+    assert batches == [records[:4], records[4:]]
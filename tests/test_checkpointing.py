@@ -0,0 +1,74 @@
+from checkpointing import DerivedRecordCheckpointer, ShardCheckpointer
+
+
+class MemoryCheckpointStore:
+    def __init__(self):
+        self.checkpoints = {}
+
+    def load(self, shard_id):
+        return self.checkpoints.get(shard_id)
+
+    def save(self, shard_id, sequence_number):
+        self.checkpoints[shard_id] = sequence_number
+        return True
+
+
+def make_checkpointer():
+    store = MemoryCheckpointStore()
+    return store, ShardCheckpointer(store, checkpoint_every_records=1)
+
+
+def test_failed_records_stop_the_checkpoint():
+    store, checkpointer = make_checkpointer()
+    checkpointer.fetched("shard-0", "100", 2)
+    checkpointer.fetched("shard-0", "200", 2)
+    checkpointer.fetched("shard-0", "300", 2)
+    checkpointer.processed(2)
+    assert store.checkpoints == {"shard-0": "100"}
+
+    checkpointer.failed(2)
+    checkpointer.processed(2)
+    checkpointer.flush()
+    assert store.checkpoints == {"shard-0": "100"}
+
+
+def test_parts_are_checkpointed_once_their_windows_are_sunk():
+    store, checkpointer = make_checkpointer()
+    derived = DerivedRecordCheckpointer(checkpointer)
+    part_batches = [["p0", "p1"], ["p2", "p3"], ["p4"]]
+    for i, part_batch in enumerate(part_batches):
+        checkpointer.fetched("shard-0", str(i), len(part_batch))
+
+    # The first batch completes no window, the second one window, the third one more
+    window_counts = iter([0, 1, 1])
+
+    def windows(batches):
+        for _ in batches:
+            yield ["window"] * next(window_counts)
+
+    window_batches = derived.derive(iter(part_batches), windows)
+    assert next(window_batches) == []
+    # Parts of a partially filled window count as processed along with the windows before them
+    assert store.checkpoints == {"shard-0": "0"}
+    assert next(window_batches) == ["window"]
+    assert next(window_batches) == ["window"]
+    # Both windows are still queued in the pipeline
+    assert store.checkpoints == {"shard-0": "0"}
+
+    derived.processed(1)
+    assert store.checkpoints == {"shard-0": "1"}
+    derived.processed(1)
+    assert store.checkpoints == {"shard-0": "2"}
+
+
+def test_failed_windows_stop_the_parts_checkpoint():
+    store, checkpointer = make_checkpointer()
+    derived = DerivedRecordCheckpointer(checkpointer)
+    checkpointer.fetched("shard-0", "0", 1)
+    checkpointer.fetched("shard-0", "1", 1)
+
+    window_batches = derived.derive(iter([["p0"], ["p1"]]), lambda batches: (["window"] for _ in batches))
+    list(window_batches)
+    derived.processed(1)
+    derived.failed(1)
+    assert store.checkpoints == {"shard-0": "0"}
@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+
+tf = pytest.importorskip("tensorflow")
+
+from inference_backend import KerasBackend  # noqa: E402
+
+
+@pytest.fixture
+def model_path(tmp_path):
+    model = tf.keras.Sequential([
+        tf.keras.layers.Input(shape=(16, 12)),
+        tf.keras.layers.Flatten(),
+        tf.keras.layers.Dense(6, activation="sigmoid"),
+    ])
+    path = str(tmp_path / "model.h5")
+    model.save(path)
+    return path
+
+
+@pytest.mark.parametrize("n_rows", [1, 3, 5])
+def test_bucketed_predictions_match_the_model(model_path, n_rows):
+    backend = KerasBackend(model_path, batch_buckets=[1, 2, 4])
+    batch = np.random.default_rng(0).normal(size=(n_rows, 16, 12)).astype(np.float32)
+
+    predictions = backend.predict(batch)
+
+    assert predictions.shape == (n_rows, 6)
+    np.testing.assert_allclose(predictions, backend.model.predict(batch, verbose=0), rtol=1e-5, atol=1e-6)
@@ -0,0 +1,57 @@
+import importlib
+
+import boto3
+import pytest
+from moto import mock_aws
+
+TABLE_NAME = "ecg-data-chunks-raw"
+
+
+@pytest.fixture
+def lambda_aggregation(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    monkeypatch.setenv("DYNAMODB_TABLE_NAME", TABLE_NAME)
+    monkeypatch.setenv("METRICS_EXPORTER", "none")
+    with mock_aws():
+        dynamodb_client = boto3.client("dynamodb")
+        dynamodb_client.create_table(
+            TableName=TABLE_NAME,
+            KeySchema=[{"AttributeName": "device_id", "KeyType": "HASH"},
+                       {"AttributeName": "timestamp_capture_begin", "KeyType": "RANGE"}],
+            AttributeDefinitions=[{"AttributeName": "device_id", "AttributeType": "S"},
+                                  {"AttributeName": "timestamp_capture_begin", "AttributeType": "S"},
+                                  {"AttributeName": "chunk_idx", "AttributeType": "N"}],
+            GlobalSecondaryIndexes=[{
+                "IndexName": "DeviceIdChunkIdxIndex",
+                "KeySchema": [{"AttributeName": "device_id", "KeyType": "HASH"},
+                              {"AttributeName": "chunk_idx", "KeyType": "RANGE"}],
+                "Projection": {"ProjectionType": "INCLUDE", "NonKeyAttributes": ["part"]},
+            }],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        for chunk_idx in (0, 1):
+            for part in range(16):
+                dynamodb_client.put_item(TableName=TABLE_NAME, Item={
+                    "device_id": {"S": "device-1"},
+                    "timestamp_capture_begin": {"S": f"2024-12-03T14:00:0{chunk_idx}.{part:03d}Z"},
+                    "chunk_idx": {"N": str(chunk_idx)},
+                    "part": {"N": str(part)},
+                    "ecg_data": {"L": [{"N": "0.5"}]},
+                })
+        import lambda_aggregation
+        yield importlib.reload(lambda_aggregation)
+
+
+def test_only_the_missing_parts_are_read(lambda_aggregation):
+    items = lambda_aggregation.query_chunk_parts("device-1", 1, parts=[0, 3, 7])
+
+    assert sorted(int(item["part"]["N"]) for item in items) == [0, 3, 7]
+    assert all(item["chunk_idx"] == {"N": "1"} and "ecg_data" in item for item in items)
+
+
+def test_all_parts_are_read_without_a_part_list(lambda_aggregation):
+    items = lambda_aggregation.query_chunk_parts("device-1", 0)
+
+    assert sorted(int(item["part"]["N"]) for item in items) == list(range(16))
@@ -0,0 +1,65 @@
+import pytest
+
+from checkpointing import ShardCheckpointer
+from pipeline import PipelinedConsumer
+from test_checkpointing import MemoryCheckpointStore
+
+
+def checkpointed_pipeline(record_batches, sink, prepare=lambda record_batch: (record_batch,)):
+    store = MemoryCheckpointStore()
+    checkpointer = ShardCheckpointer(store, checkpoint_every_records=1)
+    for i, record_batch in enumerate(record_batches):
+        checkpointer.fetched("shard-0", str(i), len(record_batch))
+
+    def on_error(stage, batch, error):
+        checkpointer.failed(len(batch if stage == "prepare" else batch[0]))
+        raise RuntimeError(f"{stage} failed") from error
+
+    def checkpointed_sink(inferred):
+        sink(inferred)
+        checkpointer.processed(len(inferred[0]))
+
+    consumer = PipelinedConsumer(iter(record_batches), prepare, lambda prepared: prepared, checkpointed_sink,
+                                 max_pending_batches=1, poll_interval_seconds=0.01, on_error=on_error)
+    return store, consumer
+
+
+def test_raising_sink_stops_the_checkpoint_and_the_pipeline():
+    sunk = []
+
+    def sink(inferred):
+        if inferred[0] == ["r2"]:
+            raise ConnectionError("throttled")
+        sunk.append(inferred[0])
+
+    store, consumer = checkpointed_pipeline([["r0", "r1"], ["r2"], ["r3"], ["r4"]], sink)
+    with pytest.raises(RuntimeError, match="sink failed"):
+        consumer.run()
+    assert sunk == [["r0", "r1"]]
+    assert store.checkpoints == {"shard-0": "0"}
+
+
+def test_dropped_batch_is_not_checkpointed_past():
+    def prepare(record_batch):
+        if record_batch == ["r1"]:
+            raise ValueError("malformed window")
+        return (record_batch,)
+
+    store, consumer = checkpointed_pipeline([["r0"], ["r1"], ["r2"]], lambda inferred: None, prepare)
+    with pytest.raises(RuntimeError, match="prepare failed"):
+        consumer.run()
+    assert store.checkpoints.get("shard-0") in (None, "0")
+
+
+def test_errors_are_skipped_without_on_error():
+    sunk = []
+
+    def sink(inferred):
+        if inferred == ["r1"]:
+            raise ConnectionError("throttled")
+        sunk.append(inferred)
+
+    consumer = PipelinedConsumer(iter([["r0"], ["r1"], ["r2"]]), lambda batch: batch, lambda batch: batch, sink,
+                                 poll_interval_seconds=0.01)
+    consumer.run()
+    assert sunk == [["r0"], ["r2"]]
@@ -0,0 +1,114 @@
+import boto3
+import pytest
+from moto import mock_aws
+
+from result_sink import BatchResultSink
+
+TABLE_NAME = "ecg-data-chunks-processed"
+
+
+class UnprocessedItemsClient:
+    """
+    Delegates to a DynamoDB client, but reports the last put request of the first
+    `n_unprocessed_calls` BatchWriteItem calls as unprocessed without writing it.
+    """
+
+    def __init__(self, client, n_unprocessed_calls=1):
+        self.client = client
+        self.n_unprocessed_calls = n_unprocessed_calls
+        self.calls = []
+
+    def batch_write_item(self, RequestItems):
+        self.calls.append(RequestItems)
+        if len(self.calls) > self.n_unprocessed_calls:
+            return self.client.batch_write_item(RequestItems=RequestItems)
+        (table_name, requests), = RequestItems.items()
+        if requests[:-1]:
+            self.client.batch_write_item(RequestItems={table_name: requests[:-1]})
+        return {"UnprocessedItems": {table_name: requests[-1:]}}
+
+
+@pytest.fixture
+def aws(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    with mock_aws():
+        dynamodb_client = boto3.client("dynamodb")
+        dynamodb_client.create_table(
+            TableName=TABLE_NAME,
+            KeySchema=[{"AttributeName": "device_id", "KeyType": "HASH"},
+                       {"AttributeName": "timestamp_capture_begin", "KeyType": "RANGE"}],
+            AttributeDefinitions=[{"AttributeName": "device_id", "AttributeType": "S"},
+                                  {"AttributeName": "timestamp_capture_begin", "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        yield dynamodb_client, boto3.client("iot-data")
+
+
+def make_item(device_id, timestamp, chunk_idx=0):
+    return {
+        "device_id": {"S": device_id},
+        "timestamp_capture_begin": {"S": timestamp},
+        "chunk_idx": {"N": str(chunk_idx)},
+    }
+
+
+def stored_items(dynamodb_client):
+    return dynamodb_client.scan(TableName=TABLE_NAME)["Items"]
+
+
+def test_flush_writes_and_publishes_every_result(aws):
+    dynamodb_client, iot_client = aws
+    sink = BatchResultSink(dynamodb_client, TABLE_NAME, iot_client)
+    items = [make_item(f"device_{i % 3}", f"2024-12-03T14:00:{i:02d}.000Z", i) for i in range(60)]
+
+    stats = sink.flush(items, [b"{}"] * len(items))
+    sink.close()
+
+    assert stats["records"] == 60
+    assert stats["failed_writes"] == 0
+    assert stats["failed_publishes"] == 0
+    assert len(stored_items(dynamodb_client)) == 60
+
+
+def test_unprocessed_items_are_retried(aws):
+    dynamodb_client, iot_client = aws
+    client = UnprocessedItemsClient(dynamodb_client, n_unprocessed_calls=2)
+    sink = BatchResultSink(client, TABLE_NAME, iot_client, base_backoff_seconds=0.001)
+    items = [make_item("device_1", f"2024-12-03T14:00:{i:02d}.000Z", i) for i in range(10)]
+
+    assert sink.write_items(items) == 0
+    sink.close()
+
+    assert len(client.calls) == 3
+    assert len(stored_items(dynamodb_client)) == 10
+
+
+def test_unprocessed_items_are_counted_after_last_retry(aws):
+    dynamodb_client, iot_client = aws
+    client = UnprocessedItemsClient(dynamodb_client, n_unprocessed_calls=100)
+    sink = BatchResultSink(client, TABLE_NAME, iot_client, max_retries=2, base_backoff_seconds=0.001)
+    items = [make_item("device_1", f"2024-12-03T14:00:{i:02d}.000Z", i) for i in range(5)]
+
+    assert sink.write_items(items) == 1
+    sink.close()
+
+    assert len(client.calls) == 3
+    assert len(stored_items(dynamodb_client)) == 4
+
+
+def test_duplicate_keys_keep_the_last_item(aws):
+    dynamodb_client, iot_client = aws
+    sink = BatchResultSink(dynamodb_client, TABLE_NAME, iot_client)
+    items = [
+        make_item("device_1", "2024-12-03T14:00:00.000Z", 1),
+        make_item("device_2", "2024-12-03T14:00:00.000Z", 2),
+        make_item("device_1", "2024-12-03T14:00:00.000Z", 3),
+    ]
+
+    assert sink.write_items(items) == 0
+    sink.close()
+
+    stored = {item["device_id"]["S"]: item["chunk_idx"]["N"] for item in stored_items(dynamodb_client)}
+    assert stored == {"device_1": "3", "device_2": "2"}
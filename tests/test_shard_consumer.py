@@ -0,0 +1,77 @@
+import time
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from checkpointing import LeaseTableCheckpointStore, ShardCheckpointer
+from shard_consumer import ShardLeaseTable, ShardWorker, create_lease_table
+
+LEASE_TABLE_NAME = "ecg-shard-leases"
+STREAM_NAME = "ecg-aggregated-chunks"
+
+
+@pytest.fixture
+def aws(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    with mock_aws():
+        dynamodb_client = boto3.client("dynamodb")
+        create_lease_table(dynamodb_client, LEASE_TABLE_NAME)
+        kinesis_client = boto3.client("kinesis")
+        kinesis_client.create_stream(StreamName=STREAM_NAME, ShardCount=1)
+        yield dynamodb_client, kinesis_client
+
+
+def test_take_fails_after_the_owner_renewed(aws):
+    dynamodb_client, _ = aws
+    owner = ShardLeaseTable(dynamodb_client, LEASE_TABLE_NAME, "worker-1")
+    other = ShardLeaseTable(dynamodb_client, LEASE_TABLE_NAME, "worker-2")
+    owner.sync_shards([{"ShardId": "shardId-000000000000"}])
+    now = time.time()
+    assert owner.take_lease(owner.list_leases()[0], now)
+
+    # The lease expired from worker-2's point of view when it read it, but worker-1 renewed since
+    stale_lease = other.list_leases()[0]
+    assert owner.renew_lease("shardId-000000000000", now)
+    assert not other.take_lease(stale_lease, now + 60)
+    assert owner.list_leases()[0]["lease_owner"] == "worker-1"
+
+
+def test_leases_are_renewed_while_the_consumer_is_stalled(aws):
+    dynamodb_client, kinesis_client = aws
+    lease_table = ShardLeaseTable(dynamodb_client, LEASE_TABLE_NAME, "worker-1", lease_duration_seconds=1)
+    worker = ShardWorker(kinesis_client, lease_table, STREAM_NAME, lease_refresh_seconds=0.2)
+    batches = worker.record_batches(yield_empty=True)
+    next(batches)
+    assert list(worker.shard_iterators) == ["shardId-000000000000"]
+    counter_after_take = lease_table.list_leases()[0]["lease_counter"]
+
+    # Nothing pulls from the generator for longer than the lease duration
+    time.sleep(1.5)
+    lease = lease_table.list_leases()[0]
+    assert lease["lease_owner"] == "worker-1"
+    assert lease["lease_expires_at"] > time.time()
+    assert lease["lease_counter"] > counter_after_take
+    worker.close()
+
+
+def test_malformed_records_are_skipped_and_checkpointed_past(aws):
+    dynamodb_client, kinesis_client = aws
+    for data in [b'{"device_id": "d1"}', b"\x00not a record", b'{"device_id": "d2"}']:
+        kinesis_client.put_record(StreamName=STREAM_NAME, Data=data, PartitionKey="d")
+    lease_table = ShardLeaseTable(dynamodb_client, LEASE_TABLE_NAME, "worker-1")
+    checkpointer = ShardCheckpointer(LeaseTableCheckpointStore(lease_table), checkpoint_every_records=1)
+    worker = ShardWorker(kinesis_client, lease_table, STREAM_NAME, checkpointer=checkpointer)
+    batches = worker.record_batches()
+
+    records = next(batches)
+    assert [record["device_id"] for record in records] == ["d1", "d2"]
+    checkpointer.processed(len(records))
+    last_sequence_number = kinesis_client.get_records(
+        ShardIterator=kinesis_client.get_shard_iterator(StreamName=STREAM_NAME, ShardId="shardId-000000000000",
+                                                        ShardIteratorType="TRIM_HORIZON")["ShardIterator"]
+    )["Records"][-1]["SequenceNumber"]
+    assert lease_table.list_leases()[0]["checkpoint"] == last_sequence_number
+    worker.close()
@@ -0,0 +1,53 @@
+import numpy as np
+
+from streaming_inference import StreamingWindowAssembler, offset_timestamp
+
+SAMPLING_RATE_HZ = 400
+
+
+def part_message(sequence, part_length=256, device_id="emulated_device_0"):
+    chunk_idx, part = divmod(sequence, 16)
+    first_sample = sequence * part_length
+    # Lead 0 carries the sample's position in the device stream
+    samples = np.zeros((part_length, 12), dtype=np.float32)
+    samples[:, 0] = np.arange(first_sample, first_sample + part_length)
+    return {
+        "device_id": device_id,
+        "chunk_idx": chunk_idx,
+        "part": part,
+        "sampling_rate_hz": SAMPLING_RATE_HZ,
+        "timestamp_capture_begin": offset_timestamp("2024-12-03T14:00:00.000Z", first_sample / SAMPLING_RATE_HZ),
+        "timestamp_chunk_sent": offset_timestamp("2024-12-03T14:00:01.000Z", first_sample / SAMPLING_RATE_HZ),
+        "timestamp_iot_core_rule_triggered": 1733234401000 + sequence,
+        "ecg_data": samples.tolist(),
+    }
+
+
+def assemble(stride, n_parts, part_length=256):
+    assembler = StreamingWindowAssembler(stride=stride)
+    windows = [assembler.add_part(part_message(sequence, part_length)) for sequence in range(n_parts)]
+    return [window for window in windows if window is not None]
+
+
+def test_window_records_match_the_lambda_record_shape():
+    window, = assemble(stride=4096, n_parts=16)
+    assert window["timestamp_capture_begin"] == "2024-12-03T14:00:00.000Z"
+    assert window["timestamp_iot_core_rule_triggered"] == "2024-12-03T14:00:01.015000+00:00"
+    assert window["aggregated_data"].shape == (4096, 12)
+
+
+def test_window_begin_is_the_capture_time_of_its_first_sample():
+    # 300-sample parts don't divide the window, so windows start inside parts
+    windows = assemble(stride=100, n_parts=30, part_length=300)
+    begins = [window["timestamp_capture_begin"] for window in windows]
+    assert len(windows) > 2
+    assert len(set(begins)) == len(begins)
+    for window, begin in zip(windows, begins):
+        first_sample = int(window["aggregated_data"][0, 0])
+        assert begin == offset_timestamp("2024-12-03T14:00:00.000Z", first_sample / SAMPLING_RATE_HZ)
+
+
+def test_offset_timestamp_keeps_the_device_format():
+    assert offset_timestamp("2024-12-03T14:00:59.999Z", 0.25) == "2024-12-03T14:01:00.249Z"
+    assert offset_timestamp("2024-12-03T14:00:00.123456", 1.5) == "2024-12-03T14:00:01.623456"
+    assert offset_timestamp("2024-12-03T14:00:00.000Z", 0) == "2024-12-03T14:00:00.000Z"
@@ -0,0 +1,246 @@
+"""
+Binary wire format for aggregated ECG windows sent from the aggregation Lambda to
+the inference service over Kinesis.
+
+Layout of an encoded window (all integers little-endian):
+
+    magic      4 bytes   b"ECGW"
+    version    uint8     WIRE_FORMAT_VERSION
+    codec      uint8     compression of the sample block (see CODECS)
+    header_len uint32    length of the JSON header in bytes
+    header     JSON      record metadata plus "dtype", "shape" and "scale"
+    samples    bytes     raw little-endian int16 or float32 samples, row-major
+
+The header is padded so the sample block starts on an 8-byte boundary, which lets
+the consumer wrap uncompressed samples with np.frombuffer without copying.
+Records that don't start with the magic bytes are treated as legacy JSON.
+"""
+import sys
+import json
+import zlib
+import array
+import struct
+
+try:
+    import numpy as np
+except ImportError:  # the Lambda producer only needs to encode
+    np = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+MAGIC = b"ECGW"
+WIRE_FORMAT_VERSION = 1
+PREAMBLE = struct.Struct("<4sBBI")
+SAMPLE_ALIGNMENT = 8
+
+CODEC_NONE = 0
+CODEC_ZLIB = 1
+CODEC_ZSTD = 2
+CODEC_LZ4 = 3
+CODECS = {"none": CODEC_NONE, "zlib": CODEC_ZLIB, "zstd": CODEC_ZSTD, "lz4": CODEC_LZ4}
+
+# Samples are float32 unless a scale is given, in which case they are quantized to int16
+DTYPE_FLOAT32 = "<f4"
+DTYPE_INT16 = "<i2"
+INT16_MIN, INT16_MAX = -32768, 32767
+
+
+def check_compression(compression):
+    """
+    Fail early if a compression name is unknown or its package is not installed.
+
+    Parameters:
+    compression (str): One of the CODECS names.
+    """
+    if compression not in CODECS:
+        raise ValueError(f"Unknown compression '{compression}', expected one of {sorted(CODECS)}")
+    if compression == "zstd" and zstandard is None:
+        raise ValueError("zstd compression requested but the 'zstandard' package is not installed")
+    if compression == "lz4" and lz4 is None:
+        raise ValueError("lz4 compression requested but the 'lz4' package is not installed")
+
+
+def _compress(codec, data):
+    if codec == CODEC_NONE:
+        return data
+    if codec == CODEC_ZLIB:
+        return zlib.compress(data, 1)
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise ValueError("zstd compression requested but the 'zstandard' package is not installed")
+        return zstandard.ZstdCompressor(level=1).compress(data)
+    if codec == CODEC_LZ4:
+        if lz4 is None:
+            raise ValueError("lz4 compression requested but the 'lz4' package is not installed")
+        return lz4.frame.compress(data)
+    raise ValueError(f"Unsupported codec: {codec}")
+
+
+def _decompress(codec, data):
+    if codec == CODEC_NONE:
+        return data
+    if codec == CODEC_ZLIB:
+        return zlib.decompress(data)
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise ValueError("Record is zstd compressed but the 'zstandard' package is not installed")
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec == CODEC_LZ4:
+        if lz4 is None:
+            raise ValueError("Record is lz4 compressed but the 'lz4' package is not installed")
+        return lz4.frame.decompress(data)
+    raise ValueError(f"Unsupported codec: {codec}")
+
+
+def _samples_to_bytes(samples, scale):
+    """
+    Convert a (rows, leads) window to raw little-endian sample bytes.
+
+    Accepts a NumPy array or nested lists (of floats or Decimals), so the
+    producer does not need NumPy.
+    """
+    if np is not None and isinstance(samples, np.ndarray):
+        shape = list(samples.shape)
+        if scale is None:
+            return samples.astype(DTYPE_FLOAT32, copy=False).tobytes(), shape, DTYPE_FLOAT32
+        quantized = np.clip(np.rint(samples / scale), INT16_MIN, INT16_MAX)
+        return quantized.astype(DTYPE_INT16).tobytes(), shape, DTYPE_INT16
+
+    shape = [len(samples), len(samples[0]) if samples else 0]
+    flat = (float(value) for row in samples for value in row)
+    if scale is None:
+        buffer, dtype = array.array("f", flat), DTYPE_FLOAT32
+    else:
+        quantized = (min(max(round(value / scale), INT16_MIN), INT16_MAX) for value in flat)
+        buffer, dtype = array.array("h", quantized), DTYPE_INT16
+    if sys.byteorder != "little":
+        buffer.byteswap()
+    return buffer.tobytes(), shape, dtype
+
+
+def encode_window(metadata, samples, compression="none", scale=None, default=None):
+    """
+    Encode an aggregated ECG window and its metadata into the binary wire format.
+
+    Parameters:
+    metadata (dict): JSON-serializable record fields (without the samples).
+    samples (np.array or list): Window of shape (4096, 12).
+    compression (str): One of 'none', 'zlib', 'zstd', 'lz4'.
+    scale (float): If given, samples are stored as int16 with value = int16 * scale.
+    default (callable): Fallback serializer for json.dumps, e.g. for Decimal values.
+
+    Returns:
+    bytes: The encoded record.
+    """
+    codec = CODECS[compression]
+    sample_bytes, shape, dtype = _samples_to_bytes(samples, scale)
+
+    header = dict(metadata)
+    header["dtype"] = dtype
+    header["shape"] = shape
+    header["scale"] = scale
+    header_bytes = json.dumps(header, default=default, separators=(",", ":")).encode("utf-8")
+
+    # Pad the header with spaces so the sample block is aligned for np.frombuffer
+    padding = -(PREAMBLE.size + len(header_bytes)) % SAMPLE_ALIGNMENT
+    header_bytes += b" " * padding
+
+    preamble = PREAMBLE.pack(MAGIC, WIRE_FORMAT_VERSION, codec, len(header_bytes))
+    return preamble + header_bytes + _compress(codec, sample_bytes)
+
+
+def is_binary_record(data):
+    """
+    Check whether a Kinesis record uses the binary wire format.
+
+    Parameters:
+    data (bytes): Raw Kinesis record data.
+
+    Returns:
+    bool: True for binary envelopes, False for legacy JSON.
+    """
+    return bytes(data[:len(MAGIC)]) == MAGIC
+
+
+def decode_record(data):
+    """
+    Decode a Kinesis record in either the binary wire format or legacy JSON.
+
+    For binary records 'aggregated_data' is a NumPy array that views the record
+    buffer directly when the samples are uncompressed float32.
+
+    Parameters:
+    data (bytes): Raw Kinesis record data.
+
+    Returns:
+    dict: Record metadata with 'aggregated_data' set to the window samples.
+    """
+    if not is_binary_record(data):
+        return json.loads(data)
+
+    _, version, codec, header_len = PREAMBLE.unpack_from(data)
+    if version != WIRE_FORMAT_VERSION:
+        raise ValueError(f"Unsupported wire format version: {version}")
+
+    header_start = PREAMBLE.size
+    samples_start = header_start + header_len
+    record = json.loads(bytes(data[header_start:samples_start]))
+    dtype = record.pop("dtype")
+    shape = tuple(record.pop("shape"))
+    scale = record.pop("scale")
+
+    if codec == CODEC_NONE:
+        samples = np.frombuffer(data, dtype=dtype, offset=samples_start)
+    else:
+        samples = np.frombuffer(_decompress(codec, memoryview(data)[samples_start:]), dtype=dtype)
+    samples = samples.reshape(shape)
+
+    if scale is not None:
+        samples = samples.astype(np.float32) * np.float32(scale)
+
+    record["aggregated_data"] = samples
+    return record
+
+
+def pack_samples(samples):
+    """
+    Quantize raw part samples to int16 with a per-part scale, for compact storage as a
+    DynamoDB Binary attribute.
+
+    The scale maps the part's largest absolute sample to the int16 range, so no sample
+    is clipped and the quantization step is at most 1/32767 of the part's peak.
+
+    Parameters:
+    samples (np.array or list): Samples of shape (n,) for single-lead or (n, leads) for multi-lead parts.
+
+    Returns:
+    tuple: (sample bytes, shape as a list, scale), with value = int16 * scale.
+    """
+    samples = np.asarray(samples, dtype=np.float32)
+    peak = float(np.abs(samples).max()) if samples.size else 0.0
+    scale = peak / INT16_MAX if peak > 0 else 1.0
+    sample_bytes, shape, _ = _samples_to_bytes(samples, scale)
+    return sample_bytes, shape, scale
+
+
+def unpack_samples(data, shape, scale):
+    """
+    Decode samples packed by pack_samples.
+
+    Parameters:
+    data (bytes): Packed little-endian int16 samples.
+    shape (list[int]): Shape of the samples.
+    scale (float): Scale returned by pack_samples.
+
+    Returns:
+    np.array: float32 samples of the given shape.
+    """
+    return np.frombuffer(data, dtype=DTYPE_INT16).reshape(shape).astype(np.float32) * np.float32(scale)